@@ -1,146 +1,420 @@
+import asyncio
+import concurrent.futures
+import json
+import logging
 import os
-import requests
-from PyQt6.QtCore import QThread, pyqtSignal
+import time
+from PyQt6.QtCore import QTimer, pyqtSignal
 from dotenv import load_dotenv
 
+from api_engine import get_engine
+from cancellation import CancellationToken, RequestCancelled
+from circuit_breaker import ProviderUnavailable, get_breakers
+from http_transport import get_transport, is_provider_failure
+from latency_stats import get_latency_tracker, get_provider_stats, get_usage_tracker, parse_usage
+from providers import get_registry
+from request_scheduler import PRIORITY_TYPED, PRIORITY_VOICE
+from response_cache import get_response_cache, make_cache_key, request_text
+
 load_dotenv()
 
 import os
 from PyQt6.QtCore import QObject, pyqtSignal
 
 
+# Пункт выпадающего списка: провайдер выбирается по живой статистике
+AUTO_PROVIDER = "Auto"
+
+
 class APIClient(QObject):
     response_received = pyqtSignal(str)
+    answered = pyqtSignal(str, str, str)  # вопрос запроса, ответ и провайдер, который ответил
     error_occurred = pyqtSignal(str)
+    cancelled = pyqtSignal()  # начатый запрос отменён — ни ответа, ни ошибки по нему не будет
     progress_updated = pyqtSignal(int)
+    chunk_received = pyqtSignal(str)
+    provider_selected = pyqtSignal(str)  # какой провайдер выбран в режиме Auto
+    usage_reported = pyqtSignal(dict)  # токены промпта/ответа, если провайдер их вернул
 
-    def __init__(self):
+    def __init__(self, coordinator=None, priority: int = PRIORITY_TYPED, exclusive: bool = True):
+        """exclusive=False: новый запрос не отменяет уже выполняющийся
+        (ответы на голос приходят по очереди, а не теряются)"""
         super().__init__()
-        self.current_worker = None
+        if coordinator is None:
+            from request_coordinator import RequestCoordinator
+            coordinator = RequestCoordinator(self)
+        self.coordinator = coordinator
+        self.priority = priority
+        self.exclusive = exclusive
+        self.current_future = None
+        self.current_request_id = 0
+        self._background = {}  # request_id -> future, для exclusive=False
+        self._questions = {}  # request_id -> вопрос, для сигнала answered
+
+    def send_request(self, api_name: str, prompt: str, use_cache: bool = True,
+                     messages: list = None, priority: int = None, question: str = None) -> int:
+        """Отправка запроса; предыдущий запрос этого клиента отменяется.
+
+        Одинаковые запросы отвечаются из кэша; use_cache=False идёт к
+        провайдеру в обход кэша (ответ всё равно сохраняется). Если такой же
+        запрос уже выполняется, клиент присоединяется к нему. messages —
+        полный список сообщений диалога вместо одного prompt.
+        Голосовой запрос, ещё ждущий в очереди, сливается с новым.
+        question возвращается вместе с ответом в сигнале answered
+        (по умолчанию — prompt). Если провайдер выбрать нельзя, испускается
+        error_occurred, текущий запрос не отменяется и возвращается 0.
+        """
+        try:
+            api_name = self.resolve_provider(api_name)
+        except ValueError as e:
+            logging.error(f"Request routing failed: {e}")
+            self.error_occurred.emit(str(e))
+            return 0
+        priority = self.priority if priority is None else priority
+        merge = (
+            priority == PRIORITY_VOICE and not messages and self.current_future is not None
+            and self.coordinator.is_queued(self.current_future)
+        )
+        if merge:
+            previous = self._questions.get(self.current_request_id, self.current_future.prompt)
+            question = f"{previous}\n{question or prompt}"
+            prompt = f"{self.current_future.prompt}\n{prompt}"
+            self.coordinator.scheduler.record_merge()
+        if self.exclusive or merge:
+            self.cancel_current()
+        elif self.current_future is not None:
+            # Предыдущий ответ дойдёт до получателя, просто не будет «текущим»
+            self._background[self.current_request_id] = self.current_future
+
+        cache_key = self._cache_key(api_name, request_text(prompt, messages))
+        if use_cache and cache_key:
+            cached = get_response_cache().get(cache_key)
+            if cached is not None:
+                request_id = self.current_request_id = self.coordinator.next_request_id()
+                self._questions[request_id] = prompt if question is None else question
+                logging.info(f"Response cache hit for request {request_id}")
+                # Ответ отдаём асинхронно, как и обычный результат воркера
+                provider = get_registry().get(api_name).title
+                QTimer.singleShot(0, lambda: self._deliver_cached(request_id, cached, provider))
+                return request_id
 
-    def send_request(self, api_name: str, prompt: str):
-        """Отправка запроса через APIWorker"""
-        if self.current_worker and self.current_worker.isRunning():
-            self.current_worker.terminate()
+        future = self.coordinator.submit(
+            api_name, prompt, cache_key, join=use_cache, messages=messages, priority=priority
+        )
+        future.finished.connect(self._handle_response)
+        future.error.connect(self._handle_error)
+        future.progress.connect(self._handle_progress)
+        future.chunk_received.connect(self._handle_chunk)
+        future.cancelled.connect(self._handle_cancelled)
+        self.current_future = future
+        self.current_request_id = future.request_id
+        self._questions[future.request_id] = prompt if question is None else question
 
-        self.current_worker = APIWorker(api_name, prompt)
-        self.current_worker.finished.connect(self._handle_response)
-        self.current_worker.error.connect(self._handle_error)
-        self.current_worker.progress.connect(self._handle_progress)
-        self.current_worker.start()
+        if future.partial:
+            # Присоединились к идущему запросу — догоняем уже пришедший текст
+            self.chunk_received.emit("".join(future.partial))
+            self.progress_updated.emit(future.progress_value)
+        return self.current_request_id
 
     def cancel_current(self):
-        """Отмена текущего запроса"""
-        if self.current_worker and self.current_worker.isRunning():
-            self.current_worker.terminate()
+        """Отмена текущего запроса: соединение обрывается, результат отбрасывается.
+
+        Если ответ уже мог начать приходить, испускается cancelled.
+        """
+        started = self.current_future is not None and not self.coordinator.is_queued(self.current_future)
+        if self.current_future is not None:
+            self.coordinator.release(self.current_future)
+            self.current_future = None
+        self._questions.pop(self.current_request_id, None)
+        self.current_request_id = 0
+        if started:
+            self.cancelled.emit()
+
+    def shutdown(self, timeout_ms: int = 2000):
+        """Отмена всех запросов и ожидание их завершения"""
+        self.cancel_current()
+        for future in self._background.values():
+            self.coordinator.release(future)
+        self._background.clear()
+        self._questions.clear()
+        self.coordinator.shutdown(timeout_ms)
+
+    def resolve_provider(self, api_name: str) -> str:
+        """Имя провайдера для запроса; Auto заменяется выбранным по статистике"""
+        if api_name.lower() == AUTO_PROVIDER.lower():
+            return self._route_auto()
+        return api_name
+
+    def _route_auto(self) -> str:
+        """Провайдер, который сейчас должен ответить быстрее всех"""
+        registry = get_registry()
+        available = registry.available() or registry.enabled()
+        provider = get_provider_stats().choose(get_breakers().healthy(available) or available)
+        if provider is None:
+            raise ValueError("Нет доступных провайдеров")
+        logging.info(f"Auto routing selected {provider.title}")
+        self.provider_selected.emit(provider.title)
+        return provider.name
+
+    @staticmethod
+    def _cache_key(api_name: str, prompt: str):
+        try:
+            provider = get_registry().get(api_name)
+        except ValueError:
+            return None
+        return make_cache_key(provider.name, provider.model, provider.temperature, prompt)
+
+    def _deliver_cached(self, request_id: int, response: str, provider: str):
+        if request_id != self.current_request_id:
+            return
+        self.progress_updated.emit(100)
+        self.response_received.emit(response)
+        self.answered.emit(self._questions.pop(request_id, ""), response, provider)
+
+    def _accept(self, final: bool = False) -> bool:
+        """Пропускает только сигналы текущего запроса; устаревшие отбрасываются"""
+        future = self.sender()
+        if future is None:
+            return False
+        if future.request_id == self.current_request_id:
+            if final:
+                self.current_future = None
+            return True
+        if future.request_id in self._background:
+            if final:
+                del self._background[future.request_id]
+            return True
+        return False
 
     def _handle_response(self, response: str):
         """Обработка успешного ответа"""
-        self.response_received.emit(response)
+        future = self.sender()
+        if self._accept(final=True):
+            if future.usage:
+                self.usage_reported.emit(future.usage)
+            self.response_received.emit(response)
+            self.answered.emit(self._questions.pop(future.request_id, ""), response, future.provider or "")
 
     def _handle_error(self, error: str):
         """Обработка ошибки"""
-        self.error_occurred.emit(error)
+        future = self.sender()
+        if self._accept(final=True):
+            self._questions.pop(future.request_id, None)
+            self.error_occurred.emit(error)
+
+    def _handle_cancelled(self):
+        """Запрос отменён"""
+        future = self.sender()
+        if self._accept(final=True):
+            self._questions.pop(future.request_id, None)
+            self.cancelled.emit()
 
     def _handle_progress(self, value: int):
         """Обновление прогресса"""
-        self.progress_updated.emit(value)
+        if self._accept():
+            self.progress_updated.emit(value)
+
+    def _handle_chunk(self, chunk: str):
+        """Фрагмент стримингового ответа"""
+        if self._accept():
+            self.chunk_received.emit(chunk)
+
+
+class APIWorker(QObject):
+    """Один запрос к провайдеру — корутина в цикле ApiEngine.
+
+    Сигналы испускаются из потока движка и доставляются получателям в
+    GUI-потоке очередью, как раньше сигналы QThread.
+    """
 
-class APIWorker(QThread):
     finished = pyqtSignal(str)
     error = pyqtSignal(str)
     progress = pyqtSignal(int)
+    chunk_received = pyqtSignal(str)
+    cancelled = pyqtSignal()
 
-    def __init__(self, api_name: str, prompt: str, parent=None):
+    # Ожидаемая длина ответа в токенах — по ней считается прогресс стриминга
+    EXPECTED_RESPONSE_TOKENS = 600
+
+    def __init__(self, api_name: str, prompt: str, stream: bool = True,
+                 cancel_token: CancellationToken = None, messages: list = None, parent=None):
         super().__init__(parent)
         self.api_name = api_name.lower()
         self.prompt = prompt
+        self.messages = messages
+        self.usage = None
+        self.failover = False  # сбой на стороне провайдера: запрос можно отдать другому
+        self.stream = stream
+        self.cancel_token = cancel_token or CancellationToken()
+        self.request_id = self.cancel_token.request_id
+        self.provider = None
+        self.tokens_received = 0
+        self.started_at = None
+        self.ttft = None
+        self._future = None
+        self._task = None
 
-    def run(self):
-        try:
-            self.progress.emit(10)
-            api_key = self._get_api_key()
-            if not api_key:
-                raise Exception(f"API ключ для {self.api_name} не найден")
+    def start(self):
+        """Планирует запрос в цикле движка и сразу возвращает управление"""
+        engine = get_engine()
+        self._future = engine.submit(self.run())
+        self.cancel_token.add_callback(lambda: engine.call_soon(self._cancel_task))
+
+    def cancel(self):
+        """Кооперативная отмена: задача отменяется, соединение закрывается"""
+        self.cancel_token.cancel()
 
-            response = self.call_api(api_key)
+    def _cancel_task(self):
+        # Вызывается в цикле движка; до старта задачи отмену увидит проверка токена в run()
+        if self._task is not None:
+            self._task.cancel()
+
+    def isRunning(self) -> bool:
+        return self._future is not None and not self._future.done()
+
+    def isFinished(self) -> bool:
+        return self._future is not None and self._future.done()
+
+    def wait(self, timeout_ms: int = None) -> bool:
+        """Ожидание завершения корутины; True — если она завершилась"""
+        if self._future is None:
+            return True
+        done, _ = concurrent.futures.wait([self._future], None if timeout_ms is None else timeout_ms / 1000)
+        return bool(done)
+
+    async def run(self):
+        self._task = asyncio.current_task()
+        breaker = None
+        try:
+            self.cancel_token.raise_if_cancelled()
+            self.started_at = time.perf_counter()
+            self.progress.emit(0)
+            self.provider = get_registry().get(self.api_name)
+            breaker = get_breakers().get(self.provider.name)
+            if not breaker.allow():
+                raise ProviderUnavailable(f"{self.provider.title} временно недоступен")
+            response = await self.call_api()
+            self.cancel_token.raise_if_cancelled()
+            breaker.record_success()
+            self._record_success()
             self.progress.emit(100)
             self.finished.emit(response)
-        except Exception as e:
+        except (asyncio.CancelledError, RequestCancelled):
+            if breaker is not None:
+                breaker.release()
+            self.cancelled.emit()
+        except ProviderUnavailable as e:
+            # Предохранитель разомкнут: ошибка без обращения к сети
+            self.failover = True
             self.error.emit(str(e))
+        except Exception as e:
+            if self.cancel_token.cancelled:
+                if breaker is not None:
+                    breaker.release()
+                self.cancelled.emit()
+                return
+            if breaker is not None:
+                if is_provider_failure(e):
+                    breaker.record_failure()
+                    self.failover = True
+                else:
+                    breaker.release()
+            if self.provider is not None:
+                get_provider_stats().record_error(
+                    self.provider.name, self.provider.model, self.provider.path
+                )
+            self.error.emit(str(e) or e.__class__.__name__)
 
-    def _get_api_key(self):
-        if self.api_name == "deepseek":
-            return os.getenv("DEEPSEEK_API_KEY")
-        elif self.api_name == "openai":
-            return os.getenv("OPENAI_API_KEY")
-        elif self.api_name == "cody":
-            return os.getenv("CODY_API_KEY")
-        return None
-
-    def call_api(self, api_key: str) -> str:
-        """Маршрутизация запросов к разным API"""
-        if self.api_name == "deepseek":
-            return self._call_deepseek_api(api_key)
-        elif self.api_name == "openai":
-            return self._call_openai_api(api_key)
-        elif self.api_name == "cody":
-            return self._call_cody_api(api_key)
-        raise ValueError(f"Неподдерживаемый API: {self.api_name}")
-
-    def _call_deepseek_api(self, api_key: str) -> str:
-        """Реализация DeepSeek API"""
-        self.progress.emit(20)
-        url = "https://api.deepseek.com/v1/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-        payload = {
-            "model": "deepseek-chat",
-            "messages": [{"role": "user", "content": self.prompt}],
-            "temperature": 0.7
-        }
-        self.progress.emit(40)
-        response = requests.post(url, json=payload, headers=headers)
-        response.raise_for_status()
-        self.progress.emit(80)
-        return response.json()["choices"][0]["message"]["content"]
-
-    def _call_cody_api(self, api_key: str) -> str:
-        """Реализация запросов к Cody API"""
-        self.progress.emit(20)
-        url = "https://cody.su/api/v1"
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-        payload = {
-            "model": "gpt-4.1",
-            "messages": [{"role": "user", "content": self.prompt}],
-            "temperature": 0.7
-        }
-        self.progress.emit(40)
-        response = requests.post(url, json=payload, headers=headers)
-        response.raise_for_status()
-        self.progress.emit(80)
-        return response.json()["choices"][0]["message"]["content"]
-
-    def _call_openai_api(self, api_key: str) -> str:
-        """Реализация OpenAI API"""
-        self.progress.emit(20)
-        url = "https://api.openai.com/v1/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
+    def _record_success(self):
+        """Замеры для адаптивной маршрутизации"""
+        if self.ttft is None:
+            return
+        generation_seconds = 0.0
+        if self.tokens_received > 1:
+            generation_seconds = time.perf_counter() - self.started_at - self.ttft
+        get_provider_stats().record_success(
+            self.provider.name, self.provider.model, self.provider.path,
+            self.ttft, self.tokens_received, generation_seconds,
+        )
+
+    async def call_api(self) -> str:
+        """Запрос к провайдеру из реестра"""
+        provider = self.provider
+        api_key = provider.api_key()
+        if provider.key_env and not api_key:
+            raise Exception(f"API ключ для {provider.title} не найден")
+
+        stream = self.stream and provider.supports("stream")
+        return await self._chat_completion(provider, api_key, stream=stream)
+
+    async def _chat_completion(self, provider, api_key: str, stream: bool) -> str:
+        """Запрос к OpenAI-совместимому chat/completions"""
+        headers = {"Content-Type": "application/json"}
+        if api_key:
+            headers["Authorization"] = f"Bearer {api_key}"
         payload = {
-            "model": "gpt-3.5-turbo",
-            "messages": [{"role": "user", "content": self.prompt}],
-            "temperature": 0.7
+            "model": provider.model,
+            "messages": self.messages or [{"role": "user", "content": self.prompt}],
+            "temperature": provider.temperature
         }
-        self.progress.emit(40)
-        response = requests.post(url, json=payload, headers=headers)
-        response.raise_for_status()
-        self.progress.emit(80)
-        return response.json()["choices"][0]["message"]["content"]
\ No newline at end of file
+        if stream:
+            payload["stream"] = True
+            if provider.supports("stream_usage"):
+                payload["stream_options"] = {"include_usage": True}
+
+        response = await get_transport().post(provider.url, json=payload, headers=headers)
+        async with response:
+            response.raise_for_status()
+            if stream:
+                return await self._read_stream(response)
+
+            data = await response.json(content_type=None)
+        self._record_usage(data.get("usage"))
+        content = data["choices"][0]["message"]["content"]
+        self._mark_first_token()
+        self.progress.emit(90)
+        return content
+
+    def _record_usage(self, usage: dict):
+        """Токены запроса, включая попавшие в кэш промпта провайдера"""
+        if not usage:
+            return
+        self.usage = parse_usage(usage)
+        get_usage_tracker().record(self.provider.name, self.usage)
+
+    def _mark_first_token(self):
+        """Фиксирует время до первого токена в гистограмме провайдера"""
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self.started_at
+            get_latency_tracker().record(self.provider.name, self.ttft)
+
+    async def _read_stream(self, response) -> str:
+        """Разбор SSE-потока: дельты токенов отправляются по мере прихода"""
+        parts = []
+        last_progress = 0
+        async for line in response.content:
+            line = line.strip()
+            if not line.startswith(b"data:"):
+                continue
+            data = line[5:].strip()
+            if data == b"[DONE]":
+                break
+
+            event = json.loads(data)
+            # С include_usage последний фрагмент несёт usage и пустой choices
+            self._record_usage(event.get("usage"))
+            choices = event.get("choices") or [{}]
+            delta = (choices[0].get("delta") or {}).get("content")
+            if not delta:
+                continue
+
+            parts.append(delta)
+            self._mark_first_token()
+            self.tokens_received += 1
+            self.chunk_received.emit(delta)
+
+            progress = min(99, self.tokens_received * 100 // self.EXPECTED_RESPONSE_TOKENS)
+            if progress != last_progress:
+                last_progress = progress
+                self.progress.emit(progress)
+        return "".join(parts)
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from http_transport import get_transport
+
+
+class ApiEngine:
+    """Один фоновый поток с циклом asyncio для всех запросов к провайдерам.
+
+    Запросы — корутины в этом цикле, а не отдельные QThread, поэтому число
+    потоков не растёт с числом одновременных запросов: цикл плюс небольшой
+    пул для DNS-резолвера. Результаты передаются в Qt сигналами, которые
+    испускаются из потока цикла и доставляются в GUI-поток очередью.
+    """
+
+    def __init__(self, resolver_threads: int = 2):
+        self.resolver_threads = resolver_threads
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        self.start()
+        return self._loop
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            self._ready.clear()
+            self._thread = threading.Thread(target=self._run, name="api-engine", daemon=True)
+            self._thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        loop.set_default_executor(
+            ThreadPoolExecutor(max_workers=self.resolver_threads, thread_name_prefix="api-engine-resolver")
+        )
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        self._ready.set()
+        logging.info("API engine started")
+        try:
+            loop.run_forever()
+        finally:
+            loop.run_until_complete(loop.shutdown_default_executor())
+            loop.close()
+            logging.info("API engine stopped")
+
+    def submit(self, coro):
+        """Запуск корутины в цикле движка; возвращает concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call_soon(self, callback, *args):
+        """Потокобезопасный вызов функции в цикле движка"""
+        self.loop.call_soon_threadsafe(callback, *args)
+
+    def stop(self, timeout: float = 5.0):
+        """Отмена оставшихся задач, закрытие транспорта и остановка цикла"""
+        with self._lock:
+            if not self.running:
+                return
+            loop, thread = self._loop, self._thread
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), loop).result(timeout)
+        except Exception as e:
+            logging.error(f"API engine shutdown failed: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+
+    @staticmethod
+    async def _shutdown():
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await get_transport().close()
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> ApiEngine:
+    """Общий движок запросов приложения"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = ApiEngine()
+        return _engine
@@ -0,0 +1,36 @@
+import logging
+import threading
+from pathlib import Path
+
+import yaml
+
+CONFIG_PATH = Path(__file__).parent / "config.yaml"
+
+_config = None
+_config_lock = threading.Lock()
+
+
+def load_config(path=CONFIG_PATH) -> dict:
+    """Чтение config.yaml; при ошибке возвращается пустой словарь"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return yaml.safe_load(f) or {}
+    except FileNotFoundError:
+        logging.warning(f"Config not found: {path}, using defaults")
+    except yaml.YAMLError as e:
+        logging.error(f"Error parsing {path}: {e}")
+    return {}
+
+
+def get_config() -> dict:
+    """Конфигурация приложения (читается один раз)"""
+    global _config
+    with _config_lock:
+        if _config is None:
+            _config = load_config()
+        return _config
+
+
+def config_section(name: str) -> dict:
+    """Раздел конфигурации; отсутствующий раздел — пустой словарь"""
+    return get_config().get(name) or {}
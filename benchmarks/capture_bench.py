@@ -0,0 +1,61 @@
+"""Бенчмарк бэкендов захвата экрана.
+
+Запуск из корня проекта (под Xvfb, например):
+    xvfb-run -s "-screen 0 1920x1080x24" python -m benchmarks.capture_bench
+"""
+import argparse
+import json
+import sys
+import time
+
+from PyQt6.QtGui import QGuiApplication
+
+from capture_backends import QtCaptureBackend, XShmCaptureBackend
+
+
+def bench_backend(backend, region, iterations: int) -> dict:
+    x, y, w, h = region
+    backend.grab(x, y, w, h)  # прогрев: выделение буферов
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        backend.grab(x, y, w, h)
+    elapsed = time.perf_counter() - start
+
+    ms_per_frame = elapsed * 1000 / iterations
+    return {
+        "backend": backend.name,
+        "region": list(region),
+        "iterations": iterations,
+        "ms_per_frame": round(ms_per_frame, 3),
+        "megapixels_per_s": round(w * h * iterations / elapsed / 1e6, 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Capture backend benchmark")
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--region", type=int, nargs=4, metavar=("X", "Y", "W", "H"))
+    args = parser.parse_args(argv)
+
+    app = QGuiApplication(sys.argv[:1])
+    geometry = app.primaryScreen().geometry()
+    region = tuple(args.region) if args.region else (0, 0, geometry.width(), geometry.height())
+
+    results = []
+    for factory in (XShmCaptureBackend, QtCaptureBackend):
+        try:
+            backend = factory()
+        except Exception as e:
+            results.append({"backend": factory.name, "error": str(e)})
+            continue
+        try:
+            results.append(bench_backend(backend, region, args.iterations))
+        finally:
+            backend.close()
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
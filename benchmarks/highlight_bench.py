@@ -0,0 +1,165 @@
+"""Бенчмарк подсветки кода на больших фрагментах, похожих на результат OCR.
+
+Фрагменты кода размножаются до нужного числа строк и портятся типичными
+ошибками распознавания (l/1, O/0, съеденные отступы). Сравниваются:
+прежний путь Markdown + CodeHilite(guess_lang=True), общий HighlightService
+с холодным и тёплым кэшем, а также определение языка guess_lexer из
+Pygments против эвристики guess_language. Результат — JSON.
+
+Запуск из корня проекта:
+    python -m benchmarks.highlight_bench --lines 200 1000 5000
+"""
+import argparse
+import json
+import platform
+import random
+import time
+
+from markdown import Markdown
+from markdown.extensions.codehilite import CodeHiliteExtension
+from pygments.lexers import guess_lexer
+
+from highlighting import HighlightService, guess_language
+from markdown_renderer import create_markdown
+
+SNIPPETS = {
+    "python": (
+        "class Cache:\n"
+        "    def __init__(self, size=128):\n"
+        "        self.size = size\n"
+        "        self.items = {}\n"
+        "\n"
+        "    def get(self, key, default=None):\n"
+        "        if key in self.items:\n"
+        "            return self.items[key]\n"
+        "        return default\n"
+        "\n"
+        "for i in range(10):\n"
+        "    print(Cache().get(i, 'none'))\n"
+    ),
+    "javascript": (
+        "function debounce(fn, delay) {\n"
+        "  let timer = null;\n"
+        "  return (...args) => {\n"
+        "    clearTimeout(timer);\n"
+        "    timer = setTimeout(() => fn(...args), delay);\n"
+        "  };\n"
+        "}\n"
+        "console.log(typeof debounce === 'function');\n"
+    ),
+    "c": (
+        "#include <stdio.h>\n"
+        "\n"
+        "int main(void) {\n"
+        "    int values[4] = {1, 2, 3, 4};\n"
+        "    for (int i = 0; i < 4; i++)\n"
+        "        printf(\"%d\\n\", values[i] * 2);\n"
+        "    return 0;\n"
+        "}\n"
+    ),
+}
+
+# Частые подмены символов при распознавании
+OCR_CONFUSIONS = {"l": "1", "O": "0", "o": "0", "I": "l", "rn": "m", ":": ";"}
+
+
+def ocr_noise(code: str, rate: float, rng: random.Random) -> str:
+    """Портит текст как OCR: подмены похожих символов и съеденные отступы"""
+    lines = []
+    for line in code.split("\n"):
+        if rng.random() < rate:
+            line = line.lstrip()
+        for source, target in OCR_CONFUSIONS.items():
+            if source in line and rng.random() < rate:
+                line = line.replace(source, target, 1)
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def make_snippet(language: str, lines: int, rng: random.Random) -> str:
+    base = SNIPPETS[language]
+    repeats = lines // base.count("\n") + 1
+    code = "".join(base for _ in range(repeats))
+    code = "\n".join(code.split("\n")[:lines])
+    return ocr_noise(code, 0.05, rng)
+
+
+def timed(func, *args, repeats: int = 3) -> float:
+    """Лучшее время вызова из repeats, мс"""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return round(best * 1000, 3)
+
+
+def bench_case(language: str, lines: int, repeats: int, rng: random.Random) -> dict:
+    code = make_snippet(language, lines, rng)
+    markdown_text = f"Распознанный код:\n\n```\n{code}\n```\n"
+
+    def legacy():
+        # Как было: новый конвертер и перебор анализаторов всех лексеров на каждый ответ
+        Markdown(extensions=[
+            "fenced_code",
+            CodeHiliteExtension(linenums=False, guess_lang=True, noclasses=True),
+        ]).convert(markdown_text)
+
+    markdown = create_markdown()
+
+    def service_cold():
+        HighlightService().highlight_html(markdown.reset().convert(markdown_text))
+
+    warm = HighlightService()
+    warm.highlight_html(markdown.reset().convert(markdown_text))
+
+    def service_warm():
+        warm.highlight_html(markdown.reset().convert(markdown_text))
+
+    legacy_ms = timed(legacy, repeats=repeats)
+    cold_ms = timed(service_cold, repeats=repeats)
+    return {
+        "language": language,
+        "lines": lines,
+        "chars": len(code),
+        "legacy_ms": legacy_ms,
+        "service_cold_ms": cold_ms,
+        "service_warm_ms": timed(service_warm, repeats=repeats),
+        "speedup_cold": round(legacy_ms / cold_ms, 2) if cold_ms else None,
+        "guess_lexer_ms": timed(guess_lexer, code, repeats=repeats),
+        "guess_language_ms": timed(guess_language, code, repeats=repeats),
+        "guess_lexer": guess_lexer(code).aliases[0] if guess_lexer(code).aliases else "text",
+        "guess_language": guess_language(code),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Syntax highlighting benchmark")
+    parser.add_argument("--lines", type=int, nargs="+", default=[200, 1000, 5000])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Куда сохранить JSON с результатами")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    cases = [
+        bench_case(language, lines, args.repeats, rng)
+        for lines in args.lines
+        for language in SNIPPETS
+    ]
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "cases": cases,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
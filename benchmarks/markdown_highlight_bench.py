@@ -0,0 +1,165 @@
+"""Бенчмарк подсветки Markdown в редактируемом окне ответа.
+
+В QTextEdit загружается синтетический ответ на 10 000 строк (абзацы, списки,
+цитаты и многострочные блоки кода) и имитируются нажатия клавиш: ввод
+символа в абзаце, внутри блока кода и ввод ограничителя ```, меняющего
+разметку всех строк ниже. Для прежней подсветки (восемь проходов re.finditer
+на строку) и нынешней измеряются время первой подсветки, задержка нажатия
+и число перекрашенных строк. Результат — JSON.
+
+Запуск из корня проекта:
+    QT_QPA_PLATFORM=offscreen python -m benchmarks.markdown_highlight_bench --lines 10000
+"""
+import argparse
+import json
+import platform
+import re
+import statistics
+import sys
+import time
+
+from PyQt6.QtGui import QTextCursor
+from PyQt6.QtWidgets import QApplication, QTextEdit
+
+from text_formatter import MarkdownHighlighter
+
+PARAGRAPH = (
+    "Функция **parse_config** читает файл и возвращает `dict`; подробнее в "
+    "[документации](https://example.com/docs), а _необязательные_ ключи берутся по умолчанию."
+)
+CODE = [
+    "```python",
+    "def parse_config(path):",
+    "    with open(path) as f:",
+    "        return yaml.safe_load(f) or {}",
+    "```",
+]
+
+
+class LegacyMarkdownHighlighter(MarkdownHighlighter):
+    """Прежняя реализация: восемь отдельных проходов re.finditer на каждую строку"""
+
+    RULES = [
+        (r'^#{1,6}\s.*$', 'heading'),
+        (r'`{3}.*`{3}', 'code'),
+        (r'`[^`]+`', 'code'),
+        (r'\*\*[^*]+\*\*', 'bold'),
+        (r'_[^_]+_', 'italic'),
+        (r'\[.*?\]\(.*?\)', 'link'),
+        (r'^[\*\-\+] .*$', 'list'),
+        (r'^> .*$', 'quote'),
+    ]
+
+    def highlightBlock(self, text):
+        for pattern, name in self.RULES:
+            for match in re.finditer(pattern, text):
+                self.setFormat(match.start(), match.end() - match.start(), self.formats[name])
+
+
+def counting(highlighter_class):
+    """Подкласс, считающий вызовы highlightBlock"""
+    class Counting(highlighter_class):
+        calls = 0
+
+        def highlightBlock(self, text):
+            Counting.calls += 1
+            super().highlightBlock(text)
+
+    return Counting
+
+
+def make_response(lines: int) -> str:
+    """Ответ из повторяющихся секций: заголовок, абзацы, список, цитата, код"""
+    section = ["## Раздел", PARAGRAPH, PARAGRAPH, "- пункт списка с `кодом`", "> цитата", "", *CODE, ""]
+    out = []
+    while len(out) < lines:
+        out.extend(section)
+    return "\n".join(out[:lines])
+
+
+def line_position(document, line: int, column: int = 0) -> int:
+    return document.findBlockByNumber(line).position() + column
+
+
+def keystrokes(edit, position: int, text: str, repeats: int) -> list:
+    """Время ввода text в позицию position (мс) по каждому повтору; ввод затем откатывается"""
+    timings = []
+    for _ in range(repeats):
+        cursor = QTextCursor(edit.document())
+        cursor.setPosition(position)
+        start = time.perf_counter()
+        cursor.insertText(text)
+        timings.append((time.perf_counter() - start) * 1000)
+        cursor.setPosition(position)
+        cursor.setPosition(position + len(text), QTextCursor.MoveMode.KeepAnchor)
+        cursor.removeSelectedText()
+    return timings
+
+
+def bench(highlighter_class, text: str, repeats: int) -> dict:
+    edit = QTextEdit()
+    edit.setReadOnly(False)
+    edit.setPlainText(text)
+    highlighter_class = counting(highlighter_class)
+
+    highlighter = highlighter_class(edit.document())
+    start = time.perf_counter()
+    highlighter.rehighlight()  # иначе первая подсветка отложена до цикла событий
+    initial_ms = (time.perf_counter() - start) * 1000
+
+    document = edit.document()
+    middle = document.blockCount() // 2
+    # Ближайшие к середине абзац и строка внутри блока кода
+    paragraph = next(n for n in range(middle, document.blockCount())
+                     if document.findBlockByNumber(n).text() == PARAGRAPH)
+    code_line = next(n for n in range(middle, document.blockCount())
+                     if document.findBlockByNumber(n).text() == CODE[1])
+    cases = {
+        "paragraph_char": (line_position(document, paragraph, 10), "x"),
+        "code_char": (line_position(document, code_line, 4), "x"),
+        "fence_line": (line_position(document, paragraph), "```\n"),
+    }
+
+    results = {"initial_highlight_ms": round(initial_ms, 2)}
+    for name, (position, typed) in cases.items():
+        highlighter_class.calls = 0
+        timings = keystrokes(edit, position, typed, repeats)
+        results[name] = {
+            "median_ms": round(statistics.median(timings), 3),
+            "max_ms": round(max(timings), 3),
+            # Вставка и откат — два изменения на повтор
+            "blocks_rehighlighted": highlighter_class.calls // (2 * repeats),
+        }
+    highlighter.setDocument(None)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Markdown highlighter keystroke benchmark")
+    parser.add_argument("--lines", type=int, default=10000)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--output", help="Куда сохранить JSON с результатами")
+    args = parser.parse_args(argv)
+
+    app = QApplication(sys.argv[:1])
+    text = make_response(args.lines)
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "lines": args.lines,
+        "chars": len(text),
+        "legacy": bench(LegacyMarkdownHighlighter, text, args.repeats),
+        "current": bench(MarkdownHighlighter, text, args.repeats),
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+    app.quit()
+
+
+if __name__ == "__main__":
+    main()
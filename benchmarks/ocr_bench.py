@@ -0,0 +1,335 @@
+"""Бенчмарк OCR и захвата на синтетических изображениях кода.
+
+Известные фрагменты кода рендерятся через PIL разными шрифтами, размерами и
+темами, затем прогоняются через CodeAnalyzer (путь qpixmap_to_pil + OCR и
+путь кадров frame_to_pil + OCR). Результат — JSON с CER, мс на мегапиксель и
+числом аллокаций на захват. Без tesseract OCR помечается как unavailable
+(CER не выдумывается); бэкенд захвата, который не смог снять кадр (например,
+Qt без дисплея), попадает в отчёт с полем error.
+
+Запуск из корня проекта:
+    QT_QPA_PLATFORM=offscreen python -m benchmarks.ocr_bench --output ocr.json
+    QT_QPA_PLATFORM=offscreen python -m benchmarks.ocr_bench --baseline ocr.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pytesseract
+from PIL import Image, ImageDraw, ImageFont
+from PyQt6.QtGui import QGuiApplication, QImage, QPixmap
+
+from capture_backends import QtCaptureBackend, XShmCaptureBackend
+from ocr_analyzer import CodeAnalyzer
+
+SNIPPETS = {
+    "python": (
+        "def fibonacci(n):\n"
+        "    a, b = 0, 1\n"
+        "    for _ in range(n):\n"
+        "        a, b = b, a + b\n"
+        "    return a\n"
+        "\n"
+        "print(fibonacci(10))"
+    ),
+    "javascript": (
+        "function debounce(fn, delay) {\n"
+        "  let timer = null;\n"
+        "  return (...args) => {\n"
+        "    clearTimeout(timer);\n"
+        "    timer = setTimeout(() => fn(...args), delay);\n"
+        "  };\n"
+        "}"
+    ),
+    "c": (
+        "#include <stdio.h>\n"
+        "\n"
+        "int main(void) {\n"
+        "    int values[4] = {1, 2, 3, 4};\n"
+        "    for (int i = 0; i < 4; i++)\n"
+        "        printf(\"%d\\n\", values[i] * 2);\n"
+        "    return 0;\n"
+        "}"
+    ),
+}
+
+THEMES = {
+    "light": ((255, 255, 255), (36, 41, 46)),
+    "dark": ((30, 30, 30), (212, 212, 212)),
+    "solarized": ((0, 43, 54), (131, 148, 150)),
+}
+
+FONT_CANDIDATES = {
+    "dejavu-mono": [
+        "/usr/share/fonts/truetype/dejavu/DejaVuSansMono.ttf",
+        "/usr/share/fonts/TTF/DejaVuSansMono.ttf",
+    ],
+    "liberation-mono": [
+        "/usr/share/fonts/truetype/liberation/LiberationMono-Regular.ttf",
+        "/usr/share/fonts/liberation/LiberationMono-Regular.ttf",
+    ],
+    "consolas": [
+        "C:/Windows/Fonts/consola.ttf",
+    ],
+}
+
+SIZES = [12, 16, 22]
+
+# Допуски при сравнении с базовой линией
+CER_TOLERANCE = 0.02
+SPEED_TOLERANCE = 0.25
+
+
+def available_fonts() -> dict:
+    """Шрифты, найденные в системе; встроенный шрифт PIL — запасной вариант"""
+    fonts = {}
+    for name, paths in FONT_CANDIDATES.items():
+        for path in paths:
+            if os.path.exists(path):
+                fonts[name] = path
+                break
+    if not fonts:
+        fonts["pil-default"] = None
+    return fonts
+
+
+def render_snippet(code: str, font_path, size: int, theme: str) -> Image.Image:
+    """Рендеринг фрагмента кода в RGB-изображение"""
+    bg, fg = THEMES[theme]
+    if font_path:
+        font = ImageFont.truetype(font_path, size)
+    else:
+        font = ImageFont.load_default(size=size)
+
+    padding = size
+    probe = ImageDraw.Draw(Image.new("RGB", (1, 1)))
+    left, top, right, bottom = probe.multiline_textbbox((0, 0), code, font=font, spacing=size // 3)
+    image = Image.new("RGB", (right - left + 2 * padding, bottom - top + 2 * padding), bg)
+    ImageDraw.Draw(image).multiline_text(
+        (padding - left, padding - top), code, font=font, fill=fg, spacing=size // 3
+    )
+    return image
+
+
+def pil_to_qpixmap(image: Image.Image) -> QPixmap:
+    data = image.convert("RGBA").tobytes("raw", "RGBA")
+    qimage = QImage(data, image.width, image.height, image.width * 4, QImage.Format.Format_RGBA8888)
+    return QPixmap.fromImage(qimage.copy())
+
+
+def pil_to_frame(image: Image.Image) -> np.ndarray:
+    """RGB-изображение в кадр BGRA, как его отдают бэкенды захвата"""
+    rgb = np.asarray(image.convert("RGB"))
+    frame = np.empty(rgb.shape[:2] + (4,), dtype=np.uint8)
+    frame[..., 0] = rgb[..., 2]
+    frame[..., 1] = rgb[..., 1]
+    frame[..., 2] = rgb[..., 0]
+    frame[..., 3] = 255
+    return frame
+
+
+def normalize_text(text: str) -> str:
+    lines = (line.rstrip() for line in text.strip().splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def character_error_rate(reference: str, hypothesis: str) -> float:
+    """CER = расстояние Левенштейна / длина эталона"""
+    reference, hypothesis = normalize_text(reference), normalize_text(hypothesis)
+    if not reference:
+        return 0.0 if not hypothesis else 1.0
+
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_char in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_char in enumerate(hypothesis, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ref_char != hyp_char),
+            ))
+        previous = current
+    return previous[-1] / len(reference)
+
+
+def count_allocations(func, *args) -> dict:
+    """Число выделенных Python-блоков и пиковый объём памяти за один вызов"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        result = func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+
+    blocks = sum(max(stat.count_diff, 0) for stat in after.compare_to(before, "filename"))
+    del result
+    return {"alloc_blocks": blocks, "alloc_peak_kb": round(peak / 1024, 1)}
+
+
+def bench_ocr_case(analyzer: CodeAnalyzer, image: Image.Image, reference: str, repeats: int) -> dict:
+    megapixels = image.width * image.height / 1e6
+    pixmap = pil_to_qpixmap(image)
+    frame = pil_to_frame(image)
+
+    paths = {
+        "pixmap": (analyzer.analyze_image, analyzer.qpixmap_to_pil, pixmap),
+        "frame": (analyzer.analyze_frame, analyzer.frame_to_pil, frame),
+    }
+
+    result = {"width": image.width, "height": image.height}
+    for path, (analyze, convert, source) in paths.items():
+        timings = []
+        text = ""
+        for _ in range(repeats):
+            start = time.perf_counter()
+            text = analyze(source)
+            timings.append(time.perf_counter() - start)
+
+        ms = min(timings) * 1000
+        result[path] = {
+            "cer": round(character_error_rate(reference, text), 4),
+            "ms": round(ms, 2),
+            "ms_per_megapixel": round(ms / megapixels, 2),
+            **count_allocations(convert, source),
+        }
+    return result
+
+
+def ocr_unavailable_reason():
+    """Почему OCR нельзя измерить (нет tesseract) или None.
+
+    CodeAnalyzer глотает ошибки распознавания и возвращает пустую строку —
+    без этой проверки бенчмарк показал бы CER 1.0 вместо отсутствия OCR.
+    """
+    try:
+        pytesseract.get_tesseract_version()
+    except Exception as e:
+        return f"{e.__class__.__name__}: {e}"
+    return None
+
+
+def bench_capture(iterations: int) -> list:
+    """Скорость и аллокации каждого бэкенда захвата; ошибка бэкенда — в его записи"""
+    results = []
+    for factory in (XShmCaptureBackend, QtCaptureBackend):
+        try:
+            results.append(bench_backend(factory(), iterations))
+        except Exception as e:
+            results.append({"backend": factory.name, "error": f"{e.__class__.__name__}: {e}"})
+    return results
+
+
+def bench_backend(backend, iterations: int) -> dict:
+    try:
+        geometry = QGuiApplication.primaryScreen().geometry()
+        region = (0, 0, geometry.width(), geometry.height())
+        backend.grab(*region)  # прогрев
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            backend.grab(*region)
+        ms = (time.perf_counter() - start) * 1000 / iterations
+
+        return {
+            "backend": backend.name,
+            "region": list(region),
+            "ms": round(ms, 3),
+            "ms_per_megapixel": round(ms / (region[2] * region[3] / 1e6), 3),
+            **count_allocations(backend.grab, *region),
+        }
+    finally:
+        backend.close()
+
+
+def run(repeats: int, capture_iterations: int) -> dict:
+    analyzer = CodeAnalyzer()
+    cases = []
+    unavailable = ocr_unavailable_reason()
+    fonts = {} if unavailable else available_fonts()
+    for font_name, font_path in fonts.items():
+        for size in SIZES:
+            for theme in THEMES:
+                for language, code in SNIPPETS.items():
+                    image = render_snippet(code, font_path, size, theme)
+                    case = bench_ocr_case(analyzer, image, code, repeats)
+                    case.update({"font": font_name, "size": size, "theme": theme, "snippet": language})
+                    cases.append(case)
+
+    summary = {}
+    for path in ("pixmap", "frame") if cases else ():
+        summary[path] = {
+            "mean_cer": round(sum(c[path]["cer"] for c in cases) / len(cases), 4),
+            "mean_ms_per_megapixel": round(
+                sum(c[path]["ms_per_megapixel"] for c in cases) / len(cases), 2
+            ),
+            "mean_alloc_blocks": round(sum(c[path]["alloc_blocks"] for c in cases) / len(cases), 1),
+        }
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeats": repeats,
+        },
+        "summary": summary,
+        "ocr": {"status": "unavailable", "reason": unavailable} if unavailable else {"status": "ok"},
+        "capture": bench_capture(capture_iterations),
+        "cases": cases,
+    }
+
+
+def find_regressions(current: dict, baseline: dict) -> list:
+    regressions = []
+    for path, stats in current["summary"].items():
+        base = baseline.get("summary", {}).get(path)
+        if not base:
+            continue
+        if stats["mean_cer"] > base["mean_cer"] + CER_TOLERANCE:
+            regressions.append(f"{path}: CER {base['mean_cer']} -> {stats['mean_cer']}")
+        if stats["mean_ms_per_megapixel"] > base["mean_ms_per_megapixel"] * (1 + SPEED_TOLERANCE):
+            regressions.append(
+                f"{path}: ms/MP {base['mean_ms_per_megapixel']} -> {stats['mean_ms_per_megapixel']}"
+            )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="OCR and capture benchmark")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--capture-iterations", type=int, default=50)
+    parser.add_argument("--output", help="Куда сохранить JSON с результатами")
+    parser.add_argument("--baseline", help="JSON предыдущего прогона для поиска регрессий")
+    args = parser.parse_args(argv)
+
+    app = QGuiApplication(sys.argv[:1])  # noqa: F841 — нужен для QPixmap и захвата
+    report = run(args.repeats, args.capture_iterations)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            report["regressions"] = find_regressions(report, json.load(f))
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(json.dumps(report["summary"], indent=2) if args.output else text)
+    if report["ocr"]["status"] != "ok":
+        print(f"OCR not measured: {report['ocr']['reason']}", file=sys.stderr)
+
+    if report.get("regressions"):
+        for line in report["regressions"]:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""Бенчмарк окна ответа в долгой сессии: с ограничением объёма и без него.
+
+В QTextEdit с подсветкой Markdown, как в приложении, дописываются записи
+распознанного аудио и ответы (append), после каждой обрабатываются события,
+чтобы сработала отложенная обрезка. По ходу сессии снимаются медианная
+стоимость одной записи, размер документа и RSS процесса. Результат — JSON.
+
+Запуск из корня проекта:
+    QT_QPA_PLATFORM=offscreen python -m benchmarks.scrollback_bench --appends 20000
+    QT_QPA_PLATFORM=offscreen python -m benchmarks.scrollback_bench --max-blocks 2000 --max-bytes 0
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+from PyQt6.QtWidgets import QApplication, QTextEdit
+
+from scrollback import ScrollbackLimiter
+from text_formatter import MarkdownHighlighter
+
+TRANSCRIPT = "<b>🎤 Распознано аудио:</b><br>а как здесь работает кэш и что будет при промахе<br>"
+ANSWER = "🤖 Ответ:\n" + "\n".join(
+    f"{i}. При промахе запрос уходит к провайдеру, а ответ сохраняется в `response_cache` на **7 дней**."
+    for i in range(1, 16)
+) + "\n" + "=" * 50 + "\n"
+
+
+def rss_mb():
+    """Текущий RSS процесса в МБ (только Linux)"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / 2 ** 20, 1)
+    except (OSError, ValueError):
+        return None
+
+
+def run_session(app, appends: int, checkpoints: int, limiter_options) -> dict:
+    edit = QTextEdit()
+    edit.setReadOnly(False)
+    highlighter = MarkdownHighlighter(edit.document())
+    limiter = ScrollbackLimiter(edit, **limiter_options) if limiter_options else None
+
+    samples = []
+    timings = []
+    every = max(appends // checkpoints, 1)
+    for i in range(1, appends + 1):
+        start = time.perf_counter()
+        edit.append(TRANSCRIPT if i % 2 else ANSWER)
+        app.processEvents()
+        timings.append((time.perf_counter() - start) * 1000)
+        if i % every == 0:
+            document = edit.document()
+            samples.append({
+                "appends": i,
+                "median_append_ms": round(statistics.median(timings), 3),
+                "max_append_ms": round(max(timings), 3),
+                "blocks": document.blockCount(),
+                "text_bytes": ScrollbackLimiter.document_bytes(document),
+                "rss_mb": rss_mb(),
+            })
+            timings = []
+
+    result = {"limit": limiter_options or None, "samples": samples}
+    if limiter is not None:
+        result["scrollback"] = limiter.stats()
+    highlighter.setDocument(None)
+    edit.deleteLater()
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Response area scrollback benchmark")
+    parser.add_argument("--appends", type=int, default=20000)
+    parser.add_argument("--checkpoints", type=int, default=10)
+    parser.add_argument("--max-blocks", type=int, default=5000)
+    parser.add_argument("--max-bytes", type=int, default=4194304)
+    parser.add_argument("--trim-ratio", type=float, default=0.2)
+    parser.add_argument("--output", help="Куда сохранить JSON с результатами")
+    args = parser.parse_args(argv)
+
+    app = QApplication(sys.argv[:1])
+    limit = {"max_blocks": args.max_blocks, "max_bytes": args.max_bytes, "trim_ratio": args.trim_ratio}
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "appends": args.appends,
+        # Сначала с ограничением: RSS неограниченного прогона не возвращается системе
+        "limited": run_session(app, args.appends, args.checkpoints, limit),
+        "unlimited": run_session(app, args.appends, args.checkpoints, None),
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+    app.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import logging
+import threading
+
+
+class RequestCancelled(Exception):
+    """Запрос отменён через CancellationToken"""
+
+
+class CancellationToken:
+    """Токен кооперативной отмены запроса.
+
+    Может отменяться из любого потока. Движок запросов регистрирует
+    колбэк, который отменяет задачу в цикле событий, поэтому ожидание
+    ответа или очередного фрагмента стрима прерывается сразу, а
+    соединение закрывается, не дожидаясь таймаута.
+    """
+
+    def __init__(self, request_id: int = 0):
+        self.request_id = request_id
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self):
+        """Отмена запроса; повторные вызовы ничего не делают"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks = list(self._callbacks)
+
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logging.error(f"Cancellation callback failed: {e}")
+        logging.info(f"Request {self.request_id} cancelled")
+
+    def add_callback(self, callback):
+        """Регистрирует функцию, вызываемую при отмене (сразу, если уже отменён)"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def wait(self, timeout: float) -> bool:
+        """Ожидание с досрочным выходом при отмене; True — если отменён"""
+        return self._event.wait(timeout)
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise RequestCancelled(f"Запрос {self.request_id} отменён")
@@ -0,0 +1,352 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+
+import numpy as np
+from PyQt6.QtCore import QPoint
+from PyQt6.QtGui import QGuiApplication, QImage
+
+
+class CaptureBackend:
+    """Базовый интерфейс бэкенда захвата экрана.
+
+    grab() возвращает кадр как массив NumPy формы (h, w, 4) в порядке байт BGRA.
+    Массив может ссылаться на внутренний буфер бэкенда и остаётся валидным
+    только до следующего вызова grab().
+    """
+
+    name = "base"
+
+    def grab(self, x: int, y: int, w: int, h: int) -> np.ndarray:
+        raise NotImplementedError
+
+    def close(self):
+        """Освобождение ресурсов бэкенда"""
+
+
+class QtCaptureBackend(CaptureBackend):
+    """Захват через QScreen.grabWindow — работает везде, где есть Qt"""
+
+    name = "qt"
+
+    def grab(self, x: int, y: int, w: int, h: int) -> np.ndarray:
+        screen = QGuiApplication.primaryScreen()
+        if not screen:
+            raise RuntimeError("Экран не найден")
+
+        pixmap = screen.grabWindow(0, x, y, w, h)
+        if pixmap.isNull():
+            raise ValueError("Не удалось сделать скриншот")
+
+        image = pixmap.toImage().convertToFormat(QImage.Format.Format_RGB32)
+        ptr = image.constBits()
+        ptr.setsize(image.sizeInBytes())
+        stride = image.bytesPerLine()
+        frame = np.frombuffer(ptr, dtype=np.uint8).reshape(image.height(), stride // 4, 4)
+        # QImage освободит память после выхода из функции, поэтому копируем
+        return frame[:, :image.width()].copy()
+
+
+# --- X11 MIT-SHM ---
+
+_IPC_PRIVATE = 0
+_IPC_CREAT = 0o1000
+_IPC_RMID = 0
+_ZPIXMAP = 2
+_ALL_PLANES = ctypes.c_ulong(-1).value
+
+
+class _XShmSegmentInfo(ctypes.Structure):
+    _fields_ = [
+        ("shmseg", ctypes.c_ulong),
+        ("shmid", ctypes.c_int),
+        ("shmaddr", ctypes.c_void_p),
+        ("readOnly", ctypes.c_int),
+    ]
+
+
+class _XErrorEvent(ctypes.Structure):
+    _fields_ = [
+        ("type", ctypes.c_int),
+        ("display", ctypes.c_void_p),
+        ("resourceid", ctypes.c_ulong),
+        ("serial", ctypes.c_ulong),
+        ("error_code", ctypes.c_ubyte),
+        ("request_code", ctypes.c_ubyte),
+        ("minor_code", ctypes.c_ubyte),
+    ]
+
+
+_XErrorHandler = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.POINTER(_XErrorEvent))
+
+
+class _XImage(ctypes.Structure):
+    # Только начальные поля структуры XImage, которые нам нужны
+    _fields_ = [
+        ("width", ctypes.c_int),
+        ("height", ctypes.c_int),
+        ("xoffset", ctypes.c_int),
+        ("format", ctypes.c_int),
+        ("data", ctypes.c_void_p),
+        ("byte_order", ctypes.c_int),
+        ("bitmap_unit", ctypes.c_int),
+        ("bitmap_bit_order", ctypes.c_int),
+        ("bitmap_pad", ctypes.c_int),
+        ("depth", ctypes.c_int),
+        ("bytes_per_line", ctypes.c_int),
+        ("bits_per_pixel", ctypes.c_int),
+    ]
+
+
+class XShmCaptureBackend(CaptureBackend):
+    """Захват через расширение X11 MIT-SHM.
+
+    Кадр копируется X-сервером прямо в заранее выделенный сегмент разделяемой
+    памяти, который переиспользуется между вызовами, пока размер области не
+    изменится. grab() возвращает NumPy-представление этого сегмента без копий.
+
+    Область задаётся в логических координатах Qt: она пересчитывается в
+    физические пиксели по devicePixelRatio экрана и обрезается по корневому
+    окну. Ошибки X-протокола перехватываются (обработчик Xlib по умолчанию
+    завершил бы процесс), и такой кадр снимается через Qt.
+    """
+
+    name = "xshm"
+
+    def __init__(self, display_name: str = None):
+        self._x11 = self._load_library("X11")
+        self._xext = self._load_library("Xext")
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._declare_functions()
+
+        self._display = self._x11.XOpenDisplay(display_name.encode() if display_name else None)
+        if not self._display:
+            raise RuntimeError("Не удалось подключиться к X-серверу")
+
+        if not self._xext.XShmQueryExtension(self._display):
+            self._x11.XCloseDisplay(self._display)
+            self._display = None
+            raise RuntimeError("X-сервер не поддерживает MIT-SHM")
+
+        screen = self._x11.XDefaultScreen(self._display)
+        self._root = self._x11.XDefaultRootWindow(self._display)
+        self._visual = self._x11.XDefaultVisual(self._display, screen)
+        self._depth = self._x11.XDefaultDepth(self._display, screen)
+
+        self._image = None
+        self._shminfo = None
+        self._frame = None
+        self._x_error = None
+        self._error_handler = _XErrorHandler(self._on_x_error)  # ссылка держит колбэк живым
+        self._fallback = None
+        logging.info("XShm capture backend initialized")
+
+    @staticmethod
+    def _load_library(name: str):
+        path = ctypes.util.find_library(name)
+        if not path:
+            raise RuntimeError(f"Библиотека lib{name} не найдена")
+        return ctypes.CDLL(path)
+
+    def _declare_functions(self):
+        x11, xext, libc = self._x11, self._xext, self._libc
+
+        x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        x11.XOpenDisplay.restype = ctypes.c_void_p
+        x11.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        x11.XDefaultScreen.argtypes = [ctypes.c_void_p]
+        x11.XDefaultScreen.restype = ctypes.c_int
+        x11.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        x11.XDefaultRootWindow.restype = ctypes.c_ulong
+        x11.XDefaultVisual.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDefaultVisual.restype = ctypes.c_void_p
+        x11.XDefaultDepth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDefaultDepth.restype = ctypes.c_int
+        x11.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDestroyImage.argtypes = [ctypes.POINTER(_XImage)]
+        x11.XSetErrorHandler.argtypes = [ctypes.c_void_p]
+        x11.XSetErrorHandler.restype = ctypes.c_void_p
+        x11.XGetGeometry.argtypes = [
+            ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(ctypes.c_ulong),
+            ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int),
+            ctypes.POINTER(ctypes.c_uint), ctypes.POINTER(ctypes.c_uint),
+            ctypes.POINTER(ctypes.c_uint), ctypes.POINTER(ctypes.c_uint),
+        ]
+        x11.XGetGeometry.restype = ctypes.c_int
+
+        xext.XShmQueryExtension.argtypes = [ctypes.c_void_p]
+        xext.XShmQueryExtension.restype = ctypes.c_int
+        xext.XShmCreateImage.argtypes = [
+            ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int,
+            ctypes.c_void_p, ctypes.POINTER(_XShmSegmentInfo), ctypes.c_uint, ctypes.c_uint,
+        ]
+        xext.XShmCreateImage.restype = ctypes.POINTER(_XImage)
+        xext.XShmAttach.argtypes = [ctypes.c_void_p, ctypes.POINTER(_XShmSegmentInfo)]
+        xext.XShmAttach.restype = ctypes.c_int
+        xext.XShmDetach.argtypes = [ctypes.c_void_p, ctypes.POINTER(_XShmSegmentInfo)]
+        xext.XShmDetach.restype = ctypes.c_int
+        xext.XShmGetImage.argtypes = [
+            ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(_XImage),
+            ctypes.c_int, ctypes.c_int, ctypes.c_ulong,
+        ]
+        xext.XShmGetImage.restype = ctypes.c_int
+
+        libc.shmget.argtypes = [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]
+        libc.shmget.restype = ctypes.c_int
+        libc.shmat.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]
+        libc.shmat.restype = ctypes.c_void_p
+        libc.shmdt.argtypes = [ctypes.c_void_p]
+        libc.shmdt.restype = ctypes.c_int
+        libc.shmctl.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
+        libc.shmctl.restype = ctypes.c_int
+
+    def _ensure_buffer(self, w: int, h: int):
+        """Выделяет сегмент под кадр w×h, если текущий не подходит по размеру"""
+        if self._image and self._image.contents.width == w and self._image.contents.height == h:
+            return
+
+        self._release_buffer()
+
+        shminfo = _XShmSegmentInfo()
+        image = self._xext.XShmCreateImage(
+            self._display, self._visual, self._depth, _ZPIXMAP, None, ctypes.byref(shminfo), w, h
+        )
+        if not image:
+            raise RuntimeError("XShmCreateImage завершился с ошибкой")
+
+        contents = image.contents
+        if contents.bits_per_pixel != 32:
+            self._x11.XDestroyImage(image)
+            raise RuntimeError(f"Неподдерживаемый формат пикселей: {contents.bits_per_pixel} bpp")
+
+        size = contents.bytes_per_line * h
+        shmid = self._libc.shmget(_IPC_PRIVATE, size, _IPC_CREAT | 0o600)
+        if shmid < 0:
+            self._x11.XDestroyImage(image)
+            raise OSError(ctypes.get_errno(), "shmget завершился с ошибкой")
+
+        addr = self._libc.shmat(shmid, None, 0)
+        if addr in (None, ctypes.c_void_p(-1).value):
+            self._libc.shmctl(shmid, _IPC_RMID, None)
+            self._x11.XDestroyImage(image)
+            raise OSError(ctypes.get_errno(), "shmat завершился с ошибкой")
+
+        shminfo.shmid = shmid
+        shminfo.shmaddr = addr
+        shminfo.readOnly = 0
+        contents.data = addr
+
+        if not self._xext.XShmAttach(self._display, ctypes.byref(shminfo)):
+            self._libc.shmdt(addr)
+            self._libc.shmctl(shmid, _IPC_RMID, None)
+            contents.data = None
+            self._x11.XDestroyImage(image)
+            raise RuntimeError("XShmAttach завершился с ошибкой")
+        self._x11.XSync(self._display, 0)
+        # Сегмент удалится автоматически, когда от него отсоединятся все процессы
+        self._libc.shmctl(shmid, _IPC_RMID, None)
+
+        self._image = image
+        self._shminfo = shminfo
+        raw = (ctypes.c_uint8 * size).from_address(addr)
+        self._frame = np.frombuffer(raw, dtype=np.uint8).reshape(
+            h, contents.bytes_per_line // 4, 4
+        )[:, :w]
+        logging.info(f"XShm buffer allocated: {w}x{h}")
+
+    def grab(self, x: int, y: int, w: int, h: int) -> np.ndarray:
+        region = self._physical_region(x, y, w, h)
+        if region is None:
+            raise ValueError("Область захвата за пределами экрана")
+        self._ensure_buffer(region[2], region[3])
+
+        self._x_error = None
+        previous = self._x11.XSetErrorHandler(ctypes.cast(self._error_handler, ctypes.c_void_p))
+        try:
+            ok = self._xext.XShmGetImage(
+                self._display, self._root, self._image, region[0], region[1], _ALL_PLANES
+            )
+            self._x11.XSync(self._display, 0)
+        finally:
+            self._x11.XSetErrorHandler(previous)
+        if self._x_error is not None or not ok:
+            logging.warning(f"XShmGetImage failed (X error {self._x_error}), capturing via Qt")
+            if self._fallback is None:
+                self._fallback = QtCaptureBackend()
+            return self._fallback.grab(x, y, w, h)
+        return self._frame
+
+    def _on_x_error(self, display, event) -> int:
+        # Вызывается Xlib внутри XShmGetImage/XSync; возврат без исключений обязателен
+        self._x_error = event.contents.error_code
+        return 0
+
+    def _physical_region(self, x: int, y: int, w: int, h: int):
+        """Логическая область Qt → физические пиксели корневого окна, обрезанные по нему"""
+        screen = QGuiApplication.screenAt(QPoint(x, y)) or QGuiApplication.primaryScreen()
+        if screen is not None:
+            ratio = screen.devicePixelRatio()
+            if ratio != 1:
+                # Начало экрана в Qt не масштабируется, масштабируется смещение внутри него
+                origin = screen.geometry().topLeft()
+                left = origin.x() + round((x - origin.x()) * ratio)
+                top = origin.y() + round((y - origin.y()) * ratio)
+                right = origin.x() + round((x + w - origin.x()) * ratio)
+                bottom = origin.y() + round((y + h - origin.y()) * ratio)
+                x, y, w, h = left, top, right - left, bottom - top
+
+        root_w, root_h = self._root_size()
+        left, top = max(x, 0), max(y, 0)
+        right, bottom = min(x + w, root_w), min(y + h, root_h)
+        if right <= left or bottom <= top:
+            return None
+        return left, top, right - left, bottom - top
+
+    def _root_size(self):
+        """Текущий размер корневого окна (меняется при смене мониторов)"""
+        root = ctypes.c_ulong()
+        x, y = ctypes.c_int(), ctypes.c_int()
+        w, h, border, depth = ctypes.c_uint(), ctypes.c_uint(), ctypes.c_uint(), ctypes.c_uint()
+        self._x11.XGetGeometry(
+            self._display, self._root, ctypes.byref(root), ctypes.byref(x), ctypes.byref(y),
+            ctypes.byref(w), ctypes.byref(h), ctypes.byref(border), ctypes.byref(depth),
+        )
+        return w.value, h.value
+
+    def _release_buffer(self):
+        if not self._image:
+            return
+        self._frame = None
+        self._xext.XShmDetach(self._display, ctypes.byref(self._shminfo))
+        self._x11.XSync(self._display, 0)
+        self._libc.shmdt(self._shminfo.shmaddr)
+        # data указывает на разделяемую память, XDestroyImage не должен её освобождать
+        self._image.contents.data = None
+        self._x11.XDestroyImage(self._image)
+        self._image = None
+        self._shminfo = None
+
+    def close(self):
+        if self._display:
+            self._release_buffer()
+            self._x11.XCloseDisplay(self._display)
+            self._display = None
+            logging.info("XShm capture backend closed")
+
+
+def create_capture_backend(preferred: str = None) -> CaptureBackend:
+    """Возвращает самый быстрый доступный бэкенд захвата.
+
+    preferred: "xshm" или "qt"; по умолчанию берётся из переменной
+    окружения CAPTURE_BACKEND, иначе XShm под X11 с откатом на Qt.
+    """
+    preferred = (preferred or os.getenv("CAPTURE_BACKEND", "")).lower()
+
+    if preferred != "qt" and os.getenv("DISPLAY") and not os.getenv("WAYLAND_DISPLAY"):
+        try:
+            return XShmCaptureBackend()
+        except Exception as e:
+            logging.warning(f"XShm capture unavailable, falling back to Qt: {e}")
+
+    return QtCaptureBackend()
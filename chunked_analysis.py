@@ -0,0 +1,273 @@
+import logging
+import re
+import time
+from functools import partial
+
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+
+from prompt_budget import estimate_tokens, get_prompt_preparer, truncate_to_budget
+from providers import get_registry
+from request_scheduler import PRIORITY_OCR
+from response_cache import get_response_cache, make_cache_key
+
+# Начало определения верхнего уровня: функция, класс, декоратор и т.п.
+_BOUNDARY_RE = re.compile(
+    r"^(?:@|(?:async\s+)?def\s|class\s|function\s|func\s|fn\s|interface\s|struct\s|impl\b|"
+    r"(?:export\s+)?(?:public|private|protected|static)\s)"
+)
+
+CHUNK_TEMPLATE = (
+    "Фрагмент {index} из {total} кода, распознанного со скриншота. "
+    "Кратко опиши, что он делает, и укажи ошибки:\n\n{text}"
+)
+MERGE_TEMPLATE = (
+    "Ниже анализы {total} последовательных фрагментов одного кода. "
+    "Объедини их в единый связный ответ без повторов:\n\n{text}"
+)
+
+
+def _split_lines(lines: list, chunk_tokens: int) -> list:
+    """Делит слишком длинный участок по пустым строкам, а если не хватает — по строкам"""
+    pieces, current = [], []
+    for line in lines:
+        current.append(line)
+        if not line.strip() and estimate_tokens("\n".join(current)) >= chunk_tokens // 2:
+            pieces.append(current)
+            current = []
+    if current:
+        pieces.append(current)
+
+    result = []
+    for piece in pieces:
+        if estimate_tokens("\n".join(piece)) <= chunk_tokens:
+            result.append(piece)
+            continue
+        group, used = [], 0
+        for line in piece:
+            cost = estimate_tokens(line) + 1
+            if group and used + cost > chunk_tokens:
+                result.append(group)
+                group, used = [], 0
+            group.append(line)
+            used += cost
+        if group:
+            result.append(group)
+    return result
+
+
+def split_code(text: str, chunk_tokens: int) -> list:
+    """Разбиение кода на фрагменты не больше chunk_tokens.
+
+    Режем по определениям верхнего уровня (def/class/function…), длинные
+    определения — по пустым строкам; соседние мелкие части склеиваются.
+    """
+    segments, current = [], []
+    for line in text.splitlines():
+        boundary = _BOUNDARY_RE.match(line)
+        after_decorator = current and current[-1].startswith("@")
+        if boundary and current and not after_decorator:
+            segments.append(current)
+            current = []
+        current.append(line)
+    if current:
+        segments.append(current)
+
+    pieces = []
+    for segment in segments:
+        if estimate_tokens("\n".join(segment)) > chunk_tokens:
+            pieces.extend(_split_lines(segment, chunk_tokens))
+        else:
+            pieces.append(segment)
+
+    chunks, current, used = [], [], 0
+    for piece in pieces:
+        cost = estimate_tokens("\n".join(piece))
+        if current and used + cost > chunk_tokens:
+            chunks.append("\n".join(current).strip("\n"))
+            current, used = [], 0
+        current.extend(piece)
+        used += cost
+    if current:
+        chunks.append("\n".join(current).strip("\n"))
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+class ChunkedAnalysis(QObject):
+    """Map-reduce анализ большого кода: фрагменты параллельно, затем слияние.
+
+    Фрагменты отправляются через RequestCoordinator не более max_parallel
+    одновременно, поэтому общее время близко к самому медленному
+    фрагменту, а не к сумме. Итоговый запрос объединяет частичные ответы.
+    """
+
+    finished = pyqtSignal(str)
+    error = pyqtSignal(str)
+    progress = pyqtSignal(int)
+    chunk_received = pyqtSignal(str)  # стриминг итогового запроса
+    cancelled = pyqtSignal()  # незавершённый анализ отменён
+
+    def __init__(self, coordinator, enabled: bool = True, min_tokens: int = 1500,
+                 chunk_tokens: int = 800, max_parallel: int = 4, parent=None):
+        super().__init__(parent)
+        self.coordinator = coordinator
+        self.enabled = enabled
+        self.min_tokens = min_tokens
+        self.chunk_tokens = chunk_tokens
+        self.max_parallel = max(1, max_parallel)
+        self._run = 0
+        self._futures = []
+        self._queue = []
+        self._results = []
+        self._timings = []
+        self._running = 0
+        self._started_at = 0.0
+        self._provider = None
+        self._merge_future = None
+
+    @property
+    def provider(self) -> str:
+        """Title провайдера, ответившего на итоговый запрос последнего анализа"""
+        if self._merge_future is not None and self._merge_future.provider:
+            return self._merge_future.provider
+        return self._provider.title if self._provider is not None else ""
+
+    def accepts(self, text: str) -> bool:
+        """Нужно ли разбивать текст на фрагменты"""
+        return self.enabled and estimate_tokens(text) > self.min_tokens
+
+    def start(self, api_name: str, code: str) -> int:
+        """Запуск анализа; предыдущий незавершённый анализ отменяется"""
+        self.cancel()
+        self._run += 1
+        self._merge_future = None
+        self._provider = get_registry().get(api_name)
+        budget = get_prompt_preparer().budget_for(self._provider)
+        overhead = estimate_tokens(CHUNK_TEMPLATE.format(index=0, total=0, text=""))
+        chunks = split_code(code, max(min(self.chunk_tokens, budget - overhead), 1))
+
+        total = len(chunks)
+        self._queue = [
+            (index, CHUNK_TEMPLATE.format(index=index + 1, total=total, text=chunk))
+            for index, chunk in enumerate(chunks)
+        ]
+        self._results = [None] * total
+        self._timings = [0.0] * total
+        self._running = 0
+        self._started_at = time.perf_counter()
+        logging.info(f"Chunked analysis {self._run}: {total} chunks via {self._provider.name}")
+
+        self.progress.emit(0)
+        self._launch_next()
+        return self._run
+
+    def cancel(self):
+        active = bool(self._futures or self._queue or self._running)
+        for future in self._futures:
+            self.coordinator.release(future)
+        self._futures = []
+        self._queue = []
+        self._running = 0
+        self._run += 1
+        if active:
+            self.cancelled.emit()
+
+    def _submit(self, prompt: str, on_finished, on_error):
+        """Запрос через координатор (с кэшем и слиянием одинаковых запросов)"""
+        provider = self._provider
+        key = make_cache_key(provider.name, provider.model, provider.temperature, prompt)
+        cached = get_response_cache().get(key)
+        if cached is not None:
+            QTimer.singleShot(0, partial(on_finished, cached))
+            return None
+
+        future = self.coordinator.submit(provider.name, prompt, key, priority=PRIORITY_OCR)
+        future.finished.connect(on_finished)
+        future.error.connect(on_error)
+        self._futures.append(future)
+        return future
+
+    def _launch_next(self):
+        while self._queue and self._running < self.max_parallel:
+            index, prompt = self._queue.pop(0)
+            self._running += 1
+            self._timings[index] = time.perf_counter()
+            self._submit(
+                prompt,
+                partial(self._chunk_done, self._run, index),
+                partial(self._chunk_failed, self._run, index),
+            )
+
+    def _chunk_done(self, run: int, index: int, response: str):
+        if run != self._run:
+            return
+        self._timings[index] = time.perf_counter() - self._timings[index]
+        self._results[index] = response
+        self._after_chunk()
+
+    def _chunk_failed(self, run: int, index: int, error: str):
+        if run != self._run:
+            return
+        logging.warning(f"Chunk {index + 1} of analysis {run} failed: {error}")
+        self._timings[index] = time.perf_counter() - self._timings[index]
+        self._results[index] = ""
+        self._after_chunk()
+
+    def _after_chunk(self):
+        self._running -= 1
+        total = len(self._results)
+        done = sum(result is not None for result in self._results)
+        self.progress.emit(done * 100 // (total + 1))
+        if done < total:
+            self._launch_next()
+            return
+
+        self._futures = []
+        wall = time.perf_counter() - self._started_at
+        logging.info(
+            f"Chunked analysis {self._run}: {total} chunks in {wall:.2f}s "
+            f"(slowest {max(self._timings):.2f}s, sequential would be ~{sum(self._timings):.2f}s)"
+        )
+        if not any(self._results):
+            self.error.emit("Не удалось проанализировать ни один фрагмент")
+            return
+        if total == 1:
+            self.progress.emit(100)
+            self.finished.emit(self._results[0])
+            return
+        self._merge()
+
+    def _merge(self):
+        total = len(self._results)
+        budget = get_prompt_preparer().budget_for(self._provider)
+        overhead = estimate_tokens(MERGE_TEMPLATE.format(total=total, text=""))
+        share = max((budget - overhead) // total, 1)
+        parts = [
+            f"### Фрагмент {index + 1}\n"
+            + (truncate_to_budget(result, share) if result else "(анализ не получен)")
+            for index, result in enumerate(self._results)
+        ]
+        prompt = MERGE_TEMPLATE.format(total=total, text="\n\n".join(parts))
+
+        run = self._run
+        future = self._submit(prompt, partial(self._merge_done, run), partial(self._merge_failed, run))
+        self._merge_future = future
+        if future is not None:
+            future.chunk_received.connect(partial(self._merge_chunk, run))
+
+    def _merge_chunk(self, run: int, chunk: str):
+        if run == self._run:
+            self.chunk_received.emit(chunk)
+
+    def _merge_done(self, run: int, response: str):
+        if run != self._run:
+            return
+        self._futures = []
+        logging.info(f"Chunked analysis {run} merged in {time.perf_counter() - self._started_at:.2f}s")
+        self.progress.emit(100)
+        self.finished.emit(response)
+
+    def _merge_failed(self, run: int, error: str):
+        if run != self._run:
+            return
+        self._futures = []
+        self.error.emit(error)
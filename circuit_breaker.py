@@ -0,0 +1,138 @@
+import logging
+import threading
+import time
+
+from app_config import config_section
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class ProviderUnavailable(Exception):
+    """Предохранитель провайдера разомкнут — запрос не отправлялся"""
+
+
+class CircuitBreaker:
+    """Предохранитель одного провайдера.
+
+    После failure_threshold сбоев подряд размыкается, и запросы сразу
+    получают ProviderUnavailable. Через reset_timeout секунд пропускается
+    один пробный запрос (half-open): успех замыкает цепь, сбой снова
+    размыкает её на reset_timeout.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self.rejected = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def _update(self, now: float):
+        if self.state == OPEN and now - self.opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+            self._probe_in_flight = False
+
+    def healthy(self, now: float = None) -> bool:
+        """Можно ли сейчас отправить запрос (без занятия пробного слота)"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._update(now)
+            return self.state == CLOSED or (self.state == HALF_OPEN and not self._probe_in_flight)
+
+    def allow(self, now: float = None) -> bool:
+        """Разрешение на запрос; в half-open проходит только один пробный"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._update(now)
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                logging.info(f"Circuit {self.name}: half-open probe")
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logging.info(f"Circuit {self.name}: closed")
+            self.state = CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self, now: float = None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.trips += 1
+                    logging.warning(f"Circuit {self.name}: open after {self.failures} failures")
+                self.state = OPEN
+                self.opened_at = now
+                self._probe_in_flight = False
+
+    def release(self):
+        """Пробный запрос отменён, не дав результата"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            self._update(time.monotonic())
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "trips": self.trips,
+                "rejected": self.rejected,
+            }
+
+
+class BreakerRegistry:
+    """Предохранители всех провайдеров"""
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0, failover: bool = True):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failover = failover
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = self._breakers[name] = CircuitBreaker(
+                    name, self.failure_threshold, self.reset_timeout
+                )
+            return breaker
+
+    def healthy(self, providers: list) -> list:
+        """Провайдеры, чей предохранитель сейчас пропускает запросы"""
+        return [p for p in providers if self.get(p.name).healthy()]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.name: breaker.as_dict() for breaker in breakers}
+
+
+_breakers = None
+_breakers_lock = threading.Lock()
+
+
+def get_breakers() -> BreakerRegistry:
+    """Общие предохранители; параметры из раздела circuit_breaker в config.yaml"""
+    global _breakers
+    with _breakers_lock:
+        if _breakers is None:
+            _breakers = BreakerRegistry(**config_section("circuit_breaker"))
+        return _breakers
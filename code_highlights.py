@@ -1,18 +1,10 @@
-from pygments import highlight
-from pygments.lexers import get_lexer_by_name
-from pygments.formatters import HtmlFormatter
+from highlighting import get_highlighter
 
 class CodeHighlighter:
     @staticmethod
     def highlight(code, language):
         try:
-            lexer = get_lexer_by_name(language, stripall=True)
-            formatter = HtmlFormatter(
-                style='monokai',
-                noclasses=True,
-                cssstyles="font-family: 'Consolas', monospace;"
-            )
-            return highlight(code, lexer, formatter)
+            return get_highlighter().highlight(code, language or None, style='monokai', variant="block")
         except:
-            # Fallback если язык не распознан
-            return f'<pre style="font-family: Consolas">{code}</pre>'
\ No newline at end of file
+            # Fallback если подсветка не удалась
+            return f'<pre style="font-family: Consolas">{code}</pre>'
@@ -0,0 +1,94 @@
+import logging
+import re
+
+from prompt_budget import estimate_tokens
+
+DEFAULT_SYSTEM_PROMPT = (
+    "Ты — помощник программиста. Отвечай по существу, "
+    "код оформляй блоками Markdown."
+)
+
+# Вопрос, с которого начинается диалог по коду со скриншота
+CODE_ANALYSIS_PROMPT = "Проанализируй этот код: что он делает и какие в нём есть ошибки?"
+
+
+def _first_sentence(text: str, limit: int = 200) -> str:
+    text = re.sub(r"\s+", " ", text).strip()
+    match = re.search(r"[.!?](\s|$)", text)
+    if match and match.end() <= limit:
+        return text[:match.end()].strip()
+    return text if len(text) <= limit else text[:limit].rstrip() + "…"
+
+
+class ConversationSession:
+    """Диалог с провайдером: история сообщений с ограничением по токенам.
+
+    Сообщения собираются так, чтобы начало запроса не менялось между
+    ходами: сначала системный промпт вместе с кодом со скриншота, затем
+    краткое содержание старых ходов и последние ходы целиком. Совпадающий
+    префикс позволяет провайдеру применить кэширование промпта.
+    Ходы, не помещающиеся в max_history_tokens, сворачиваются в краткое
+    содержание (первое предложение вопроса и ответа) без доп. запроса.
+    """
+
+    def __init__(self, enabled: bool = True, system_prompt: str = DEFAULT_SYSTEM_PROMPT,
+                 max_history_tokens: int = 3000, min_turns: int = 2, summary_tokens: int = 400):
+        self.enabled = enabled
+        self.system_prompt = system_prompt
+        self.max_history_tokens = max_history_tokens
+        self.min_turns = min_turns
+        self.summary_tokens = summary_tokens
+        self.context = ""
+        self.turns = []  # пары (вопрос, ответ)
+        self.summary = []
+
+    def reset(self):
+        """Новый диалог: код и история забываются"""
+        self.context = ""
+        self.turns = []
+        self.summary = []
+
+    def set_context(self, code: str):
+        """Код со скриншота в начале диалога; новый код начинает новый диалог"""
+        if code != self.context:
+            self.reset()
+            self.context = code
+
+    def messages(self, prompt: str) -> list:
+        """Сообщения для запроса с новым вопросом prompt"""
+        system = self.system_prompt
+        if self.context:
+            system += f"\n\nКод со скриншота:\n```\n{self.context}\n```"
+        messages = [{"role": "system", "content": system}]
+        if self.summary:
+            messages.append({
+                "role": "system",
+                "content": "Краткое содержание начала диалога:\n" + "\n".join(self.summary),
+            })
+        for question, answer in self.turns:
+            messages.append({"role": "user", "content": question})
+            messages.append({"role": "assistant", "content": answer})
+        messages.append({"role": "user", "content": prompt})
+        return messages
+
+    def add_turn(self, question: str, answer: str):
+        self.turns.append((question, answer))
+        self._slide_window()
+
+    def history_tokens(self) -> int:
+        return sum(estimate_tokens(q) + estimate_tokens(a) for q, a in self.turns)
+
+    def _slide_window(self):
+        """Сворачивает старые ходы, пока история не уложится в бюджет"""
+        folded = 0
+        while len(self.turns) > self.min_turns and self.history_tokens() > self.max_history_tokens:
+            question, answer = self.turns.pop(0)
+            self.summary.append(f"- {_first_sentence(question)} → {_first_sentence(answer)}")
+            folded += 1
+        while len(self.summary) > 1 and estimate_tokens("\n".join(self.summary)) > self.summary_tokens:
+            self.summary.pop(0)
+        if folded:
+            logging.info(
+                f"Conversation window: folded {folded} turns into summary, "
+                f"{len(self.turns)} turns / {self.history_tokens()} tokens kept"
+            )
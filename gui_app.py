@@ -5,17 +5,27 @@ from PyQt6.QtGui import QTextCursor
 from PyQt6.QtWidgets import (
     QMainWindow, QVBoxLayout, QHBoxLayout, QWidget,
     QTextEdit, QPushButton, QComboBox, QProgressBar,
-    QLabel, QGroupBox, QLineEdit, QListWidget, QRubberBand, QSizePolicy
+    QLabel, QGroupBox, QLineEdit, QListView, QRubberBand, QSizePolicy, QCheckBox
 )
-from markdown import markdown
-from markdown.extensions.codehilite import CodeHiliteExtension
 
-from api_client import APIWorker, APIClient  # Ваш реальный клиент API
+from api_client import APIClient, AUTO_PROVIDER  # Ваш реальный клиент API
 from audio_manager import AudioManager
 from history_manager import HistoryManager
+from markdown_renderer import AnswerQueue, MarkdownAppender
+from api_engine import get_engine
+from app_config import config_section
+from chunked_analysis import ChunkedAnalysis
+from conversation import CODE_ANALYSIS_PROMPT, ConversationSession
 from overlay_for_screenshot import ScreenSelectionOverlay
+from prompt_budget import get_prompt_preparer, truncate_to_budget
+from providers import get_registry
+from request_coordinator import RequestCoordinator
+from request_scheduler import PRIORITY_OCR, PRIORITY_TYPED, PRIORITY_VOICE
+from response_cache import get_response_cache
 from screenshot_manager import ScreenshotManager
+from scrollback import ScrollbackLimiter
 from speech_recognizer import WhisperRecognizer
+from stats_dialog import ProviderStatsDialog
 from text_formatter import TextFormatter, MarkdownHighlighter
 
 
@@ -31,7 +41,7 @@ class MainWindow(QMainWindow):
         self._init_rubber_band()
         self.audio_manager.audio.audio_data_ready.connect(self._process_audio_data)
         self.whisper.text_recognized.connect(self._on_audio_text_ready)
-        self.whisper.error_occurred.connect(self._handle_error)
+        self.whisper.error_occurred.connect(self._report_error)
         self.history = []
         self.selection_overlay = None
         self.selected_region = None
@@ -45,17 +55,27 @@ class MainWindow(QMainWindow):
             if text:
                 self.whisper.text_recognized.emit(text)
         except Exception as e:
-            self._handle_error(f"Ошибка распознавания аудио: {e}")
+            self._report_error(f"Ошибка распознавания аудио: {e}")
 
     def _init_managers(self):
         """Инициализация всех менеджеров"""
-        self.api_client = APIClient()  # Ваш реальный API клиент
+        # Общий координатор: одинаковые запросы из голоса, OCR и поля ввода сливаются
+        self.request_coordinator = RequestCoordinator(self)
+        self.api_client = APIClient(self.request_coordinator)  # Ваш реальный API клиент
+        self.analysis_client = APIClient(self.request_coordinator, PRIORITY_OCR)  # Анализ кода со скриншотов
+        # Голос: ответы на реплики идут по очереди, ждущие в очереди реплики сливаются
+        self.voice_client = APIClient(self.request_coordinator, PRIORITY_VOICE, exclusive=False)
+        self.chunked_analysis = ChunkedAnalysis(self.request_coordinator, **config_section("chunking"), parent=self)
+        self.conversation = ConversationSession(**config_section("conversation"))
+        self._analysis_question = None  # вопрос анализа кода, ждущий ответа
+        self._pending_live_question = None  # вопрос, отвеченный из истории
         self.audio_manager = AudioManager()
         self.screenshot_manager = ScreenshotManager()
         self.text_formatter = TextFormatter()
 
-        self.history_panel = QListWidget()
-        self.history_manager = HistoryManager(self.history_panel)
+        self.history_panel = QListView()
+        self.history_search = QLineEdit()
+        self.history_manager = HistoryManager(self.history_panel, self.history_search)
 
     def _setup_ui(self):
         """Настройка пользовательского интерфейса"""
@@ -70,7 +90,13 @@ class MainWindow(QMainWindow):
 
         # Панель истории (слева)
         self._setup_history_panel()
-        main_layout.addWidget(self.history_panel, stretch=1)
+        history_widget = QWidget()
+        history_layout = QVBoxLayout(history_widget)
+        history_layout.setContentsMargins(0, 0, 0, 0)
+        history_layout.setSpacing(5)
+        history_layout.addWidget(self.history_search)
+        history_layout.addWidget(self.history_panel)
+        main_layout.addWidget(history_widget, stretch=1)
 
         # Основная панель (справа)
         right_panel = QWidget()
@@ -108,12 +134,12 @@ class MainWindow(QMainWindow):
         """Настройка панели истории"""
         self.history_panel.setMinimumWidth(250)
         self.history_panel.setStyleSheet("""
-            QListWidget {
+            QListView {
                 border: 1px solid #e1e4e8;
                 border-radius: 4px;
                 padding: 5px;
             }
-            QListWidget::item {
+            QListView::item {
                 padding: 5px;
             }
         """)
@@ -130,14 +156,23 @@ class MainWindow(QMainWindow):
 
         self.btn_clear_history = QPushButton(" 🗑️Очистить историю")
         self.btn_repeat_request = QPushButton(" 🔁Повторить запрос")
+        self.btn_provider_stats = QPushButton(" 📊Статистика")
+        self.btn_new_conversation = QPushButton(" 🆕Новый диалог")
+        self.btn_ask_live = QPushButton(" ↗Спросить заново")
+        self.btn_ask_live.setToolTip("Отправить вопрос провайдеру, а не брать похожий ответ из истории")
+        self.btn_ask_live.setVisible(False)
 
         # Ограничим ширину кнопок, чтобы были аккуратнее
-        for btn in [self.btn_clear_history, self.btn_repeat_request]:
+        for btn in [self.btn_clear_history, self.btn_repeat_request, self.btn_provider_stats,
+                    self.btn_new_conversation, self.btn_ask_live]:
             btn.setMaximumWidth(140)
             btn.setSizePolicy(QSizePolicy.Policy.Fixed, QSizePolicy.Policy.Fixed)
 
         top_layout.addWidget(self.btn_clear_history)
         top_layout.addWidget(self.btn_repeat_request)
+        top_layout.addWidget(self.btn_provider_stats)
+        top_layout.addWidget(self.btn_new_conversation)
+        top_layout.addWidget(self.btn_ask_live)
         top_layout.addStretch(1)  # Отодвинем кнопки влево
 
         # Нижняя линия с остальными контролами
@@ -145,7 +180,12 @@ class MainWindow(QMainWindow):
         bottom_layout.setSpacing(10)
 
         self.api_selector = QComboBox()
-        self.api_selector.addItems(["Cody", "OpenAI", "DeepSeek"])
+        self.api_selector.addItems(get_registry().titles() + [AUTO_PROVIDER])
+
+        self.hedge_toggle = QCheckBox("Хедж")
+        self.hedge_toggle.setToolTip(
+            "Дублировать запрос запасному провайдеру, если основной долго не отвечает"
+        )
 
         self.audio_mode = QComboBox()
         self.audio_mode.addItems(["Системный звук", "Выключено"])
@@ -169,6 +209,7 @@ class MainWindow(QMainWindow):
 
         bottom_layout.addWidget(QLabel("API:"))
         bottom_layout.addWidget(self.api_selector)
+        bottom_layout.addWidget(self.hedge_toggle)
         bottom_layout.addWidget(QLabel("Режим:"))
         bottom_layout.addWidget(self.audio_mode)
         bottom_layout.addWidget(self.btn_select_area)
@@ -189,6 +230,14 @@ class MainWindow(QMainWindow):
         self.response_area = QTextEdit()
         self.response_area.setReadOnly(False)
         self.response_area.setAcceptRichText(True)
+        self.markdown_appender = MarkdownAppender(self.response_area, self)
+        # Ответы на голос и на вопросы из поля ввода выводятся по очереди, не перемешиваясь
+        self.answer_queue = AnswerQueue(self.markdown_appender, self)
+        self.answer_queue.failed.connect(self._show_error)
+        # Старые записи убираются из окна, пока в него не дописывается ответ
+        self.scrollback = ScrollbackLimiter(
+            self.response_area, busy=self._response_in_progress, parent=self, **config_section("scrollback")
+        )
 
         # Поле ввода вопроса
         self.question_input = QLineEdit()
@@ -210,7 +259,7 @@ class MainWindow(QMainWindow):
 
         # Для отправки в API
         self._start_processing("Отправка распознанного текста в API...")
-        self.api_client.send_request(
+        self.voice_client.send_request(
             api_name=self.api_selector.currentText(),
             prompt=text
         )
@@ -225,43 +274,88 @@ class MainWindow(QMainWindow):
 
         self.btn_repeat_request.clicked.connect(self._repeat_request)
         self.btn_clear_history.clicked.connect(self._clear_history)
+        self.btn_new_conversation.clicked.connect(self._new_conversation)
+        self.btn_provider_stats.clicked.connect(self._show_provider_stats)
+        self.btn_ask_live.clicked.connect(self._ask_live)
 
         # Выпадающие списки
         self.audio_mode.currentIndexChanged.connect(self._change_audio_mode)
+        self.hedge_toggle.setChecked(self.request_coordinator.hedging_enabled)
+        self.hedge_toggle.toggled.connect(self._toggle_hedging)
 
         # Поле ввода
         self.question_input.returnPressed.connect(self._ask_question)
 
         # Менеджеры
         self.audio_manager.status_changed.connect(self._update_status)
-        self.audio_manager.error_occurred.connect(self._handle_error)
+        self.audio_manager.error_occurred.connect(self._report_error)
 
         self.screenshot_manager.text_extracted.connect(self._handle_text_extracted)
-        self.screenshot_manager.error_occurred.connect(self._handle_error)
+        self.screenshot_manager.error_occurred.connect(self._report_error)
         self.screenshot_manager.screenshot_taken.connect(self._handle_screenshot_taken)
 
         self.history_manager.item_requested.connect(self._load_history_item)
+        self.history_manager.compacted.connect(self._on_history_compacted)
 
         # API клиент
-        self.api_client.response_received.connect(self._handle_api_response)
+        self.api_client.answered.connect(self._handle_api_response)
         self.api_client.error_occurred.connect(self._handle_error)
+        self.api_client.cancelled.connect(self._handle_cancelled)
         self.api_client.progress_updated.connect(self._update_progress)
+        self.api_client.chunk_received.connect(self._handle_answer_chunk)
+        self.api_client.provider_selected.connect(self._on_provider_selected)
+        self.api_client.usage_reported.connect(self._on_usage_reported)
+
+        self.voice_client.answered.connect(self._handle_api_response)
+        self.voice_client.error_occurred.connect(self._handle_error)
+        self.voice_client.cancelled.connect(self._handle_cancelled)
+        self.voice_client.progress_updated.connect(self._update_progress)
+        self.voice_client.chunk_received.connect(self._handle_answer_chunk)
+        self.voice_client.provider_selected.connect(self._on_provider_selected)
+        self.request_coordinator.scheduler.queue_changed.connect(self._on_queue_changed)
+
+        # Анализ кода выводится через ту же очередь ответов, что голос и вопросы
+        self.analysis_client.answered.connect(
+            lambda question, response, provider: self.handle_response(response, provider, self.analysis_client)
+        )
+        self.analysis_client.error_occurred.connect(self._handle_error)
+        self.analysis_client.cancelled.connect(self._handle_cancelled)
+        self.analysis_client.progress_updated.connect(self.update_progress)
+        self.analysis_client.chunk_received.connect(self._handle_answer_chunk)
+        self.analysis_client.provider_selected.connect(self._on_provider_selected)
+        self.analysis_client.usage_reported.connect(self._on_usage_reported)
+
+        self.chunked_analysis.finished.connect(
+            lambda response: self.handle_response(response, self.chunked_analysis.provider, self.chunked_analysis)
+        )
+        self.chunked_analysis.error.connect(self._handle_error)
+        self.chunked_analysis.cancelled.connect(self._handle_cancelled)
+        self.chunked_analysis.progress.connect(self.update_progress)
+        self.chunked_analysis.chunk_received.connect(self._handle_answer_chunk)
 
     def _clear_history(self):
         self.history_manager.clear_history()
         self._update_status("История запросов очищена")
 
+    def _on_history_compacted(self, result):
+        if "error" in result:
+            self._update_status(f"Не удалось сжать историю: {result['error']}")
+            return
+        self._update_status(
+            f"История сжата: освобождено {result['reclaimed'] / 1024:.0f} КБ "
+            f"(сжато ответов: {result['compressed']}, удалено записей: {result['pruned']})"
+        )
+
     def _repeat_request(self):
         """Повторно отправляет выбранный запрос из истории"""
-        item = self.history_panel.currentItem()
-        if not item:
+        item_data = self.history_manager.current_entry()
+        if not item_data:
             return
 
-        item_data = item.data(Qt.ItemDataRole.UserRole)
         question = item_data.get("prompt", "")
         if question:
-            self.question_input.setText(question)
-            self._send_prompt()
+            # Мимо find_similar: запись нашла бы саму себя и ответ из истории показался бы снова
+            self._send_question(question)
     def _send_prompt(self):
         # Если есть существующий метод send_prompt, просто вызови его
         self._ask_question()
@@ -342,15 +436,15 @@ class MainWindow(QMainWindow):
             }
 
             /* Список истории */
-            QListWidget {
+            QListView {
                 alternate-background-color: #f8f9fa;
             }
 
-            QListWidget::item:hover {
+            QListView::item:hover {
                 background-color: #e9ecef;
             }
 
-            QListWidget::item:selected {
+            QListView::item:selected {
                 background-color: #d1e7ff;
                 color: #000;
             }
@@ -415,15 +509,50 @@ class MainWindow(QMainWindow):
         if not question:
             return
 
-        self._start_processing("Отправка запроса...")
-        self.question_input.setProperty("last_question", question)
         self.question_input.clear()
+        similar = self.history_manager.find_similar(question)
+        if similar is not None:
+            self._offer_similar_answer(question, similar)
+            return
+        self._send_question(question)
 
-        # Реальная отправка через API клиент
+    def _send_question(self, question):
+        """Отправка вопроса провайдеру"""
+        self.btn_ask_live.setVisible(False)
+        self._start_processing("Отправка запроса...")
+
+        # Реальная отправка через API клиент; вопрос продолжает текущий диалог
         self.api_client.send_request(
             api_name=self.api_selector.currentText(),
-            prompt=question
+            prompt=question,
+            messages=self.conversation.messages(question) if self.conversation.enabled else None
+        )
+
+    def _offer_similar_answer(self, question, entry):
+        """Показывает ответ на похожий вопрос из истории вместо запроса к API"""
+        similarity = round(entry["similarity"] * 100)
+        logging.info(f"Similar prompt found in history: entry {entry['id']}, similarity {similarity}%")
+        self.response_area.append(
+            self.text_formatter.format_text(f"💬 Вопрос: {question}")
         )
+        self.response_area.append(
+            self.text_formatter.format_text(
+                f"♻️ Ответ на похожий вопрос из истории ({similarity}%): {entry['prompt']}"
+            )
+        )
+        self.response_area.append(
+            self.text_formatter.format_text(f"🤖 Ответ: {entry['response']}")
+        )
+        self.scroll_to_bottom()
+        self._pending_live_question = question
+        self.btn_ask_live.setVisible(True)
+        self._update_status(f"Показан ответ из истории (сходство {similarity}%)")
+
+    def _ask_live(self):
+        """Отправляет провайдеру вопрос, на который был показан ответ из истории"""
+        if self._pending_live_question:
+            self._send_question(self._pending_live_question)
+            self._pending_live_question = None
 
     def _toggle_audio(self):
         """Переключение режима аудио"""
@@ -433,13 +562,51 @@ class MainWindow(QMainWindow):
             else "🎤 Включить аудио"
         )
 
+    def _new_conversation(self):
+        """Начинает новый диалог: код и предыдущие ходы забываются"""
+        self.conversation.reset()
+        self._update_status("Начат новый диалог")
+
+    def _remember_turn(self, question, response):
+        if self.conversation.enabled and question:
+            self.conversation.add_turn(question, response)
+
+    def _on_usage_reported(self, usage):
+        """Токены промпта, включая взятые из кэша провайдера"""
+        logging.info(f"Prompt usage: {usage}")
+        if usage.get("cached_tokens") is not None:
+            self._update_status(
+                f"Токены промпта: {usage['prompt_tokens']} "
+                f"(из кэша {usage['cached_tokens']}, новых {usage['uncached_tokens']})"
+            )
+
+    def _on_queue_changed(self, depth):
+        """Глубина очереди планировщика запросов"""
+        if depth:
+            self._update_status(f"⏳ В очереди запросов: {depth}")
+
+    def _show_provider_stats(self):
+        """Окно со статистикой провайдеров"""
+        ProviderStatsDialog(self).exec()
+
+    def _on_provider_selected(self, title):
+        """Провайдер, выбранный в режиме Auto"""
+        self._update_status(f"🧭 Auto → {title}")
+
+    def _toggle_hedging(self, checked):
+        """Включение/выключение хеджирования запросов"""
+        self.request_coordinator.hedging_enabled = checked
+        self._update_status("Хеджирование включено" if checked else "Хеджирование выключено")
+
     def _change_audio_mode(self, index):
         """Изменение режима аудио"""
         self.audio_manager.set_mode(index)
 
     def _clear_output(self):
         """Очистка вывода"""
+        self.answer_queue.reset()
         self.response_area.clear()
+        self.scrollback.reset()
         self._update_status("Готово")
 
     def _start_processing(self, message):
@@ -462,36 +629,81 @@ class MainWindow(QMainWindow):
         self.status_label.setText(message)
 
     def _handle_error(self, error):
-        """Обработка ошибки"""
+        """Ошибка запроса: выводится в очереди ответов после ответа, который уже дописывается"""
+        self.answer_queue.fail(self.sender(), error)
+
+    def _handle_cancelled(self):
+        """Запрос отменён: его недописанный ответ больше не держит очередь"""
+        self.answer_queue.cancel(self.sender())
+
+    def _report_error(self, error):
+        """Ошибка звука, распознавания или захвата — сразу в окно, мимо очереди ответов"""
+        self._show_error(None, error)
+
+    def _show_error(self, source, error):
         self.response_area.append(self.text_formatter.format_error(error))
         self._finish_processing()
         logging.error(error)
 
     def _handle_text_extracted(self, text):
         """Обработка извлеченного текста"""
-        self.response_area.append(self.text_formatter.format_code(text))
-        self.ask_ai(text)
+        preparer = get_prompt_preparer()
+        code = preparer.clean(text)
+        if self.chunked_analysis.accepts(code):
+            # Большой код анализируем по частям параллельно, затем сводим
+            self.analysis_client.cancel_current()
+            self.response_area.append(self.text_formatter.format_code(code))
+            provider = self._selected_provider()
+            self.conversation.set_context(truncate_to_budget(code, preparer.budget_for(provider) // 2))
+            self._analysis_question = CODE_ANALYSIS_PROMPT
+            try:
+                api_name = self.analysis_client.resolve_provider(self.api_selector.currentText())
+                self.chunked_analysis.start(api_name, code)
+            except ValueError as e:
+                self.answer_queue.fail(self.chunked_analysis, str(e))
+            return
+
+        prepared = preparer.prepare(text, self._selected_provider())
+        self.response_area.append(self.text_formatter.format_code(prepared.text))
+        self._update_status(prepared.summary())
+        if self.conversation.enabled:
+            # Код уходит в стабильное начало диалога, вопросы по нему — следом
+            self.conversation.set_context(prepared.text)
+            self.ask_ai(CODE_ANALYSIS_PROMPT)
+        else:
+            self.ask_ai(prepared.text)
+
+    def _selected_provider(self):
+        """Провайдер из выпадающего списка; None для Auto"""
+        try:
+            return get_registry().get(self.api_selector.currentText())
+        except ValueError:
+            return None
 
     def _handle_screenshot_taken(self, pixmap):
         """Обработка сделанного скриншота (можно сохранить или показать)"""
         pass
 
-    def _handle_api_response(self, response):
-        """Обработка ответа от API"""
+    def _response_in_progress(self) -> bool:
+        """В окно дописывается ответ — позиции черновика нельзя сдвигать"""
+        return self.markdown_appender.active
+
+    def _handle_answer_chunk(self, chunk):
+        """Фрагмент ответа: на голос, вопрос из поля ввода или анализ кода"""
+        self.answer_queue.feed(self.sender(), chunk)
+
+    def _handle_api_response(self, question, response, provider):
+        """Обработка ответа от API; question — вопрос, с которым ушёл именно этот запрос"""
+        client = self.sender()
         try:
-            # Сохраняем в историю
-            question = self.question_input.property("last_question")
-            self.history_manager.add_item(question, response)
-
-            # Отображаем ответ
-            html = markdown(
-                response,
-                extensions=[
-                    'fenced_code',
-                    CodeHiliteExtension(linenums=False, guess_lang=True, noclasses=True)
-                ]
-            )
-            self.response_area.setHtml(html)
+            # Сохраняем в историю с провайдером, который ответил (а не «Auto»)
+            self.history_manager.add_item(question, response, provider or self.api_selector.currentText())
+            if client is self.api_client:
+                # В диалог попадают только вопросы из поля ввода
+                self._remember_turn(question, response)
+
+            # Отображаем ответ: Markdown конвертируется в фоне и дописывается в конец
+            self.answer_queue.finish(client, response)
             self._finish_processing()
 
         except Exception as e:
@@ -505,22 +717,24 @@ class MainWindow(QMainWindow):
 
         self.question_input.clear()
         self.start_processing("🟡 Обработка вопроса...")
-        self.ask_ai(question)
+        self.ask_ai(question, PRIORITY_TYPED)
 
-    def ask_ai(self, prompt):
+    def ask_ai(self, prompt, priority=PRIORITY_OCR):
         """Отправка запроса к API ИИ"""
-        self.api_worker = APIWorker(
+        self.chunked_analysis.cancel()
+        self._analysis_question = prompt
+        self.analysis_client.send_request(
             api_name=self.api_selector.currentText(),
-            prompt=prompt
+            prompt=prompt,
+            messages=self.conversation.messages(prompt) if self.conversation.enabled else None,
+            priority=priority
         )
-        self.api_worker.finished.connect(self.handle_response)
-        self.api_worker.error.connect(self.handle_error)
-        self.api_worker.progress.connect(self.update_progress)
-        self.api_worker.start()
 
     def _load_history_item(self, item_data):
         """Загрузка элемента истории"""
+        self.answer_queue.reset()
         self.response_area.clear()
+        self.scrollback.reset()
         question = item_data.get("prompt", "")
         response = item_data.get("response", "")
 
@@ -539,11 +753,16 @@ class MainWindow(QMainWindow):
         self.progress_bar.setVisible(True)
         self.status_label.setText(message)
 
-    def handle_response(self, response):
-        """Обработка ответа от API"""
+    def handle_response(self, response, provider=None, source=None):
+        """Итог анализа кода; provider — кто ответил на самом деле, source — чей стрим он завершает"""
         logging.info(response)
-        self.response_area.append(f"🤖 Ответ:\n{response}\n{'=' * 50}\n")
-        self.scroll_to_bottom()
+        # Сохраняется в историю: из окна ответа он со временем уйдёт
+        self.history_manager.add_item(self._analysis_question or CODE_ANALYSIS_PROMPT, response,
+                                      provider or self.api_selector.currentText())
+        self._remember_turn(self._analysis_question, response)
+        self._analysis_question = None
+        # Markdown конвертируется в фоне и дописывается в очереди ответов, как и стрим
+        self.answer_queue.finish(source or self.analysis_client, response)
         self.progress_bar.setVisible(False)
         self.status_label.setText("🟢 Готово")
 
@@ -556,7 +775,9 @@ class MainWindow(QMainWindow):
 
     def clear_output(self):
         """Очистка поля вывода"""
+        self.answer_queue.reset()
         self.response_area.clear()
+        self.scrollback.reset()
         self.status_label.setText("🔴 Ожидание действий")
 
     def scroll_to_bottom(self):
@@ -580,6 +801,15 @@ class MainWindow(QMainWindow):
         self.audio_manager.cleanup()
         self.screenshot_manager.cleanup()
         self.history_manager.cleanup()
-        self.api_client.cancel_current()
+        self.api_client.shutdown()
+        self.analysis_client.shutdown()
+        self.voice_client.shutdown()
+        self.markdown_appender.shutdown()
+        logging.info(f"Markdown rendering stats: {self.markdown_appender.stats()}")
+        logging.info(f"Scrollback stats: {self.scrollback.stats()}")
+        logging.info(f"Request coordinator stats: {self.request_coordinator.stats()}")
+        logging.info(f"Prompt budget stats: {get_prompt_preparer().stats()}")
+        get_engine().stop()
+        get_response_cache().close()
         logging.info("Application closed")
         super().closeEvent(event)
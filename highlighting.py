@@ -0,0 +1,195 @@
+import hashlib
+import html
+import re
+import threading
+from collections import OrderedDict
+
+from pygments import highlight as pygments_highlight
+from pygments.formatters import HtmlFormatter
+from pygments.lexers import get_lexer_by_name
+from pygments.util import ClassNotFound
+
+from app_config import config_section
+
+# Признаки языков: (регулярное выражение, вес). Побеждает язык с наибольшей суммой
+_LANGUAGE_HINTS = {
+    "python": [
+        (r"^\s*def \w+\(.*\)\s*(->.*)?:\s*$", 3), (r"^\s*(from [\w.]+ )?import [\w.]+", 2),
+        (r"^\s*class \w+(\(.*\))?:\s*$", 3), (r"\bself\.", 2), (r"^\s*(elif|except|with) .*:\s*$", 2),
+        (r"\bprint\(", 1), (r"\b(None|True|False)\b", 1),
+    ],
+    "javascript": [
+        (r"\bfunction\s*\w*\s*\(", 2), (r"\b(const|let|var) \w+\s*=", 2), (r"=>", 1),
+        (r"\bconsole\.log\(", 3), (r"\brequire\(|\bmodule\.exports\b", 2), (r"===|!==", 2),
+    ],
+    "typescript": [
+        (r"\binterface \w+\s*\{", 2), (r":\s*(string|number|boolean)\b", 3), (r"\bimport .* from ['\"]", 1),
+    ],
+    "java": [
+        (r"\bpublic (static )?(class|void|int|String)\b", 3), (r"\bSystem\.out\.print", 4),
+        (r"\bprivate \w+ \w+;", 2), (r"@Override", 3),
+    ],
+    "csharp": [
+        (r"\busing System", 4), (r"\bnamespace \w+", 2), (r"\bConsole\.Write", 4), (r"\bpublic \w+ \w+ \{ get;", 3),
+    ],
+    "cpp": [
+        (r"#include\s*<(iostream|vector|string|map)>", 4), (r"\bstd::", 3), (r"\bcout\s*<<", 3),
+        (r"\btemplate\s*<", 3),
+    ],
+    "c": [
+        (r"#include\s*<\w+\.h>", 3), (r"\bint main\s*\(", 2), (r"\bprintf\(", 2), (r"\bmalloc\(", 2),
+    ],
+    "go": [
+        (r"^package \w+", 3), (r"\bfunc (\(\w+ \*?\w+\) )?\w+\(", 3), (r":=", 2), (r"\bfmt\.", 3),
+    ],
+    "rust": [
+        (r"\bfn \w+\(", 3), (r"\blet mut\b", 3), (r"\bimpl\b", 2), (r"println!\(", 4), (r"->\s*\w+\s*\{", 1),
+    ],
+    "php": [(r"<\?php", 5), (r"\$\w+\s*=", 2), (r"\becho\b", 1)],
+    "ruby": [(r"^\s*def \w+[^:]*$", 1), (r"^\s*end\s*$", 2), (r"\bputs\b", 2), (r"\battr_accessor\b", 3)],
+    "bash": [
+        (r"^#!/bin/(ba)?sh", 5), (r"^\s*(echo|export|cd|sudo|apt|pip|npm|git) ", 2), (r"\$\{?\w+\}?", 1),
+        (r"\bfi\s*$|\bdone\s*$", 2),
+    ],
+    "sql": [
+        (r"(?i)\bselect\b.+\bfrom\b", 4), (r"(?i)\b(insert into|create table|update \w+ set)\b", 4),
+        (r"(?i)\bwhere\b", 1),
+    ],
+    "html": [(r"<(html|div|span|body|head|p|a)\b[^>]*>", 3), (r"</\w+>", 2), (r"<!DOCTYPE", 5)],
+    "css": [(r"^\s*[.#]?[\w-]+\s*\{\s*$", 2), (r"^\s*[\w-]+:\s*[^;]+;\s*$", 2)],
+    "json": [(r"^\s*[\[{]\s*$", 1), (r'^\s*"[\w-]+"\s*:', 3)],
+    "yaml": [(r"^\s*[\w-]+:\s+\S", 1), (r"^\s*- [\w-]+:", 2), (r"^---\s*$", 2)],
+}
+_COMPILED_HINTS = {
+    language: [(re.compile(pattern, re.MULTILINE), weight) for pattern, weight in hints]
+    for language, hints in _LANGUAGE_HINTS.items()
+}
+
+# Сколько начальных символов кода смотрит определение языка
+_DETECT_CHARS = 4000
+
+_CODE_BLOCK_RE = re.compile(r'<pre><code(?: class="language-([\w+#-]+)")?>(.*?)</code></pre>', re.DOTALL)
+
+
+def _digest(code: str) -> bytes:
+    return hashlib.blake2b(code.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+
+def guess_language(code: str) -> str:
+    """Эвристическое определение языка по характерным конструкциям; "text", если не похоже ни на что"""
+    sample = code[:_DETECT_CHARS]
+    best, best_score = "text", 0
+    for language, hints in _COMPILED_HINTS.items():
+        score = sum(weight for pattern, weight in hints if pattern.search(sample))
+        if score > best_score:
+            best, best_score = language, score
+    return best if best_score >= 2 else "text"
+
+
+class HighlightService:
+    """Общая подсветка синтаксиса (Pygments) для всех мест приложения.
+
+    Лексеры и форматтеры создаются один раз и переиспользуются; готовый
+    HTML кэшируется (LRU) по хэшу кода, стилю, языку и виду разметки.
+    Язык без явного указания определяется дешёвой эвристикой вместо
+    перебора анализаторов всех лексеров Pygments, результат тоже кэшируется.
+    """
+
+    def __init__(self, cache_size: int = 256, detect_cache_size: int = 1024, style: str = "default"):
+        self.cache_size = cache_size
+        self.detect_cache_size = detect_cache_size
+        self.style = style
+        self._cache = OrderedDict()
+        self._languages = OrderedDict()
+        self._lexers = {}
+        self._formatters = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "detect_hits": 0, "detect_misses": 0}
+
+    def detect_language(self, code: str, digest: bytes = None) -> str:
+        digest = digest or _digest(code)
+        with self._lock:
+            language = self._languages.get(digest)
+            if language is not None:
+                self._languages.move_to_end(digest)
+                self._stats["detect_hits"] += 1
+                return language
+        language = guess_language(code)
+        with self._lock:
+            self._stats["detect_misses"] += 1
+            self._languages[digest] = language
+            if len(self._languages) > self.detect_cache_size:
+                self._languages.popitem(last=False)
+        return language
+
+    def _lexer(self, language: str):
+        lexer = self._lexers.get(language)
+        if lexer is None:
+            try:
+                lexer = get_lexer_by_name(language)
+            except ClassNotFound:
+                lexer = get_lexer_by_name("text")
+            self._lexers[language] = lexer
+        return lexer
+
+    def _formatter(self, style: str, variant: str):
+        key = (style, variant)
+        formatter = self._formatters.get(key)
+        if formatter is None:
+            if variant == "inline":
+                formatter = HtmlFormatter(
+                    style=style, noclasses=True, nowrap=True,
+                    prestyles="margin:0;padding:0;white-space:pre;",
+                )
+            elif variant == "block":
+                formatter = HtmlFormatter(style=style, noclasses=True, cssstyles="font-family: 'Consolas', monospace;")
+            else:  # "markdown" — разметка как у CodeHilite в окне ответа
+                formatter = HtmlFormatter(style=style, noclasses=True, cssclass="codehilite", wrapcode=True)
+            self._formatters[key] = formatter
+        return formatter
+
+    def highlight(self, code: str, language: str = None, style: str = None, variant: str = "markdown") -> str:
+        """HTML подсветки кода; language=None — язык определяется автоматически"""
+        style = style or self.style
+        digest = _digest(code)
+        language = (language or self.detect_language(code, digest)).lower()
+        key = (digest, style, language, variant)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self._stats["hits"] += 1
+                return cached
+            self._stats["misses"] += 1
+            lexer = self._lexer(language)
+            formatter = self._formatter(style, variant)
+        result = pygments_highlight(code, lexer, formatter)
+        with self._lock:
+            self._cache[key] = result
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def highlight_html(self, markup: str) -> str:
+        """Подсветка блоков <pre><code> в HTML, полученном из Markdown (fenced_code)"""
+        def replace(match):
+            code = html.unescape(match.group(2))
+            return self.highlight(code, match.group(1))
+        return _CODE_BLOCK_RE.sub(replace, markup)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, cached=len(self._cache), lexers=len(self._lexers))
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_highlighter() -> HighlightService:
+    """Общий сервис подсветки; параметры из раздела highlighting в config.yaml"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = HighlightService(**config_section("highlighting"))
+        return _service
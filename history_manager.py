@@ -1,32 +1,185 @@
-import json
-import os
+import html
 import logging
-from datetime import datetime
-from PyQt6.QtWidgets import QListWidget, QListWidgetItem, QMenu
-from PyQt6.QtCore import Qt, pyqtSignal, QObject
-from PyQt6.QtGui import QIcon
+import threading
+import time
+from PyQt6.QtWidgets import QLineEdit, QListView, QMenu, QStyle, QStyledItemDelegate
+from PyQt6.QtCore import Qt, pyqtSignal, QObject, QAbstractListModel, QModelIndex, QSize, QTimer
+from PyQt6.QtGui import QTextDocument
+
+from app_config import config_section
+from history_store import HistoryStore
+from similar_prompts import SimilarPromptIndex
+
+
+class HistoryModel(QAbstractListModel):
+    """Модель панели истории: краткие записи, подгружаемые страницами.
+
+    В памяти только id, время и начало вопроса; следующая страница
+    читается из HistoryStore, когда список прокручен до конца
+    (canFetchMore/fetchMore). Полная запись загружается по запросу.
+    В режиме поиска модель показывает результаты поиска с фрагментами.
+    """
+
+    SnippetRole = Qt.ItemDataRole.UserRole + 1
+
+    def __init__(self, store: HistoryStore, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self._rows = []
+        self._exhausted = False
+        self.searching = False
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._rows):
+            return None
+        summary = self._rows[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            time_str = summary["timestamp"][11:16]
+            prefix = "[Ошибка] " if summary["is_error"] else ""
+            return f"{prefix}{time_str}: {summary['title'][:30]}..."
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return summary["title"]
+        if role == Qt.ItemDataRole.UserRole:
+            return summary
+        if role == self.SnippetRole and "snippet" in summary:
+            time_str = summary["timestamp"][:16].replace("T", " ")
+            title = html.escape(summary["title"][:30])
+            return f"<small>{time_str}</small> {title}<br>{summary['snippet']}"
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._exhausted:
+            return
+        before = None
+        if self._rows:
+            before = (self._rows[-1]["timestamp"], self._rows[-1]["id"])
+        page = self.store.page(before)
+        if len(page) < self.store.page_size:
+            self._exhausted = True
+        if not page:
+            return
+        self.beginInsertRows(QModelIndex(), len(self._rows), len(self._rows) + len(page) - 1)
+        self._rows.extend(page)
+        self.endInsertRows()
+
+    def reload(self):
+        """Сброс к первой странице"""
+        self.beginResetModel()
+        self._rows = []
+        self._exhausted = False
+        self.searching = False
+        self.endResetModel()
+        self.fetchMore()
+
+    def prepend(self, summary: dict):
+        self.beginInsertRows(QModelIndex(), 0, 0)
+        self._rows.insert(0, summary)
+        self.endInsertRows()
+
+    def remove(self, row: int) -> dict:
+        self.beginRemoveRows(QModelIndex(), row, row)
+        summary = self._rows.pop(row)
+        self.endRemoveRows()
+        return summary
+
+    def remove_ids(self, ids: set):
+        for row in reversed(range(len(self._rows))):
+            if self._rows[row]["id"] in ids:
+                self.remove(row)
+
+    def show_results(self, results: list):
+        """Режим поиска: результаты целиком, без подгрузки страниц"""
+        self.beginResetModel()
+        self._rows = results
+        self._exhausted = True
+        self.searching = True
+        self.endResetModel()
+
+    def clear(self):
+        self.beginResetModel()
+        self._rows = []
+        self._exhausted = True
+        self.endResetModel()
+
+    def summary(self, row: int) -> dict:
+        return self._rows[row] if 0 <= row < len(self._rows) else None
+
+
+class SnippetDelegate(QStyledItemDelegate):
+    """Отрисовка результатов поиска с выделенными совпадениями"""
+
+    def _document(self, option, index) -> QTextDocument:
+        document = QTextDocument()
+        document.setDefaultFont(option.font)
+        document.setHtml(index.data(HistoryModel.SnippetRole))
+        document.setTextWidth(max(option.rect.width(), 200))
+        return document
+
+    def paint(self, painter, option, index):
+        if index.data(HistoryModel.SnippetRole) is None:
+            super().paint(painter, option, index)
+            return
+        self.initStyleOption(option, index)
+        option.text = ""
+        option.widget.style().drawControl(QStyle.ControlElement.CE_ItemViewItem, option, painter, option.widget)
+        painter.save()
+        painter.translate(option.rect.topLeft())
+        self._document(option, index).drawContents(painter)
+        painter.restore()
+
+    def sizeHint(self, option, index):
+        if index.data(HistoryModel.SnippetRole) is None:
+            return super().sizeHint(option, index)
+        document = self._document(option, index)
+        return QSize(int(document.idealWidth()), int(document.size().height()))
 
 
 class HistoryManager(QObject):
     history_cleared = pyqtSignal()
     item_deleted = pyqtSignal(int)
     item_requested = pyqtSignal(dict)
+    compacted = pyqtSignal(dict)  # итог сжатия истории
+    _pruned = pyqtSignal(list)    # id, удалённые по лимитам хранения (из потока записи)
 
-    def __init__(self, list_widget: QListWidget):
+    def __init__(self, list_view: QListView, search_box: QLineEdit = None):
         super().__init__()
-        self.history_panel = list_widget
-        self.history_file = "history.json"
+        self.history_panel = list_view
+        self.search_box = search_box
+        self.store = HistoryStore(**config_section("history"))
+        self._pruned.connect(self._on_pruned)
+        self.store.on_pruned = self._pruned.emit
+        self.model = HistoryModel(self.store, self)
+        self.similar_prompts = SimilarPromptIndex(**config_section("similar_prompts"))
+        self._search_timer = QTimer(self)
+        self._search_timer.setSingleShot(True)
+        self._search_timer.setInterval(150)
+        self._search_timer.timeout.connect(self._run_search)
         self._setup_ui()
         self.load_history()
+        if self.similar_prompts.enabled:
+            threading.Thread(target=self._build_similar_index, name="history-similar", daemon=True).start()
         logging.info("History manager initialized")
 
     def _setup_ui(self):
         """Настройка интерфейса истории"""
+        self.history_panel.setModel(self.model)
+        self.history_panel.setItemDelegate(SnippetDelegate(self.history_panel))
         self.history_panel.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
-        self.history_panel.itemDoubleClicked.connect(self._on_item_double_clicked)
+        self.history_panel.doubleClicked.connect(self._on_item_double_clicked)
         self.history_panel.customContextMenuRequested.connect(self._show_context_menu)
+        if self.search_box is not None:
+            self.search_box.setPlaceholderText("🔍 Поиск по истории")
+            self.search_box.setClearButtonEnabled(True)
+            self.search_box.setEnabled(self.store.searchable)
+            self.search_box.textChanged.connect(lambda: self._search_timer.start())
 
-    def add_item(self, prompt: str, response: str):
+    def add_item(self, prompt: str, response: str, provider: str = None):
         """Добавляет новый элемент в историю"""
         try:
             if not isinstance(prompt, str):
@@ -37,24 +190,17 @@ class HistoryManager(QObject):
                 response = "(нет ответа)"
 
             is_error = "❌" in response
-            timestamp = datetime.now().isoformat()
-
-            item_data = {
-                "prompt": prompt,
-                "response": response,
-                "timestamp": timestamp,
-                "is_error": is_error
-            }
-
-            item = QListWidgetItem()
-            item.setData(Qt.ItemDataRole.UserRole, item_data)
-
-            time_str = datetime.now().strftime('%H:%M')
-            prefix = "[Ошибка] " if is_error else ""
-            item.setText(f"{prefix}{time_str}: {prompt[:30]}...")
-
-            self.history_panel.insertItem(0, item)
-            self._save_history()
+            summary = self.store.append(prompt, response, provider, is_error)
+            if not is_error:
+                self.similar_prompts.add(summary["id"], prompt)
+            if self.model.searching:
+                # Результаты поиска дополняются новой записью, если она подходит, без нового поиска
+                text = self.search_box.text() if self.search_box is not None else ""
+                result = self.store.match(text, summary, prompt, response)
+                if result is not None:
+                    self.model.prepend(result)
+            else:
+                self.model.prepend(summary)
             logging.info("New item added to history")
 
         except Exception as e:
@@ -64,22 +210,25 @@ class HistoryManager(QObject):
         """Показывает контекстное меню для истории"""
         try:
             menu = QMenu()
-            current_item = self.history_panel.currentItem()
+            row = self.history_panel.currentIndex().row()
 
             repeat_action = menu.addAction("↻ Повторить запрос")
             delete_action = menu.addAction("🗑️ Удалить")
             clear_action = menu.addAction("🧹 Очистить всю историю")
+            compact_action = menu.addAction("🗜️ Сжать историю")
 
-            action = menu.exec_(self.history_panel.mapToGlobal(pos))
+            action = menu.exec(self.history_panel.mapToGlobal(pos))
 
-            if not current_item:
+            if action == compact_action:
+                self.compact()
+                return
+            if self.model.summary(row) is None:
                 return
 
             if action == repeat_action:
-                data = current_item.data(Qt.ItemDataRole.UserRole)
-                self.item_requested.emit(data)
+                self._request_row(row)
             elif action == delete_action:
-                self._delete_item(current_item)
+                self._delete_item(row)
             elif action == clear_action:
                 self.clear_history()
 
@@ -88,64 +237,100 @@ class HistoryManager(QObject):
 
     def clear_history(self):
         """Очищает всю историю"""
-        self.history_panel.clear()
-        self._save_history()
+        self.model.clear()
+        self.store.clear()
+        self.similar_prompts.clear()
         self.history_cleared.emit()
         logging.info("History cleared")
 
-    def _delete_item(self, item):
+    def _delete_item(self, row: int):
         """Удаляет конкретный элемент истории"""
-        row = self.history_panel.row(item)
-        self.history_panel.takeItem(row)
-        self._save_history()
+        summary = self.model.remove(row)
+        self.store.delete(summary["id"])
+        self.similar_prompts.remove(summary["id"])
         self.item_deleted.emit(row)
         logging.info(f"History item deleted at row {row}")
 
-    def _save_history(self):
-        """Сохраняет историю в файл"""
-        try:
-            history = []
-            for i in range(self.history_panel.count()):
-                item = self.history_panel.item(i)
-                history.append(item.data(Qt.ItemDataRole.UserRole))
+    def compact(self):
+        """Сжатие базы истории в фоне; итог приходит сигналом compacted"""
+        threading.Thread(
+            target=lambda: self.compacted.emit(self.store.compact()), name="history-compact", daemon=True
+        ).start()
 
-            with open(self.history_file, "w", encoding="utf-8") as f:
-                json.dump(history, f, indent=2, ensure_ascii=False)
-
-        except Exception as e:
-            logging.error(f"Error saving history: {e}")
+    def _on_pruned(self, ids: list):
+        """Убирает из панели и индекса похожих вопросов записи, удалённые по лимитам"""
+        for entry_id in ids:
+            self.similar_prompts.remove(entry_id)
+        self.model.remove_ids(set(ids))
 
     def load_history(self):
-        """Загружает историю из файла"""
+        """Загружает первую страницу истории; остальное — по мере прокрутки"""
         try:
-            if not os.path.exists(self.history_file):
-                return
+            self.model.reload()
+            logging.info(f"History loaded from database: first {self.model.rowCount()} entries")
 
-            with open(self.history_file, "r", encoding="utf-8") as f:
-                history = json.load(f)
+        except Exception as e:
+            logging.error(f"Error loading history: {e}")
 
-            self.history_panel.clear()
-            for item_data in sorted(history, key=lambda x: x["timestamp"], reverse=True):
-                item = QListWidgetItem()
-                item.setData(Qt.ItemDataRole.UserRole, item_data)
+    def search(self, text: str):
+        """Показывает результаты поиска; пустой запрос возвращает обычный список"""
+        if not text.strip():
+            if self.model.searching:
+                self.model.reload()
+            return
+        started = time.perf_counter()
+        results = self.store.search(text)
+        self.model.show_results(results)
+        logging.info(
+            f"History search {text!r}: {len(results)} results in "
+            f"{(time.perf_counter() - started) * 1000:.1f} ms"
+        )
 
-                time_str = item_data["timestamp"][11:16]
-                prefix = "[Ошибка] " if item_data.get("is_error") else ""
-                item.setText(f"{prefix}{time_str}: {item_data['prompt'][:30]}...")
+    def _run_search(self):
+        if self.search_box is not None:
+            self.search(self.search_box.text())
 
-                self.history_panel.addItem(item)
+    def _build_similar_index(self):
+        """Подписи последних вопросов для поиска похожих (в фоне, при запуске)"""
+        started = time.perf_counter()
+        try:
+            prompts = self.store.recent_prompts(self.similar_prompts.max_entries)
+            for entry_id, prompt in prompts:
+                self.similar_prompts.add(entry_id, prompt)
+        except Exception as e:
+            logging.error(f"Similar prompt index build failed: {e}")
+            return
+        logging.info(
+            f"Similar prompt index: {len(self.similar_prompts)} prompts in "
+            f"{time.perf_counter() - started:.2f}s"
+        )
 
-            logging.info("History loaded from file")
+    def find_similar(self, prompt: str) -> dict:
+        """Полная запись с самым похожим вопросом (поле similarity) или None"""
+        match = self.similar_prompts.query(prompt)
+        if match is None:
+            return None
+        entry = self.store.get(match[0])
+        if entry is not None:
+            entry["similarity"] = match[1]
+        return entry
 
-        except Exception as e:
-            logging.error(f"Error loading history: {e}")
+    def current_entry(self) -> dict:
+        """Полная запись, выбранная в панели; None, если ничего не выбрано"""
+        summary = self.model.summary(self.history_panel.currentIndex().row())
+        return self.store.get(summary["id"]) if summary else None
+
+    def _request_row(self, row: int):
+        summary = self.model.summary(row)
+        entry = self.store.get(summary["id"]) if summary else None
+        if entry is not None:
+            self.item_requested.emit(entry)
 
-    def _on_item_double_clicked(self, item):
+    def _on_item_double_clicked(self, index):
         """Обработчик двойного клика по элементу"""
-        data = item.data(Qt.ItemDataRole.UserRole)
-        self.item_requested.emit(data)
+        self._request_row(index.row())
 
     def cleanup(self):
         """Очистка ресурсов"""
-        self._save_history()
+        self.store.close()
         logging.info("History manager cleaned up")
\ No newline at end of file
@@ -0,0 +1,553 @@
+import html
+import json
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+
+_STOP = object()
+
+# Сколько символов вопроса хранится в кратком описании записи
+SUMMARY_CHARS = 60
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def pack_text(text: str, threshold: int):
+    """Текст длиннее threshold байт сжимается zlib и хранится как BLOB"""
+    data = text.encode("utf-8")
+    if threshold and len(data) > threshold:
+        packed = zlib.compress(data)
+        if len(packed) < len(data):
+            return packed
+    return text
+
+
+def unpack_text(value) -> str:
+    """Обратно к pack_text: BLOB распаковывается, текст возвращается как есть"""
+    if isinstance(value, bytes):
+        return zlib.decompress(value).decode("utf-8")
+    return value
+
+
+def _snippet(pattern: re.Pattern, text: str, context: int = 60) -> str:
+    """HTML-фрагмент текста вокруг первого совпадения; совпадения выделены <b>"""
+    first = pattern.search(text)
+    if first is None:
+        return ""
+    start = max(first.start() - context, 0)
+    end = min(first.end() + context * 2, len(text))
+    parts = ["…" if start else ""]
+    position = start
+    for match in pattern.finditer(text, start, end):
+        parts.append(html.escape(text[position:match.start()]))
+        parts.append(f"<b>{html.escape(match.group())}</b>")
+        position = match.end()
+    parts.append(html.escape(text[position:end]))
+    parts.append("…" if end < len(text) else "")
+    return " ".join("".join(parts).split())
+
+
+def _matches(words: list, *texts: str) -> bool:
+    """Каждое слово — начало какого-либо слова текстов, как префиксный запрос FTS"""
+    tokens = {token.casefold() for text in texts for token in _WORD_RE.findall(text)}
+    return all(any(token.startswith(word.casefold()) for token in tokens) for word in words)
+
+
+def _search_pattern(words: list) -> re.Pattern:
+    return re.compile(r"\b(?:" + "|".join(re.escape(word) for word in words) + r")\w*", re.IGNORECASE)
+
+
+def _with_snippet(entry: dict, pattern: re.Pattern, prompt: str, response: str) -> dict:
+    """Добавляет к краткой записи snippet — фрагмент с выделенными совпадениями"""
+    entry["snippet"] = (
+        _snippet(pattern, prompt) or _snippet(pattern, response)
+        or html.escape(" ".join(response[:120].split()))
+    )
+    return entry
+
+
+def _summary(entry_id: int, timestamp: str, provider: str, prompt: str, is_error) -> dict:
+    return {"id": entry_id, "timestamp": timestamp, "provider": provider,
+            "title": prompt[:SUMMARY_CHARS], "is_error": bool(is_error)}
+
+
+class HistoryStore:
+    """История запросов в SQLite (WAL) с пакетной записью в фоновом потоке.
+
+    Записи только добавляются; id выдаётся сразу, без ожидания записи, а
+    сами INSERT/DELETE копятся в очереди и сбрасываются одной транзакцией.
+    Чтение очередь не ждёт: ещё не записанные строки и удаления хранятся
+    в памяти и накладываются на выборку из базы.
+    Ответы длиннее compress_threshold байт хранятся сжатыми. Раз в
+    retention_interval секунд тот же поток удаляет записи сверх лимитов
+    max_entries / max_age_days / max_bytes (0 — без ограничения).
+    При первом запуске импортируется старый history.json.
+    """
+
+    def __init__(self, path: str = "history.sqlite3", json_path: str = "history.json",
+                 batch_size: int = 100, batch_interval: float = 0.2, page_size: int = 200,
+                 max_candidates: int = 2000, compress_threshold: int = 4096, max_entries: int = 0,
+                 max_age_days: float = 0, max_bytes: int = 0, retention_interval: float = 600):
+        self.path = path
+        self.json_path = json_path
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.page_size = page_size
+        self.max_candidates = max_candidates
+        self.compress_threshold = compress_threshold
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.max_bytes = max_bytes
+        self.retention_interval = retention_interval
+        self.on_pruned = None  # вызывается из потока записи со списком удалённых id
+        self._queue = queue.Queue()
+        self._id_lock = threading.Lock()
+        # Изменения, поставленные в очередь, но ещё не записанные потоком записи
+        self._pending_lock = threading.Lock()
+        self._pending_rows = {}        # id -> строка entries
+        self._pending_deletes = set()  # id удалённых записей
+        self._pending_clear = 0        # записи с id меньше этого удалены очисткой
+
+        self._db = self._connect()
+        self._create_schema()
+        self._migrate_json()
+        self._next_id = (self._db.execute("SELECT COALESCE(MAX(id), 0) FROM entries").fetchone()[0]) + 1
+
+        self._writer = threading.Thread(target=self._write_loop, name="history-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.create_function("history_text", 1, unpack_text, deterministic=True)
+        return db
+
+    def _create_schema(self):
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                id INTEGER PRIMARY KEY,
+                timestamp TEXT NOT NULL,
+                provider TEXT,
+                prompt TEXT NOT NULL,
+                response TEXT NOT NULL,
+                is_error INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_entries_timestamp ON entries(timestamp);
+            CREATE INDEX IF NOT EXISTS idx_entries_provider ON entries(provider);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+        self._db.commit()
+        self._create_search_index()
+
+    def _create_search_index(self):
+        """Полнотекстовый индекс FTS5 по вопросам и ответам, синхронизируемый триггерами.
+
+        Индекс читает ответы через представление entries_text, где сжатые
+        ответы распаковываются функцией history_text.
+        """
+        current = self._db.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'entries_fts'"
+        ).fetchone()
+        rebuild = current is None or "entries_text" not in current[0]
+        try:
+            if rebuild:
+                # Индекс без распаковки ответов (или его нет) — создаётся заново
+                self._db.executescript("""
+                    DROP TRIGGER IF EXISTS entries_fts_insert;
+                    DROP TRIGGER IF EXISTS entries_fts_delete;
+                    DROP TABLE IF EXISTS entries_fts;
+                """)
+            self._db.executescript("""
+                CREATE VIEW IF NOT EXISTS entries_text AS
+                    SELECT id, prompt, history_text(response) AS response FROM entries;
+                CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(
+                    prompt, response,
+                    content='entries_text', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+                );
+                CREATE TRIGGER IF NOT EXISTS entries_fts_insert AFTER INSERT ON entries BEGIN
+                    INSERT INTO entries_fts(rowid, prompt, response)
+                    VALUES (new.id, new.prompt, history_text(new.response));
+                END;
+                CREATE TRIGGER IF NOT EXISTS entries_fts_delete AFTER DELETE ON entries BEGIN
+                    INSERT INTO entries_fts(entries_fts, rowid, prompt, response)
+                    VALUES ('delete', old.id, old.prompt, history_text(old.response));
+                END;
+            """)
+            if rebuild:
+                self._db.execute("INSERT INTO entries_fts(entries_fts) VALUES ('rebuild')")
+            self._db.commit()
+            self.searchable = True
+        except sqlite3.OperationalError as e:
+            # SQLite собран без FTS5 — история работает, поиск недоступен
+            logging.error(f"History search disabled: {e}")
+            self.searchable = False
+
+    def _migrate_json(self):
+        """Однократный перенос history.json (файл остаётся на месте)"""
+        done = self._db.execute("SELECT value FROM meta WHERE key = 'json_migrated'").fetchone()
+        if done or not os.path.exists(self.json_path):
+            return
+        try:
+            with open(self.json_path, "r", encoding="utf-8") as f:
+                history = json.load(f)
+            rows = [
+                (item.get("timestamp") or datetime.now().isoformat(), item.get("provider"),
+                 str(item.get("prompt", "")), pack_text(str(item.get("response", "")), self.compress_threshold),
+                 int(bool(item.get("is_error"))))
+                for item in sorted(history, key=lambda x: x.get("timestamp", ""))
+            ]
+            with self._db:
+                self._db.executemany(
+                    "INSERT INTO entries (timestamp, provider, prompt, response, is_error) VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._db.execute("INSERT INTO meta VALUES ('json_migrated', ?)", (datetime.now().isoformat(),))
+            logging.info(f"Migrated {len(rows)} history entries from {self.json_path}")
+        except (OSError, ValueError, sqlite3.Error) as e:
+            logging.error(f"History migration from {self.json_path} failed: {e}")
+
+    def append(self, prompt: str, response: str, provider: str = None, is_error: bool = False,
+               timestamp: str = None) -> dict:
+        """Добавляет запись (запись на диск — в фоне); возвращает её краткое описание с id"""
+        with self._id_lock:
+            entry_id = self._next_id
+            self._next_id += 1
+        timestamp = timestamp or datetime.now().isoformat()
+        row = (entry_id, timestamp, provider, prompt, pack_text(response, self.compress_threshold), int(is_error))
+        with self._pending_lock:
+            self._pending_rows[entry_id] = row
+        self._queue.put((
+            "INSERT INTO entries (id, timestamp, provider, prompt, response, is_error) VALUES (?, ?, ?, ?, ?, ?)",
+            row, ("insert", entry_id),
+        ))
+        return _summary(entry_id, timestamp, provider, prompt, is_error)
+
+    def delete(self, entry_id: int):
+        with self._pending_lock:
+            self._pending_rows.pop(entry_id, None)
+            self._pending_deletes.add(entry_id)
+        self._queue.put(("DELETE FROM entries WHERE id = ?", (entry_id,), ("delete", entry_id)))
+
+    def clear(self):
+        with self._id_lock, self._pending_lock:
+            self._pending_rows.clear()
+            self._pending_clear = self._next_id
+            self._queue.put(("DELETE FROM entries", (), ("clear", self._next_id)))
+
+    def _overlay(self):
+        """Снимок незаписанных изменений: новые строки, скрываемые в базе id, граница очистки.
+
+        Снимок берётся до запроса к базе: всё, что поток записи успеет
+        записать после него, либо есть в снимке, либо уже видно в базе.
+        """
+        with self._pending_lock:
+            rows = list(self._pending_rows.values())
+            hidden = self._pending_deletes | self._pending_rows.keys()
+            return rows, hidden, self._pending_clear
+
+    @staticmethod
+    def _visible(conditions: list, params: list, hidden: set, cleared: int):
+        """WHERE и параметры без скрытых записей: незаписанные строки читаются из памяти"""
+        conditions, params = list(conditions), list(params)
+        if cleared:
+            conditions.append("id >= ?")
+            params.append(cleared)
+        if hidden:
+            conditions.append(f"id NOT IN ({','.join('?' * len(hidden))})")
+            params.extend(hidden)
+        where = " WHERE " + " AND ".join(f"({condition})" for condition in conditions) if conditions else ""
+        return where, params
+
+    def _committed(self, tags: list):
+        """Вызывается потоком записи после транзакции: записанное больше не держим в памяти"""
+        with self._pending_lock:
+            for kind, value in tags:
+                if kind == "insert":
+                    self._pending_rows.pop(value, None)
+                elif kind == "delete":
+                    self._pending_deletes.discard(value)
+                elif self._pending_clear == value:
+                    self._pending_clear = 0
+
+    def page(self, before: tuple = None, limit: int = None) -> list:
+        """Страница кратких записей от новых к старым.
+
+        before — (timestamp, id) последней уже загруженной записи; выборка
+        начинается с неё поиском по индексу, поэтому стоимость не зависит
+        ни от размера истории, ни от глубины страницы.
+        Ответ не читается — только начало вопроса.
+        """
+        limit = limit or self.page_size
+        pending, hidden, cleared = self._overlay()
+        conditions, params = [], []
+        if before is not None:
+            # Сравнение пар — поиск по индексу (timestamp<?), а не его просмотр с начала
+            conditions.append("(timestamp, id) < (?, ?)")
+            params = [before[0], before[1]]
+        where, params = self._visible(conditions, params, hidden, cleared)
+        rows = self._db.execute(
+            f"SELECT id, timestamp, provider, substr(prompt, 1, {SUMMARY_CHARS}), is_error FROM entries{where}"
+            " ORDER BY timestamp DESC, id DESC LIMIT ?", params + [limit]
+        ).fetchall()
+        rows += [
+            (row[0], row[1], row[2], row[3], row[5]) for row in pending
+            if before is None or (row[1], row[0]) < tuple(before)
+        ]
+        rows.sort(key=lambda row: (row[1], row[0]), reverse=True)
+        return [_summary(*row) for row in rows[:limit]]
+
+    def search(self, text: str, limit: int = 50) -> list:
+        """Поиск по вопросам и ответам, лучшие совпадения первыми.
+
+        Каждое слово ищется по префиксу (в индексе есть префиксы из 2 и 3
+        символов), все слова обязательны. К кратким записям добавляется
+        snippet — HTML-фрагмент текста с выделенными совпадениями.
+        """
+        words = _WORD_RE.findall(text)
+        if not words or not self.searchable:
+            return []
+        query = " ".join(f'"{word}"*' for word in words)
+        pending, hidden, cleared = self._overlay()
+        # bm25 считается только для max_candidates самых новых совпадений:
+        # частое слово совпадает почти со всей историей, и полная сортировка
+        # по релевантности стоила бы сотни миллисекунд
+        best = self._db.execute("""
+            SELECT id FROM (
+                SELECT rowid AS id, bm25(entries_fts, 2.0, 1.0) AS score
+                FROM entries_fts WHERE entries_fts MATCH ?
+                ORDER BY rowid DESC LIMIT ?
+            ) ORDER BY score LIMIT ?
+        """, (query, self.max_candidates, limit)).fetchall()
+        ids = [row[0] for row in best if row[0] not in hidden and row[0] >= cleared]
+        found = {row[0]: row for row in self._db.execute(f"""
+            SELECT id, timestamp, provider, prompt, response, is_error FROM entries
+            WHERE id IN ({",".join("?" * len(ids))})
+        """, ids).fetchall()} if ids else {}
+        # Ещё не записанные ответы — самые новые, их совпадения идут первыми
+        rows = [row for row in sorted(pending, reverse=True) if _matches(words, row[3], unpack_text(row[4]))]
+        rows += [found[entry_id] for entry_id in ids if entry_id in found]
+
+        pattern = _search_pattern(words)
+        return [
+            _with_snippet(_summary(entry_id, timestamp, provider, prompt, is_error),
+                          pattern, prompt, unpack_text(response))
+            for entry_id, timestamp, provider, prompt, response, is_error in rows[:limit]
+        ]
+
+    def match(self, text: str, summary: dict, prompt: str, response: str) -> dict:
+        """Результат поиска text для только что добавленной записи или None.
+
+        Позволяет дополнить уже показанные результаты новой записью, не
+        повторяя поиск по базе.
+        """
+        words = _WORD_RE.findall(text)
+        if not words or not self.searchable or not _matches(words, prompt, response):
+            return None
+        return _with_snippet(dict(summary), _search_pattern(words), prompt, response)
+
+    def recent_prompts(self, limit: int) -> list:
+        """(id, вопрос) последних limit успешных записей от старых к новым.
+
+        Читает отдельным соединением, поэтому можно вызывать из фонового потока.
+        """
+        db = self._connect()
+        try:
+            rows = db.execute(
+                "SELECT id, prompt FROM entries WHERE is_error = 0 ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        finally:
+            db.close()
+        rows.reverse()
+        return rows
+
+    def get(self, entry_id: int) -> dict:
+        """Полная запись (вопрос и ответ); None, если её нет"""
+        pending, hidden, cleared = self._overlay()
+        row = next((row for row in pending if row[0] == entry_id), None)
+        if row is None and entry_id not in hidden and entry_id >= cleared:
+            row = self._db.execute(
+                "SELECT id, timestamp, provider, prompt, response, is_error FROM entries WHERE id = ?", (entry_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"id": row[0], "timestamp": row[1], "provider": row[2], "prompt": row[3],
+                "response": unpack_text(row[4]), "is_error": bool(row[5])}
+
+    def flush(self):
+        """Ожидание записи всех поставленных в очередь изменений (чтению не нужно)"""
+        if self._writer.is_alive():
+            self._queue.join()
+
+    def _file_bytes(self, suffix: str = "") -> int:
+        """Размер файла базы; suffix="-wal" — размер журнала WAL"""
+        path = self.path + suffix
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    def stats(self) -> dict:
+        pending, hidden, cleared = self._overlay()
+        where, params = self._visible([], [], hidden, cleared)
+        entries, compressed, stored = self._db.execute(f"""
+            SELECT COUNT(*), COALESCE(SUM(typeof(response) = 'blob'), 0),
+                   COALESCE(SUM(length(CAST(prompt AS BLOB)) + length(CAST(response AS BLOB))), 0)
+            FROM entries{where}
+        """, params).fetchone()
+        for row in pending:
+            response = row[4] if isinstance(row[4], bytes) else row[4].encode("utf-8")
+            entries += 1
+            compressed += isinstance(row[4], bytes)
+            stored += len(row[3].encode("utf-8")) + len(response)
+        return {"entries": entries, "compressed": compressed, "stored_bytes": stored,
+                "file_bytes": self._file_bytes(), "wal_bytes": self._file_bytes("-wal")}
+
+    def _expired_ids(self, db: sqlite3.Connection) -> set:
+        """id записей сверх лимитов хранения"""
+        ids = set()
+        if self.max_age_days:
+            cutoff = (datetime.now() - timedelta(days=self.max_age_days)).isoformat()
+            ids.update(row[0] for row in db.execute("SELECT id FROM entries WHERE timestamp < ?", (cutoff,)))
+        if self.max_entries:
+            ids.update(row[0] for row in db.execute(
+                "SELECT id FROM entries ORDER BY timestamp DESC, id DESC LIMIT -1 OFFSET ?", (self.max_entries,)
+            ))
+        if self.max_bytes:
+            # Нарастающий итог размера от новых записей к старым
+            ids.update(row[0] for row in db.execute("""
+                SELECT id FROM (
+                    SELECT id, SUM(length(CAST(prompt AS BLOB)) + length(CAST(response AS BLOB)))
+                        OVER (ORDER BY timestamp DESC, id DESC) AS total
+                    FROM entries
+                ) WHERE total > ?
+            """, (self.max_bytes,)))
+        return ids
+
+    def _apply_retention(self, db: sqlite3.Connection) -> int:
+        """Удаление записей сверх лимитов; возвращает их количество"""
+        try:
+            ids = self._expired_ids(db)
+            if not ids:
+                return 0
+            with db:
+                db.executemany("DELETE FROM entries WHERE id = ?", ((entry_id,) for entry_id in ids))
+        except sqlite3.Error as e:
+            logging.error(f"History retention failed: {e}")
+            return 0
+        logging.info(f"History retention removed {len(ids)} entries")
+        if self.on_pruned is not None:
+            self.on_pruned(sorted(ids))
+        return len(ids)
+
+    def compact(self) -> dict:
+        """Сжатие старых длинных ответов, применение лимитов, оптимизация индекса и VACUUM.
+
+        Выполняется в потоке записи (вызывающий поток ждёт результата,
+        поэтому вызывать не из GUI-потока); возвращает размеры файла базы до
+        и после (WAL перед замером переносится в базу, его остаток — в
+        wal_bytes) и число освобождённых байт. Чтение на время сжатия не
+        блокируется: page/search/get/stats читают последний снимок WAL, а
+        записи, поставленные в очередь за время сжатия, — из памяти.
+        """
+        result = {}
+        done = threading.Event()
+
+        def run(db):
+            try:
+                result.update(self._compact(db))
+            except sqlite3.Error as e:
+                logging.error(f"History compaction failed: {e}")
+                result["error"] = str(e)
+            finally:
+                done.set()
+
+        if self._writer.is_alive():
+            self._queue.put(run)
+            done.wait()
+        else:
+            run(self._db)
+        return result
+
+    def _compact(self, db: sqlite3.Connection) -> dict:
+        # Сначала WAL переносится в базу: иначе «до» и «после» сравнивали бы разное
+        db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        before = self._file_bytes()
+        rows = db.execute(
+            "SELECT id, response FROM entries WHERE typeof(response) = 'text' AND length(CAST(response AS BLOB)) > ?",
+            (self.compress_threshold,),
+        ).fetchall() if self.compress_threshold else []
+        packed = [(pack_text(response, self.compress_threshold), entry_id) for entry_id, response in rows]
+        packed = [(value, entry_id) for value, entry_id in packed if isinstance(value, bytes)]
+        with db:
+            db.executemany("UPDATE entries SET response = ? WHERE id = ?", packed)
+        pruned = self._apply_retention(db)
+        if self.searchable:
+            with db:
+                db.execute("INSERT INTO entries_fts(entries_fts) VALUES ('optimize')")
+        db.execute("VACUUM")
+        db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        after = self._file_bytes()
+        logging.info(
+            f"History compacted: {before} -> {after} bytes, {len(packed)} responses compressed, {pruned} pruned"
+        )
+        return {"bytes_before": before, "bytes_after": after, "reclaimed": max(before - after, 0),
+                "wal_bytes": self._file_bytes("-wal"), "compressed": len(packed), "pruned": pruned}
+
+    def _write_loop(self):
+        writer = self._connect()
+        retention = bool(self.max_entries or self.max_age_days or self.max_bytes)
+        next_retention = time.monotonic()
+        while True:
+            timeout = None
+            if retention:
+                now = time.monotonic()
+                if now >= next_retention:
+                    self._apply_retention(writer)
+                    next_retention = now + self.retention_interval
+                timeout = max(next_retention - now, 0.0)
+            try:
+                batch = [self._queue.get(timeout=timeout)]
+            except queue.Empty:
+                continue
+            try:
+                while len(batch) < self.batch_size and batch[-1] is not _STOP:
+                    batch.append(self._queue.get(timeout=self.batch_interval))
+            except queue.Empty:
+                pass
+
+            statements = [item for item in batch if isinstance(item, tuple)]
+            try:
+                with writer:
+                    for sql, params, _ in statements:
+                        writer.execute(sql, params)
+            except sqlite3.Error as e:
+                logging.error(f"History write failed ({len(statements)} statements): {e}")
+            # Записанное (или потерянное при ошибке) читается уже только из базы
+            self._committed([tag for _, _, tag in statements])
+            try:
+                # Служебные задачи (сжатие) — после записи пакета, вне его транзакции
+                for task in batch:
+                    if callable(task):
+                        task(writer)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+            if statements:
+                logging.debug(f"History batch written: {len(statements)} statements")
+            if batch[-1] is _STOP:
+                writer.close()
+                return
+
+    def close(self):
+        """Сброс очереди и закрытие базы"""
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+        self._db.close()
+        logging.info("History store closed")
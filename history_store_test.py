@@ -0,0 +1,100 @@
+import pytest
+
+from history_store import HistoryStore, pack_text, unpack_text
+
+
+@pytest.fixture
+def store(tmp_path):
+    history = HistoryStore(str(tmp_path / "history.sqlite3"), str(tmp_path / "missing.json"),
+                           batch_interval=0.01, page_size=3, compress_threshold=64)
+    yield history
+    history.close()
+
+
+def add(store, count, start=0):
+    return [
+        store.append(f"question {i}", f"answer {i}", "test", timestamp=f"2024-01-01T00:00:{i:02d}")
+        for i in range(start, start + count)
+    ]
+
+
+def test_pack_roundtrip():
+    text = "x" * 1000
+    assert isinstance(pack_text(text, 64), bytes)
+    assert pack_text("short", 64) == "short"
+    assert unpack_text(pack_text(text, 64)) == text
+
+
+def test_page_reads_pending_rows_without_flush(store):
+    add(store, 2)
+    assert [entry["title"] for entry in store.page()] == ["question 1", "question 0"]
+
+
+def test_page_seek_merges_database_and_pending(store):
+    add(store, 4)
+    store.flush()
+    add(store, 2, start=4)
+    first = store.page()
+    assert [entry["id"] for entry in first] == [6, 5, 4]
+    last = first[-1]
+    second = store.page(before=(last["timestamp"], last["id"]))
+    assert [entry["id"] for entry in second] == [3, 2, 1]
+    assert store.page(before=("2024-01-01T00:00:00", 1)) == []
+
+
+def test_delete_and_clear(store):
+    entries = add(store, 3)
+    store.flush()
+    store.delete(entries[1]["id"])
+    assert store.get(entries[1]["id"]) is None
+    assert [entry["id"] for entry in store.page()] == [3, 1]
+
+    store.clear()
+    assert store.page() == []
+    store.flush()
+    assert store.page() == []
+    assert store.stats()["entries"] == 0
+
+
+def test_get_unpacks_long_response(store):
+    entry = store.append("long", "line\n" * 100)
+    assert store.get(entry["id"])["response"] == "line\n" * 100
+    store.flush()
+    assert store.get(entry["id"])["response"] == "line\n" * 100
+    assert store.stats()["compressed"] == 1
+
+
+def test_search_finds_pending_and_written_rows(store):
+    if not store.searchable:
+        pytest.skip("SQLite built without FTS5")
+    store.append("how to sort a list", "use sorted()")
+    store.flush()
+    store.append("sorting dicts", "sorted(d.items())")
+    results = store.search("sort")
+    assert [entry["title"] for entry in results] == ["sorting dicts", "how to sort a list"]
+    assert "<b>sort" in results[0]["snippet"]
+    assert store.search("missing") == []
+
+
+def test_match_new_entry(store):
+    summary = store.append("parse json", "json.loads")
+    assert store.match("pars", summary, "parse json", "json.loads")["id"] == summary["id"]
+    assert store.match("xml", summary, "parse json", "json.loads") is None
+
+
+def test_compact_reports_database_bytes_only(store):
+    store.compress_threshold = 0
+    for i in range(200):
+        store.append(f"question {i}", f"answer {i} " + "text " * 100)
+    store.flush()
+    store.compress_threshold = 64
+    stats = store.stats()
+    assert stats["wal_bytes"] > 0
+
+    result = store.compact()
+    assert "error" not in result
+    assert result["compressed"] == 200
+    assert result["reclaimed"] > 0
+    assert result["bytes_before"] == result["bytes_after"] + result["reclaimed"]
+    assert result["wal_bytes"] == 0
+    assert store.stats()["entries"] == 200
@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+import aiohttp
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Ошибки установки соединения, после которых запрос безопасно повторить
+RETRY_ERRORS = (aiohttp.ClientConnectorError, aiohttp.ServerDisconnectedError, aiohttp.ConnectionTimeoutError)
+
+
+def is_provider_failure(error: Exception) -> bool:
+    """Сбой сети или сервера провайдера (а не ошибка самого запроса)"""
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status in RETRY_STATUSES or error.status >= 500
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+
+
+class RequestStats:
+    """Статистика одного запроса через транспорт"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.attempts = 0
+        self.status = None
+        self.elapsed = 0.0
+        self.new_connections = 0
+        self.reused_connections = 0
+        self.retry_delays = []
+
+    @property
+    def connection_reused(self) -> bool:
+        return self.attempts > 0 and self.new_connections == 0
+
+    def as_dict(self) -> dict:
+        return {
+            "url": self.url,
+            "attempts": self.attempts,
+            "status": self.status,
+            "elapsed": round(self.elapsed, 4),
+            "new_connections": self.new_connections,
+            "connection_reused": self.connection_reused,
+            "retry_delays": self.retry_delays,
+        }
+
+
+async def _on_connection_create_end(session, context, params):
+    if context.trace_request_ctx is not None:
+        context.trace_request_ctx.new_connections += 1
+
+
+async def _on_connection_reuseconn(session, context, params):
+    if context.trace_request_ctx is not None:
+        context.trace_request_ctx.reused_connections += 1
+
+
+class ProviderTransport:
+    """Пул keep-alive сессий aiohttp: одна ClientSession на базовый URL провайдера.
+
+    Все методы, кроме stats(), вызываются из цикла событий ApiEngine: сессии
+    привязаны к нему, и все запросы, включая стриминговые, мультиплексируются
+    одним потоком. TCP/TLS-рукопожатие выполняется один раз на соединение,
+    ответы 429/5xx и ошибки соединения повторяются с экспоненциальной
+    задержкой с учётом заголовка Retry-After. Отмена — task.cancel():
+    соединение закрывается, а не возвращается в пул.
+    """
+
+    def __init__(self, connect_timeout: float = 5.0, read_timeout: float = 60.0,
+                 max_retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 10.0,
+                 pool_size: int = 16, history_size: int = 100):
+        self.timeout = aiohttp.ClientTimeout(total=None, sock_connect=connect_timeout, sock_read=read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.pool_size = pool_size
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._history = deque(maxlen=history_size)
+
+    @staticmethod
+    def _base_url(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def session_for(self, url: str) -> aiohttp.ClientSession:
+        """Возвращает (создавая при необходимости) сессию для базового URL"""
+        base = self._base_url(url)
+        session = self._sessions.get(base)
+        if session is None or session.closed:
+            trace = aiohttp.TraceConfig()
+            trace.on_connection_create_end.append(_on_connection_create_end)
+            trace.on_connection_reuseconn.append(_on_connection_reuseconn)
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit_per_host=self.pool_size),
+                timeout=self.timeout,
+                trace_configs=[trace],
+            )
+            with self._lock:
+                self._sessions[base] = session
+            logging.info(f"HTTP session created for {base}")
+        return session
+
+    def _retry_delay(self, attempt: int, response=None) -> float:
+        """Задержка перед повтором: Retry-After или экспоненциальная с джиттером"""
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                delay = float(retry_after)
+            except ValueError:
+                try:
+                    moment = parsedate_to_datetime(retry_after)
+                    delay = (moment - datetime.now(timezone.utc)).total_seconds()
+                except (TypeError, ValueError):
+                    delay = None
+            if delay is not None:
+                return min(max(delay, 0.0), self.backoff_max)
+
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def post(self, url: str, **kwargs) -> aiohttp.ClientResponse:
+        """POST с пулом соединений, таймаутами и повторами.
+
+        Возвращает последний ответ (включая ошибочный, если повторы
+        исчерпаны); вызывающий обязан его освободить (release()/async with).
+        Статистика запроса доступна в response.transport_stats.
+        """
+        session = self.session_for(url)
+        stats = RequestStats(url)
+        started = time.perf_counter()
+
+        attempt = 0
+        while True:
+            stats.attempts += 1
+            try:
+                response = await session.post(url, trace_request_ctx=stats, **kwargs)
+            except RETRY_ERRORS:
+                if attempt >= self.max_retries:
+                    stats.elapsed = time.perf_counter() - started
+                    self._record(stats)
+                    raise
+                delay = self._retry_delay(attempt)
+            except asyncio.CancelledError:
+                stats.elapsed = time.perf_counter() - started
+                self._record(stats)
+                raise
+            else:
+                stats.status = response.status
+                if response.status not in RETRY_STATUSES or attempt >= self.max_retries:
+                    stats.elapsed = time.perf_counter() - started
+                    self._record(stats)
+                    response.transport_stats = stats
+                    return response
+                delay = self._retry_delay(attempt, response)
+                response.release()
+
+            stats.retry_delays.append(round(delay, 3))
+            logging.warning(f"Retrying {url} in {delay:.2f}s (attempt {attempt + 1}/{self.max_retries})")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def _record(self, stats: RequestStats):
+        with self._lock:
+            self._history.append(stats)
+        logging.info(
+            f"HTTP {stats.status} {stats.url} attempts={stats.attempts} "
+            f"reused={stats.connection_reused} elapsed={stats.elapsed:.3f}s"
+        )
+
+    def stats(self) -> dict:
+        """Сводка по последним запросам: доля переиспользованных соединений и т.д."""
+        with self._lock:
+            history = list(self._history)
+            sessions = list(self._sessions)
+        total = len(history)
+        reused = sum(1 for s in history if s.connection_reused)
+        return {
+            "requests": total,
+            "reused_connections": reused,
+            "reuse_ratio": round(reused / total, 3) if total else 0.0,
+            "retries": sum(s.attempts - 1 for s in history),
+            "sessions": sessions,
+            "recent": [s.as_dict() for s in history[-10:]],
+        }
+
+    async def close(self):
+        """Закрытие всех сессий и их соединений"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            await session.close()
+        logging.info("HTTP transport closed")
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport() -> ProviderTransport:
+    """Общий транспорт приложения"""
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = ProviderTransport()
+        return _transport
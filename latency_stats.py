@@ -0,0 +1,294 @@
+import bisect
+import threading
+import time
+
+from app_config import config_section
+
+
+class LatencyHistogram:
+    """Гистограмма задержек с логарифмическими корзинами (50 мс … ~2 мин)"""
+
+    BOUNDS = [0.05 * 1.25 ** i for i in range(36)]
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.total = 0
+        self.sum = 0.0
+
+    def record(self, seconds: float):
+        self.counts[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.total += 1
+        self.sum += seconds
+
+    def percentile(self, p: float):
+        """Оценка p-го перцентиля (0..100) по верхней границе корзины"""
+        if not self.total:
+            return None
+        rank = self.total * p / 100.0
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return self.BOUNDS[min(index, len(self.BOUNDS) - 1)]
+        return self.BOUNDS[-1]
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.total,
+            "mean": round(self.sum / self.total, 3) if self.total else None,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "buckets": {
+                f"<={bound:.3f}": count
+                for bound, count in zip(self.BOUNDS + [float("inf")], self.counts) if count
+            },
+        }
+
+
+class LatencyTracker:
+    """Гистограммы времени до первого токена по провайдерам"""
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def record(self, provider: str, seconds: float):
+        with self._lock:
+            self._histograms.setdefault(provider, LatencyHistogram()).record(seconds)
+
+    def percentile(self, provider: str, p: float, min_samples: int = 1):
+        with self._lock:
+            histogram = self._histograms.get(provider)
+            if histogram is None or histogram.total < min_samples:
+                return None
+            return histogram.percentile(p)
+
+    def hedge_deadline(self, provider: str, percentile: float = 90, default: float = 3.0,
+                       min_samples: int = 10) -> float:
+        """Через сколько секунд без первого токена запускать запасной запрос"""
+        value = self.percentile(provider, percentile, min_samples)
+        return default if value is None else value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {name: h.as_dict() for name, h in self._histograms.items()}
+
+
+_tracker = None
+_tracker_lock = threading.Lock()
+
+
+def get_latency_tracker() -> LatencyTracker:
+    """Общий трекер задержек приложения"""
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            _tracker = LatencyTracker()
+        return _tracker
+
+
+class DecayingAverage:
+    """Экспоненциально затухающее среднее: вес замера падает вдвое за half_life секунд"""
+
+    def __init__(self, half_life: float):
+        self.half_life = half_life
+        self.value = None
+        self._weight = 0.0
+        self._updated = None
+
+    def weight(self, now: float) -> float:
+        if self._updated is None:
+            return 0.0
+        return self._weight * 0.5 ** ((now - self._updated) / self.half_life)
+
+    def add(self, sample: float, now: float):
+        weight = self.weight(now)
+        self.value = sample if self.value is None else (self.value * weight + sample) / (weight + 1)
+        self._weight = weight + 1
+        self._updated = now
+
+
+class RouteStats:
+    """Скользящие показатели одного маршрута (провайдер, модель, путь)"""
+
+    def __init__(self, half_life: float):
+        self.ttft = DecayingAverage(half_life)
+        self.tokens_per_sec = DecayingAverage(half_life)
+        self.error_rate = DecayingAverage(half_life)
+        self.requests = 0
+        self.errors = 0
+
+    def expected_seconds(self, expected_tokens: int):
+        """Ожидаемое время полного ответа с поправкой на долю ошибок"""
+        if self.ttft.value is None:
+            return None
+        seconds = self.ttft.value
+        if self.tokens_per_sec.value:
+            seconds += expected_tokens / self.tokens_per_sec.value
+        error_rate = self.error_rate.value or 0.0
+        return seconds / max(0.05, 1.0 - error_rate)
+
+    def as_dict(self, now: float, expected_tokens: int) -> dict:
+        expected = self.expected_seconds(expected_tokens)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "ttft": round(self.ttft.value, 3) if self.ttft.value is not None else None,
+            "tokens_per_sec": round(self.tokens_per_sec.value, 1) if self.tokens_per_sec.value else None,
+            "error_rate": round(self.error_rate.value, 3) if self.error_rate.value is not None else None,
+            "weight": round(self.error_rate.weight(now), 2),
+            "expected_seconds": round(expected, 3) if expected is not None else None,
+        }
+
+
+class ProviderStats:
+    """Живая статистика провайдеров для адаптивной маршрутизации (режим Auto).
+
+    Замеры стареют с периодом полураспада half_life: маршрут, по которому
+    давно не было запросов, снова считается неизмеренным и получает пробный
+    запрос, поэтому выбор подстраивается под текущее состояние провайдеров.
+    """
+
+    def __init__(self, half_life: float = 600.0, min_weight: float = 0.5, expected_tokens: int = 600):
+        self.half_life = half_life
+        self.min_weight = min_weight
+        self.expected_tokens = expected_tokens
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def _route(self, provider: str, model: str, route: str) -> RouteStats:
+        key = (provider, model, route)
+        stats = self._routes.get(key)
+        if stats is None:
+            stats = self._routes[key] = RouteStats(self.half_life)
+        return stats
+
+    def record_success(self, provider: str, model: str, route: str, ttft: float,
+                       tokens: int = 0, generation_seconds: float = 0.0, now: float = None):
+        now = time.time() if now is None else now
+        with self._lock:
+            stats = self._route(provider, model, route)
+            stats.requests += 1
+            stats.ttft.add(ttft, now)
+            if tokens > 1 and generation_seconds > 0:
+                stats.tokens_per_sec.add(tokens / generation_seconds, now)
+            stats.error_rate.add(0.0, now)
+
+    def record_error(self, provider: str, model: str, route: str, now: float = None):
+        now = time.time() if now is None else now
+        with self._lock:
+            stats = self._route(provider, model, route)
+            stats.requests += 1
+            stats.errors += 1
+            stats.error_rate.add(1.0, now)
+
+    def choose(self, providers: list, now: float = None):
+        """Провайдер с наименьшим ожидаемым временем ответа.
+
+        Неизмеренные (или устаревшие) маршруты выбираются в первую очередь,
+        чтобы получить по ним свежие данные.
+        """
+        if not providers:
+            return None
+        now = time.time() if now is None else now
+        best, best_seconds = None, None
+        with self._lock:
+            for provider in providers:
+                stats = self._routes.get((provider.name, provider.model, provider.path))
+                if stats is None or stats.error_rate.weight(now) < self.min_weight:
+                    return provider
+                seconds = stats.expected_seconds(self.expected_tokens)
+                if seconds is None:
+                    # Были только ошибки — маршрут хуже любого измеренного
+                    seconds = float("inf")
+                if best_seconds is None or seconds < best_seconds:
+                    best, best_seconds = provider, seconds
+        return best
+
+    def snapshot(self, now: float = None) -> list:
+        now = time.time() if now is None else now
+        with self._lock:
+            return [
+                {"provider": provider, "model": model, "route": route,
+                 **stats.as_dict(now, self.expected_tokens)}
+                for (provider, model, route), stats in self._routes.items()
+            ]
+
+
+_provider_stats = None
+_provider_stats_lock = threading.Lock()
+
+
+def get_provider_stats() -> ProviderStats:
+    """Общая статистика провайдеров; параметры из раздела routing в config.yaml"""
+    global _provider_stats
+    with _provider_stats_lock:
+        if _provider_stats is None:
+            _provider_stats = ProviderStats(**config_section("routing"))
+        return _provider_stats
+
+
+def parse_usage(usage: dict) -> dict:
+    """Поле usage ответа в общем виде.
+
+    cached_tokens — токены промпта из кэша провайдера: OpenAI отдаёт их в
+    prompt_tokens_details.cached_tokens, DeepSeek — в prompt_cache_hit_tokens.
+    None, если провайдер их не сообщает.
+    """
+    details = usage.get("prompt_tokens_details") or {}
+    cached = details.get("cached_tokens")
+    if cached is None:
+        cached = usage.get("prompt_cache_hit_tokens")
+    prompt_tokens = usage.get("prompt_tokens") or 0
+    return {
+        "prompt_tokens": prompt_tokens,
+        "cached_tokens": cached,
+        "uncached_tokens": prompt_tokens - cached if cached is not None else None,
+        "completion_tokens": usage.get("completion_tokens") or 0,
+    }
+
+
+class UsageTracker:
+    """Суммарные токены по провайдерам, в том числе попавшие в кэш промпта"""
+
+    def __init__(self):
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def record(self, provider: str, usage: dict):
+        with self._lock:
+            totals = self._totals.setdefault(provider, {
+                "requests": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                "reported_requests": 0, "reported_prompt_tokens": 0, "cached_tokens": 0,
+            })
+            totals["requests"] += 1
+            totals["prompt_tokens"] += usage["prompt_tokens"]
+            totals["completion_tokens"] += usage["completion_tokens"]
+            if usage["cached_tokens"] is not None:
+                totals["reported_requests"] += 1
+                totals["reported_prompt_tokens"] += usage["prompt_tokens"]
+                totals["cached_tokens"] += usage["cached_tokens"]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            result = {}
+            for provider, totals in self._totals.items():
+                reported = totals["reported_prompt_tokens"]
+                result[provider] = dict(
+                    totals, cache_ratio=round(totals["cached_tokens"] / reported, 3) if reported else None
+                )
+            return result
+
+
+_usage_tracker = None
+_usage_tracker_lock = threading.Lock()
+
+
+def get_usage_tracker() -> UsageTracker:
+    """Общий учёт токенов приложения"""
+    global _usage_tracker
+    with _usage_tracker_lock:
+        if _usage_tracker is None:
+            _usage_tracker = UsageTracker()
+        return _usage_tracker
@@ -0,0 +1,308 @@
+import logging
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from markdown import Markdown
+from PyQt6.QtCore import QObject, pyqtSignal
+from PyQt6.QtGui import QTextCursor
+
+from highlighting import get_highlighter
+
+_FENCES = ("```", "~~~")
+
+
+def _doc_length(text: str) -> int:
+    """Длина текста в позициях QTextDocument (единицы UTF-16)"""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def create_markdown() -> Markdown:
+    """Конвертер Markdown → HTML; блоки кода подсвечивает render_markdown"""
+    return Markdown(extensions=["fenced_code"])
+
+
+def render_markdown(markdown: Markdown, text: str) -> str:
+    """Markdown → HTML с подсветкой кода общим кэширующим сервисом"""
+    return get_highlighter().highlight_html(markdown.reset().convert(text))
+
+
+class MarkdownBlocks:
+    """Деление потока Markdown на завершённые блоки.
+
+    Блок завершается пустой строкой вне блока кода или закрывающим
+    ограничителем ``` — дальнейший текст на его разметку уже не влияет.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._done = 0   # конец последнего выданного блока
+        self._scan = 0   # начало ещё не просмотренной строки
+        self._in_fence = False
+
+    def feed(self, chunk: str) -> list:
+        """Добавляет фрагмент; возвращает блоки, завершённые с его приходом"""
+        self.text += chunk
+        blocks = []
+        while True:
+            end = self.text.find("\n", self._scan)
+            if end < 0:
+                return blocks
+            line = self.text[self._scan:end].strip()
+            self._scan = end + 1
+            if line.startswith(_FENCES):
+                self._in_fence = not self._in_fence
+                cut = not self._in_fence
+            else:
+                cut = not line and not self._in_fence
+            if cut and self.text[self._done:self._scan].strip():
+                # Пустые строки без текста присоединяются к следующему блоку
+                blocks.append(self.text[self._done:self._scan])
+                self._done = self._scan
+
+    @property
+    def tail(self) -> str:
+        """Текст после последнего завершённого блока"""
+        return self.text[self._done:]
+
+    def finish(self) -> list:
+        """Остаток потока как последний блок"""
+        block = self.tail
+        self._done = self._scan = len(self.text)
+        return [block] if block.strip() else []
+
+
+class MarkdownAppender(QObject):
+    """Вывод ответа в конец QTextEdit с конвертацией Markdown в фоновом потоке.
+
+    Завершённые блоки ответа конвертируются в HTML в отдельном потоке и
+    вставляются в конец документа через QTextCursor; ещё не отрисованный
+    текст показывается после них как черновик. Документ не пересобирается,
+    поэтому стоимость пропорциональна только новому тексту, а прежнее
+    содержимое окна сохраняется.
+    """
+
+    finished = pyqtSignal()
+    _rendered = pyqtSignal(int, str, float)  # поколение, HTML, время конвертации
+
+    def __init__(self, text_edit, parent=None):
+        super().__init__(parent)
+        self.text_edit = text_edit
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="markdown")
+        self._markdown = None  # создаётся и используется только в потоке конвертации
+        self._generation = 0
+        self._rendered.connect(self._insert)
+        self._stats = {"blocks": 0, "render_seconds": 0.0, "insert_seconds": 0.0}
+        self.reset()
+
+    @property
+    def active(self) -> bool:
+        return self._blocks is not None
+
+    def reset(self):
+        """Забыть текущий ответ (окно очищено); запоздавшие блоки отбрасываются"""
+        self._generation += 1
+        self._blocks = None
+        self._start = None          # позиция начала ответа в документе
+        self._preview_start = None  # позиция начала черновика
+        self._submitted = deque()   # блоки, отправленные на конвертацию
+        self._finishing = False
+
+    def feed(self, chunk: str):
+        """Очередной фрагмент стримингового ответа"""
+        if self._blocks is None or self._finishing:
+            self._begin()
+        chunk = chunk.replace("\r\n", "\n").replace("\r", "\n")
+        for block in self._blocks.feed(chunk):
+            self._submit(block)
+        self._end_cursor().insertText(chunk)
+        self._scroll_to_end()
+
+    def finish(self, text: str):
+        """Полный ответ: дорисовывается остаток (или весь ответ, если стриминга не было)"""
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+        if self._blocks is not None and text != self._blocks.text:
+            # Ответ разошёлся со стримом (например, повтор у другого провайдера)
+            self._discard()
+        blocks = []
+        if self._blocks is None:
+            self._begin()
+            blocks = self._blocks.feed(text)
+            self._end_cursor().insertText(text)
+        blocks += self._blocks.finish()
+        self._finishing = True
+        for block in blocks:
+            self._submit(block)
+        if not self._submitted:
+            self._done()
+
+    def shutdown(self):
+        self._generation += 1
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        stats = dict(self._stats)
+        if stats["blocks"]:
+            stats["avg_render_ms"] = round(stats["render_seconds"] / stats["blocks"] * 1000, 2)
+            stats["avg_insert_ms"] = round(stats["insert_seconds"] / stats["blocks"] * 1000, 2)
+        return stats
+
+    def _begin(self):
+        if self._finishing:
+            # Новый ответ пришёл раньше, чем дорисовался прошлый: его остаток остаётся черновиком
+            self._generation += 1
+            self._submitted.clear()
+            self._finishing = False
+        self._blocks = MarkdownBlocks()
+        cursor = self._end_cursor()
+        if not self.text_edit.document().isEmpty():
+            cursor.insertBlock()
+        self._start = self._preview_start = cursor.position()
+
+    def _discard(self):
+        """Убирает из документа начатый ответ"""
+        cursor = self._end_cursor()
+        cursor.setPosition(self._start, QTextCursor.MoveMode.KeepAnchor)
+        cursor.removeSelectedText()
+        self._generation += 1
+        self._blocks = None
+        self._submitted.clear()
+
+    def _end_cursor(self) -> QTextCursor:
+        cursor = QTextCursor(self.text_edit.document())
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        return cursor
+
+    def _submit(self, block: str):
+        self._submitted.append(block)
+        self._executor.submit(self._render, self._generation, block)
+
+    def _render(self, generation: int, block: str):
+        started = time.perf_counter()
+        try:
+            if self._markdown is None:
+                self._markdown = create_markdown()
+            html = render_markdown(self._markdown, block)
+        except Exception as e:
+            logging.error(f"Markdown rendering failed: {e}")
+            html = "<pre>" + block.replace("&", "&amp;").replace("<", "&lt;") + "</pre>"
+        self._rendered.emit(generation, html, time.perf_counter() - started)
+
+    def _insert(self, generation: int, html: str, render_seconds: float):
+        """Заменяет черновик первого ожидающего блока его HTML"""
+        if generation != self._generation or not self._submitted:
+            return
+        started = time.perf_counter()
+        block = self._submitted.popleft()
+        cursor = QTextCursor(self.text_edit.document())
+        cursor.setPosition(self._preview_start)
+        cursor.setPosition(self._preview_start + _doc_length(block), QTextCursor.MoveMode.KeepAnchor)
+        if cursor.selectedText().replace("\u2029", "\n") == block:
+            cursor.removeSelectedText()
+            if not cursor.atBlockStart():
+                cursor.insertBlock()
+            cursor.insertHtml(html)
+            if not self._submitted and not self._blocks.tail:
+                # Черновик кончился, а HTML-абзацы могли оставить пустую строку
+                cursor.movePosition(QTextCursor.MoveOperation.End, QTextCursor.MoveMode.KeepAnchor)
+                cursor.removeSelectedText()
+            elif not cursor.atBlockStart():
+                cursor.insertBlock()
+            self._scroll_to_end()
+        else:
+            # В окно успели дописать что-то ещё — блок остаётся текстом
+            logging.debug("Markdown preview moved, block left as plain text")
+        self._preview_start = cursor.position()
+
+        self._stats["blocks"] += 1
+        self._stats["render_seconds"] += render_seconds
+        self._stats["insert_seconds"] += time.perf_counter() - started
+        if self._finishing and not self._submitted:
+            self._done()
+
+    def _done(self):
+        self._blocks = None
+        self._finishing = False
+        self.finished.emit()
+
+    def _scroll_to_end(self):
+        scrollbar = self.text_edit.verticalScrollBar()
+        scrollbar.setValue(scrollbar.maximum())
+
+
+class AnswerQueue(QObject):
+    """Ответы нескольких источников в одном окне через общий MarkdownAppender.
+
+    Дописывается один ответ за раз: пока выводится ответ одного источника
+    (клиента API), фрагменты, итог и ошибки остальных копятся и выводятся
+    после него в порядке прихода. Так ответы не перемешиваются, а ошибка
+    одного источника не обрывает чужой ответ.
+    """
+
+    failed = pyqtSignal(object, str)  # источник, текст ошибки — когда до неё дошла очередь
+
+    def __init__(self, appender: MarkdownAppender, parent=None):
+        super().__init__(parent)
+        self.appender = appender
+        self._current = None      # источник, чей ответ сейчас выводится
+        self._finishing = False   # его итог отдан, appender дорисовывает остаток
+        self._waiting = OrderedDict()  # источник -> [(вид, данные)]
+        appender.finished.connect(self._advance)
+
+    @property
+    def active(self) -> bool:
+        return self._current is not None or bool(self._waiting)
+
+    def feed(self, source, chunk: str):
+        self._event(source, ("chunk", chunk))
+
+    def finish(self, source, text: str):
+        self._event(source, ("finish", text))
+
+    def fail(self, source, error: str):
+        self._event(source, ("error", error))
+
+    def cancel(self, source):
+        """Запрос источника отменён: его ожидающие события отбрасываются,
+        а если выводился его ответ — очередь переходит к следующему"""
+        self._waiting.pop(source, None)
+        if source is self._current and not self._finishing:
+            self.appender.reset()
+            self._advance()
+
+    def reset(self):
+        """Окно очищено: начатый и ожидающие ответы забываются"""
+        self._current = None
+        self._finishing = False
+        self._waiting.clear()
+        self.appender.reset()
+
+    def _event(self, source, event):
+        if self._current is None:
+            self._current = source
+        if source is self._current and not self._finishing:
+            self._apply(source, event)
+        else:
+            self._waiting.setdefault(source, []).append(event)
+
+    def _apply(self, source, event):
+        kind, payload = event
+        if kind == "chunk":
+            self.appender.feed(payload)
+        elif kind == "finish":
+            self._finishing = True
+            self.appender.finish(payload)  # по окончании — finished → _advance
+        else:
+            self.appender.reset()
+            self.failed.emit(source, payload)
+            self._advance()
+
+    def _advance(self):
+        """Ответ выведен — очередь переходит к следующему источнику"""
+        self._current = None
+        self._finishing = False
+        if not self._waiting:
+            return
+        source = next(iter(self._waiting))
+        for event in self._waiting.pop(source):
+            self._event(source, event)
@@ -0,0 +1,90 @@
+import pytest
+
+pytest.importorskip("PyQt6")
+pytest.importorskip("markdown")
+
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from markdown_renderer import AnswerQueue, MarkdownBlocks
+
+
+class FakeAppender(QObject):
+    """Записывает вызовы вместо вывода в QTextEdit; finished испускается вручную"""
+
+    finished = pyqtSignal()
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def feed(self, chunk):
+        self.calls.append(("feed", chunk))
+
+    def finish(self, text):
+        self.calls.append(("finish", text))
+
+    def reset(self):
+        self.calls.append(("reset", None))
+
+
+@pytest.fixture
+def queue():
+    appender = FakeAppender()
+    answers = AnswerQueue(appender)
+    answers.errors = []
+    answers.failed.connect(lambda source, error: answers.errors.append((source, error)))
+    return answers
+
+
+def test_second_source_waits_for_first(queue):
+    queue.feed("voice", "a")
+    queue.feed("typed", "x")
+    queue.finish("voice", "a!")
+    assert queue.appender.calls == [("feed", "a"), ("finish", "a!")]
+
+    queue.appender.finished.emit()
+    assert queue.appender.calls[2:] == [("feed", "x")]
+    assert queue.active
+
+
+def test_error_of_waiting_source_shown_after_current(queue):
+    queue.feed("voice", "a")
+    queue.fail("typed", "boom")
+    assert queue.errors == []
+
+    queue.finish("voice", "a")
+    queue.appender.finished.emit()
+    assert queue.errors == [("typed", "boom")]
+    assert not queue.active
+
+
+def test_cancel_current_advances(queue):
+    queue.feed("typed", "partial")
+    queue.feed("voice", "b")
+    queue.cancel("typed")
+    assert queue.appender.calls == [("feed", "partial"), ("reset", None), ("feed", "b")]
+
+
+def test_cancel_drops_waiting_events(queue):
+    queue.feed("voice", "a")
+    queue.feed("typed", "x")
+    queue.cancel("typed")
+    queue.finish("voice", "a")
+    queue.appender.finished.emit()
+    assert ("feed", "x") not in queue.appender.calls
+    assert not queue.active
+
+
+def test_cancel_after_finish_keeps_answer(queue):
+    queue.finish("typed", "done")
+    queue.cancel("typed")
+    assert ("reset", None) not in queue.appender.calls
+    queue.appender.finished.emit()
+    assert not queue.active
+
+
+def test_blocks_split_outside_code_fences():
+    blocks = MarkdownBlocks()
+    assert blocks.feed("text\n\n```py\na\n\nb\n") == ["text\n\n"]
+    assert blocks.feed("```\n\nend") == ["```py\na\n\nb\n```\n"]
+    assert blocks.finish() == ["\nend"]
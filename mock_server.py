@@ -0,0 +1,255 @@
+"""Локальный mock-сервер OpenAI-совместимого chat/completions.
+
+Поддерживает обычные и стриминговые (SSE) ответы, настраиваемую задержку до
+первого токена, скорость генерации и долю ошибок, чтобы нагрузочно
+тестировать путь запросов без сети и воспроизводимо. В usage имитируется
+кэш промпта: уже виденный префикс сообщений считается cached_tokens.
+
+    python mock_server.py --port 8800 --latency 0.3 --tokens-per-sec 50 --error-rate 0.1
+"""
+import argparse
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = (
+    "the function reads input validates arguments and returns a result "
+    "consider extracting this loop into a helper and adding a type hint "
+    "edge cases include empty lists none values and very large numbers"
+).split()
+
+
+class MockConfig:
+    """Параметры поведения mock-сервера"""
+
+    def __init__(self, latency: float = 0.2, jitter: float = 0.0, tokens_per_sec: float = 50.0,
+                 response_tokens: int = 60, error_rate: float = 0.0, error_status: int = 503,
+                 retry_after: float = None, seed: int = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.tokens_per_sec = tokens_per_sec
+        self.response_tokens = response_tokens
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+
+
+class MockChatHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "MockLLM/1.0"
+
+    @property
+    def config(self) -> MockConfig:
+        return self.server.mock_config
+
+    def log_message(self, fmt, *args):
+        logging.debug(f"mock: {fmt % args}")
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "mock-model", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"message": "invalid json"}})
+            return
+
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        self.server.count("requests")
+        config = self.config
+        if config.random.random() < config.error_rate:
+            self.server.count("errors")
+            headers = {"Retry-After": str(config.retry_after)} if config.retry_after is not None else {}
+            self._send_json(config.error_status, {"error": {"message": "mock failure"}}, headers)
+            return
+
+        time.sleep(max(0.0, config.latency + config.random.uniform(-config.jitter, config.jitter)))
+        tokens = self._make_tokens(body)
+        model = body.get("model", "mock-model")
+
+        if body.get("stream"):
+            self._stream(body, model, tokens)
+        else:
+            self._sleep_for_tokens(len(tokens))
+            self._send_json(200, {
+                "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": "stop",
+                }],
+                "usage": self._usage(body, tokens),
+            })
+
+    def _make_tokens(self, body: dict) -> list:
+        messages = body.get("messages") or [{}]
+        prompt = str(messages[-1].get("content", ""))
+        words = [f"Mock answer to: {prompt[:40]!r}."]
+        words += [self.config.random.choice(WORDS) for _ in range(self.config.response_tokens - 1)]
+        return [word + " " for word in words]
+
+    def _usage(self, body: dict, tokens: list) -> dict:
+        messages = body.get("messages") or []
+        counts = [len(str(m.get("content", "")).split()) for m in messages]
+        prompt_tokens = sum(counts)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens),
+            "prompt_tokens_details": {"cached_tokens": self.server.cached_prefix_tokens(messages, counts)},
+        }
+
+    def _sleep_for_tokens(self, count: int):
+        if self.config.tokens_per_sec > 0:
+            time.sleep(count / self.config.tokens_per_sec)
+
+    def _stream(self, body: dict, model: str, tokens: list):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        try:
+            for token in tokens:
+                self._send_event({
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+                })
+                self._sleep_for_tokens(1)
+            self._send_event({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            })
+            if (body.get("stream_options") or {}).get("include_usage"):
+                self._send_event({
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "model": model,
+                    "choices": [],
+                    "usage": self._usage(body, tokens),
+                })
+            self._send_chunk(b"data: [DONE]\n\n")
+            self._send_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            # Клиент отменил запрос
+            self.server.count("aborted")
+            self.close_connection = True
+
+    def _send_event(self, payload: dict):
+        self._send_chunk(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+    def _send_chunk(self, data: bytes):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _send_json(self, status: int, payload: dict, headers: dict = None):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Очередь listen() по умолчанию (5) теряет SYN при пачке параллельных запросов
+    request_queue_size = 128
+
+    def __init__(self, address, config: MockConfig):
+        super().__init__(address, MockChatHandler)
+        self.mock_config = config
+        self.stats = {"requests": 0, "errors": 0, "aborted": 0}
+        self._stats_lock = threading.Lock()
+        self._prefixes = set()
+        self._prefix_lock = threading.Lock()
+
+    def count(self, name: str):
+        """Счётчик статистики; обработчики работают в разных потоках"""
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def cached_prefix_tokens(self, messages: list, counts: list) -> int:
+        """Токены самого длинного уже встречавшегося префикса сообщений"""
+        cached = 0
+        with self._prefix_lock:
+            for size in range(1, len(messages)):
+                digest = hashlib.sha256(
+                    json.dumps(messages[:size], sort_keys=True, ensure_ascii=False).encode("utf-8")
+                ).hexdigest()
+                if digest in self._prefixes:
+                    cached = sum(counts[:size])
+                self._prefixes.add(digest)
+        return cached
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+def start_mock_server(host: str = "127.0.0.1", port: int = 0, config: MockConfig = None) -> MockServer:
+    """Запуск сервера в фоновом потоке (port=0 — любой свободный порт)"""
+    server = MockServer((host, port), config or MockConfig())
+    threading.Thread(target=server.serve_forever, name="mock-llm", daemon=True).start()
+    logging.info(f"Mock LLM server listening on {server.base_url}")
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible mock server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--latency", type=float, default=0.2, help="Задержка до первого токена, с")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Разброс задержки, ±с")
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0)
+    parser.add_argument("--response-tokens", type=int, default=60)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов с ошибкой, 0..1")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--retry-after", type=float)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    config = MockConfig(
+        latency=args.latency, jitter=args.jitter, tokens_per_sec=args.tokens_per_sec,
+        response_tokens=args.response_tokens, error_rate=args.error_rate,
+        error_status=args.error_status, retry_after=args.retry_after, seed=args.seed,
+    )
+    server = MockServer((args.host, args.port), config)
+    logging.info(f"Mock LLM server listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
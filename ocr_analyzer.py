@@ -1,5 +1,6 @@
 import logging
 import io
+import numpy as np
 from PIL import Image
 from PyQt6.QtGui import QPixmap
 import pytesseract
@@ -10,13 +11,26 @@ class CodeAnalyzer:
         """Анализ изображения и извлечение текста"""
         try:
             image = self.qpixmap_to_pil(pixmap)
-            text = pytesseract.image_to_string(image, lang="eng")
-            logging.info("Image analyzed successfully")
-            return text
+            return self._recognize(image)
         except Exception as e:
             logging.error(f"Image analysis failed: {e}")
             return ""
 
+    def analyze_frame(self, frame: np.ndarray) -> str:
+        """Анализ кадра BGRA от бэкенда захвата"""
+        try:
+            image = self.frame_to_pil(frame)
+            return self._recognize(image)
+        except Exception as e:
+            logging.error(f"Frame analysis failed: {e}")
+            return ""
+
+    @staticmethod
+    def _recognize(image: Image.Image) -> str:
+        text = pytesseract.image_to_string(image, lang="eng")
+        logging.info("Image analyzed successfully")
+        return text
+
     @staticmethod
     def qpixmap_to_pil(pixmap: QPixmap) -> Image.Image:
         """Преобразование QPixmap в PIL.Image"""
@@ -28,3 +42,10 @@ class CodeAnalyzer:
         pixmap.save(buffer, "PNG")
         buffer.close()
         return Image.open(io.BytesIO(byte_array.data()))
+
+    @staticmethod
+    def frame_to_pil(frame: np.ndarray) -> Image.Image:
+        """Преобразование кадра BGRA (h, w, 4) в PIL.Image без кодирования в PNG"""
+        h, w = frame.shape[:2]
+        frame = np.ascontiguousarray(frame)
+        return Image.frombuffer("RGB", (w, h), frame, "raw", "BGRX", 0, 1)
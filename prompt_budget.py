@@ -0,0 +1,214 @@
+import logging
+import re
+import threading
+
+from app_config import config_section
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+# Номер строки и один разделитель; отступ кода после него не трогается
+_GUTTER_RE = re.compile(r"^\s*\d{1,5}(?:\s?[|:]\s?|\.\s|\s)")
+# Строковые литералы пропускаются целиком: пробелы внутри них — часть данных
+_INNER_SPACES_RE = re.compile(r"(\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*')|(?<=\S)[ \t]{2,}")
+# Серия одинаковых строк длиннее этой — повтор распознавания, а не код
+_MAX_REPEATS = 2
+# Строки из одних скобок/знаков препинания — нормальный код, а не шум OCR
+_CODE_PUNCT = set("{}()[];:,.<>=+-*/\\\"'#@")
+
+
+def estimate_tokens(text: str) -> int:
+    """Локальная оценка числа токенов без токенизатора провайдера.
+
+    Слово даёт примерно токен на каждые 4 символа, каждый знак
+    препинания — отдельный токен; для кода оценка близка к BPE.
+    """
+    tokens = 0
+    for match in _WORD_RE.finditer(text):
+        tokens += (len(match.group()) + 3) // 4
+    return tokens
+
+
+def strip_gutter(lines: list) -> list:
+    """Убирает колонку номеров строк, если она есть у большинства строк"""
+    numbered = [line for line in lines if line.strip() and _GUTTER_RE.match(line)]
+    content = [line for line in lines if line.strip()]
+    if not content or len(numbered) < 0.6 * len(content):
+        return lines
+    stripped = [_GUTTER_RE.sub("", line, count=1) for line in lines]
+    # Номера, выровненные по ширине колонки, оставляют общий лишний отступ
+    indents = [len(line) - len(line.lstrip(" ")) for line in stripped if line.strip()]
+    extra = min(indents, default=0)
+    return [line[extra:] if line.strip() else line for line in stripped]
+
+
+def is_noise_line(line: str) -> bool:
+    """Мусор распознавания: строка почти без букв и цифр, не похожая на код"""
+    stripped = line.strip()
+    if not stripped:
+        return False
+    alnum = sum(ch.isalnum() for ch in stripped)
+    if alnum == 0:
+        return not all(ch in _CODE_PUNCT or ch.isspace() for ch in stripped)
+    return len(stripped) >= 4 and alnum / len(stripped) < 0.25
+
+
+def collapse_inner_spaces(line: str) -> str:
+    """Схлопывает пробелы внутри строки, кроме отступа и строковых литералов"""
+    return _INNER_SPACES_RE.sub(lambda m: m.group(1) or " ", line)
+
+
+def collapse_repeats(lines: list) -> list:
+    """Серию одинаковых строк длиннее _MAX_REPEATS заменяет одной.
+
+    Две одинаковые строки подряд в коде обычны ('count += 1' дважды) и
+    остаются как есть; строки из одних скобок ('}' после '}') не трогаются.
+    """
+    result = []
+    i = 0
+    while i < len(lines):
+        j = i
+        while j + 1 < len(lines) and lines[j + 1] == lines[i]:
+            j += 1
+        run = j - i + 1
+        repeated = run > _MAX_REPEATS and any(ch.isalnum() for ch in lines[i])
+        result.extend([lines[i]] if repeated else lines[i:j + 1])
+        i = j + 1
+    return result
+
+
+def clean_ocr_text(text: str) -> str:
+    """Очистка текста OCR: номера строк, мусор, повторы, лишние пробелы и пустые строки.
+
+    Отступ в начале строки и пробелы в строковых литералах сохраняются.
+    """
+    lines = strip_gutter(text.expandtabs(4).splitlines())
+    cleaned = []
+    for line in lines:
+        if is_noise_line(line):
+            continue
+        line = collapse_inner_spaces(line.rstrip())
+        if not line:
+            # Подряд идущие пустые строки схлопываются в одну
+            if cleaned and cleaned[-1] == "":
+                continue
+        cleaned.append(line)
+    return "\n".join(collapse_repeats(cleaned)).strip("\n")
+
+
+def truncate_to_budget(text: str, budget: int, head_share: float = 0.6) -> str:
+    """Укорачивает текст до budget токенов, вырезая середину.
+
+    Начало (импорты, сигнатуры) и конец (место ошибки, последняя правка)
+    обычно важнее середины; разрез проходит по границам строк.
+    """
+    if estimate_tokens(text) <= budget:
+        return text
+    lines = text.splitlines()
+    head_budget = int(budget * head_share)
+    tail_budget = budget - head_budget
+
+    head, used = [], 0
+    for line in lines:
+        cost = estimate_tokens(line) + 1
+        if used + cost > head_budget:
+            break
+        head.append(line)
+        used += cost
+
+    tail, used = [], 0
+    for line in reversed(lines[len(head):]):
+        cost = estimate_tokens(line) + 1
+        if used + cost > tail_budget:
+            break
+        tail.append(line)
+        used += cost
+    tail.reverse()
+
+    skipped = len(lines) - len(head) - len(tail)
+    return "\n".join(head + [f"... [пропущено строк: {skipped}] ..."] + tail)
+
+
+class PreparedPrompt:
+    """Результат подготовки промпта"""
+
+    def __init__(self, text: str, original_tokens: int, tokens: int, budget: int, truncated: bool):
+        self.text = text
+        self.original_tokens = original_tokens
+        self.tokens = tokens
+        self.budget = budget
+        self.truncated = truncated
+
+    @property
+    def saved_tokens(self) -> int:
+        return max(self.original_tokens - self.tokens, 0)
+
+    def summary(self) -> str:
+        note = ", обрезан" if self.truncated else ""
+        return f"Промпт: {self.original_tokens} → {self.tokens} ток. (−{self.saved_tokens}{note})"
+
+
+class PromptPreparer:
+    """Подготовка промпта перед отправкой: очистка и бюджет контекста.
+
+    Бюджет провайдера — его context_tokens минус reserve_tokens на ответ,
+    но не больше max_prompt_tokens (ограничение стоимости).
+    """
+
+    def __init__(self, enabled: bool = True, reserve_tokens: int = 1024,
+                 max_prompt_tokens: int = 6000, default_context_tokens: int = 8192):
+        self.enabled = enabled
+        self.reserve_tokens = reserve_tokens
+        self.max_prompt_tokens = max_prompt_tokens
+        self.default_context_tokens = default_context_tokens
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "original_tokens": 0, "tokens": 0, "truncated": 0}
+
+    def budget_for(self, provider=None) -> int:
+        context = getattr(provider, "context_tokens", None) or self.default_context_tokens
+        return max(min(self.max_prompt_tokens, context - self.reserve_tokens), 1)
+
+    def clean(self, text: str) -> str:
+        """Очистка текста OCR, если подготовка включена"""
+        return clean_ocr_text(text) if self.enabled else text
+
+    def prepare(self, text: str, provider=None, template: str = "{text}") -> PreparedPrompt:
+        """Очищает текст OCR и укладывает промпт (вместе с шаблоном) в бюджет"""
+        original_tokens = estimate_tokens(template.format(text=text))
+        budget = self.budget_for(provider)
+        if not self.enabled:
+            return PreparedPrompt(template.format(text=text), original_tokens, original_tokens, budget, False)
+
+        cleaned = self.clean(text)
+        overhead = estimate_tokens(template.format(text=""))
+        body = truncate_to_budget(cleaned, max(budget - overhead, 1))
+        prompt = template.format(text=body)
+        prepared = PreparedPrompt(prompt, original_tokens, estimate_tokens(prompt), budget, body != cleaned)
+
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["original_tokens"] += prepared.original_tokens
+            self._stats["tokens"] += prepared.tokens
+            self._stats["truncated"] += int(prepared.truncated)
+        logging.info(
+            f"Prompt prepared: {prepared.original_tokens} -> {prepared.tokens} tokens "
+            f"(saved {prepared.saved_tokens}, budget {budget}, truncated={prepared.truncated})"
+        )
+        return prepared
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["saved_tokens"] = stats["original_tokens"] - stats["tokens"]
+        return stats
+
+
+_preparer = None
+_preparer_lock = threading.Lock()
+
+
+def get_prompt_preparer() -> PromptPreparer:
+    """Общий подготовитель промптов; параметры из раздела prompt в config.yaml"""
+    global _preparer
+    with _preparer_lock:
+        if _preparer is None:
+            _preparer = PromptPreparer(**config_section("prompt"))
+        return _preparer
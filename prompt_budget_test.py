@@ -0,0 +1,54 @@
+from prompt_budget import clean_ocr_text, estimate_tokens, strip_gutter, truncate_to_budget
+
+
+def test_gutter_keeps_relative_indent():
+    text = "1  def f(x):\n2      if x:\n3          return 1\n4      return 0"
+    assert clean_ocr_text(text) == "def f(x):\n    if x:\n        return 1\n    return 0"
+
+
+def test_gutter_with_separator():
+    lines = [" 9 | a = 1", "10 |     b = 2"]
+    assert strip_gutter(lines) == ["a = 1", "    b = 2"]
+
+
+def test_gutter_ignored_when_few_lines_numbered():
+    lines = ["x = 1", "y = 2", "3 items"]
+    assert strip_gutter(lines) == lines
+
+
+def test_repeated_braces_survive():
+    assert clean_ocr_text("    }\n}") == "    }\n}"
+    assert clean_ocr_text("  }\n }\n}\n}\n}") == "  }\n }\n}\n}\n}"
+
+
+def test_double_line_survives():
+    text = "count += 1\ncount += 1"
+    assert clean_ocr_text(text) == text
+
+
+def test_long_repeat_run_collapsed():
+    text = "x = 1\nprint(x)\nprint(x)\nprint(x)\nprint(x)\ny = 2"
+    assert clean_ocr_text(text) == "x = 1\nprint(x)\ny = 2"
+
+
+def test_inner_spaces_collapsed_outside_strings():
+    text = 'label  =   "total    sum"  +  \'per   item\''
+    assert clean_ocr_text(text) == 'label = "total    sum" + \'per   item\''
+
+
+def test_indent_and_blank_lines():
+    text = "def f():\n\n\n\n    return  1   \n"
+    assert clean_ocr_text(text) == "def f():\n\n    return 1"
+
+
+def test_noise_lines_dropped():
+    assert clean_ocr_text("a = 1\n~~`~ ~\nb = 2") == "a = 1\nb = 2"
+
+
+def test_truncate_keeps_head_and_tail():
+    text = "\n".join(f"line_{i} = {i}" for i in range(200))
+    result = truncate_to_budget(text, 100)
+    assert estimate_tokens(result) <= 110
+    assert result.startswith("line_0 = 0")
+    assert result.endswith("line_199 = 199")
+    assert "пропущено строк" in result
@@ -0,0 +1,126 @@
+import logging
+import os
+import threading
+
+from app_config import get_config, load_config
+
+# Провайдеры по умолчанию; config.yaml может переопределить любое поле
+DEFAULT_PROVIDERS = {
+    "cody": {
+        "title": "Cody",
+        "base_url": "https://cody.su/api/v1",
+        "path": "",
+        "model": "gpt-4.1",
+        "context_tokens": 128000,
+        "key_env": "CODY_API_KEY",
+        "capabilities": [],
+    },
+    "openai": {
+        "title": "OpenAI",
+        "base_url": "https://api.openai.com/v1",
+        "model": "gpt-3.5-turbo",
+        "context_tokens": 16385,
+        "key_env": "OPENAI_API_KEY",
+        "capabilities": ["stream", "stream_usage"],
+    },
+    "deepseek": {
+        "title": "DeepSeek",
+        "base_url": "https://api.deepseek.com/v1",
+        "model": "deepseek-chat",
+        "context_tokens": 64000,
+        "key_env": "DEEPSEEK_API_KEY",
+        "capabilities": ["stream", "stream_usage"],
+    },
+}
+
+
+class Provider:
+    """Описание OpenAI-совместимого провайдера chat/completions"""
+
+    def __init__(self, name: str, base_url: str, model: str, title: str = None,
+                 key_env: str = None, path: str = "/chat/completions",
+                 temperature: float = 0.7, capabilities=None, enabled: bool = True,
+                 context_tokens: int = None, rpm: int = None, tpm: int = None):
+        self.name = name.lower()
+        self.title = title or name
+        self.base_url = base_url.rstrip("/")
+        self.path = path
+        self.model = model
+        self.key_env = key_env
+        self.temperature = temperature
+        self.capabilities = set(capabilities or [])
+        self.enabled = enabled
+        self.context_tokens = context_tokens  # размер контекстного окна модели
+        self.rpm = rpm  # лимиты провайдера: запросов и токенов в минуту
+        self.tpm = tpm
+
+    @property
+    def url(self) -> str:
+        return f"{self.base_url}{self.path}"
+
+    def api_key(self):
+        """Ключ из окружения; провайдеру без key_env ключ не нужен"""
+        return os.getenv(self.key_env) if self.key_env else None
+
+    def supports(self, capability: str) -> bool:
+        return capability in self.capabilities
+
+    def __repr__(self):
+        return f"Provider({self.name!r}, {self.url!r}, model={self.model!r})"
+
+
+class ProviderRegistry:
+    """Реестр провайдеров, собранный из значений по умолчанию и config.yaml"""
+
+    def __init__(self, config: dict = None):
+        self._providers = {}
+        merged = {name: dict(options) for name, options in DEFAULT_PROVIDERS.items()}
+        for name, options in ((config or {}).get("providers") or {}).items():
+            merged.setdefault(name.lower(), {}).update(options or {})
+
+        for name, options in merged.items():
+            try:
+                self.register(Provider(name, **options))
+            except TypeError as e:
+                logging.error(f"Invalid provider config for {name}: {e}")
+
+    @classmethod
+    def from_config_file(cls, path) -> "ProviderRegistry":
+        return cls(load_config(path))
+
+    def register(self, provider: Provider):
+        self._providers[provider.name] = provider
+
+    def get(self, name: str) -> Provider:
+        """Поиск по имени или заголовку без учёта регистра"""
+        key = name.lower()
+        provider = self._providers.get(key)
+        if provider is None:
+            provider = next((p for p in self._providers.values() if p.title.lower() == key), None)
+        if provider is None:
+            raise ValueError(f"Неподдерживаемый API: {name}")
+        return provider
+
+    def enabled(self) -> list:
+        return [p for p in self._providers.values() if p.enabled]
+
+    def available(self) -> list:
+        """Включённые провайдеры, для которых есть ключ (или он не нужен)"""
+        return [p for p in self.enabled() if not p.key_env or p.api_key()]
+
+    def titles(self) -> list:
+        """Заголовки включённых провайдеров для выпадающего списка"""
+        return [p.title for p in self.enabled()]
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ProviderRegistry:
+    """Общий реестр провайдеров приложения"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ProviderRegistry(get_config())
+        return _registry
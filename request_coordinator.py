@@ -0,0 +1,293 @@
+import logging
+
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+
+from api_client import APIWorker
+from app_config import config_section
+from cancellation import CancellationToken
+from circuit_breaker import get_breakers
+from latency_stats import get_latency_tracker, get_provider_stats
+from providers import get_registry
+from request_scheduler import PRIORITY_TYPED, RequestScheduler
+from response_cache import get_response_cache, make_cache_key, request_text
+
+
+class RequestFuture(QObject):
+    """Общий результат выполняющегося запроса, на который подписаны клиенты"""
+
+    finished = pyqtSignal(str)
+    error = pyqtSignal(str)
+    progress = pyqtSignal(int)
+    chunk_received = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, request_id: int, key, prompt: str, messages: list = None,
+                 priority: int = PRIORITY_TYPED, parent=None):
+        super().__init__(parent)
+        self.request_id = request_id
+        self.key = key
+        self.prompt = prompt
+        self.messages = messages
+        self.priority = priority
+        self.usage = None
+        self.workers = []  # основной запрос и, при хеджировании, запасной
+        self.winner = None
+        self.provider = None  # title провайдера, чей ответ победил (после хеджа или failover)
+        self.subscribers = 1
+        self.partial = []  # уже полученные фрагменты — для присоединившихся позже
+        self.progress_value = 0
+        self.done = False
+
+
+class RequestCoordinator(QObject):
+    """Слияние одинаковых запросов, находящихся в полёте, и хеджирование.
+
+    Если запрос с тем же ключом (провайдер, модель, температура, промпт) уже
+    выполняется, новый вызывающий подписывается на существующий
+    RequestFuture вместо открытия ещё одного соединения. Воркер отменяется,
+    только когда от него отписались все.
+
+    В режиме хеджирования, если основной провайдер не прислал первый токен
+    за p-й перцентиль своего времени до первого токена, тот же запрос
+    уходит запасному провайдеру; побеждает ответивший первым, проигравший
+    отменяется.
+
+    Если провайдер упал (сбой сети/сервера или разомкнут его предохранитель)
+    до первого токена, запрос автоматически переходит к следующему
+    исправному провайдеру.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._next_request_id = 0
+        self._pending = {}
+        self._futures = {}
+        self._stats = {"started": 0, "coalesced": 0, "hedged": 0, "hedge_wins": 0, "failovers": 0}
+        self.scheduler = RequestScheduler(**config_section("scheduler"), parent=self)
+
+        hedging = config_section("hedging")
+        self.hedging_enabled = bool(hedging.get("enabled", False))
+        self.hedge_percentile = float(hedging.get("percentile", 90))
+        self.hedge_default_deadline = float(hedging.get("default_deadline", 3.0))
+        self.hedge_min_samples = int(hedging.get("min_samples", 10))
+        self.hedge_backup = hedging.get("backup")
+
+    def next_request_id(self) -> int:
+        self._next_request_id += 1
+        return self._next_request_id
+
+    def submit(self, api_name: str, prompt: str, key=None, join: bool = True,
+               hedge: bool = None, messages: list = None,
+               priority: int = PRIORITY_TYPED) -> RequestFuture:
+        """Запуск запроса или подписка на уже выполняющийся с тем же ключом.
+
+        join=False всегда запускает новый запрос (например, в обход кэша).
+        hedge=None берёт режим хеджирования из настроек координатора.
+        priority — класс приоритета для планировщика (см. request_scheduler).
+        """
+        future = self._pending.get(key) if key and join else None
+        if future is not None:
+            future.subscribers += 1
+            if priority < future.priority:
+                future.priority = priority
+                for worker in future.workers:
+                    self.scheduler.promote(worker, priority)
+            self._stats["coalesced"] += 1
+            logging.info(
+                f"Request coalesced with in-flight request {future.request_id} "
+                f"(saved {self._stats['coalesced']} so far)"
+            )
+            return future
+
+        future = RequestFuture(self.next_request_id(), key, prompt, messages, priority, parent=self)
+        if key:
+            self._pending[key] = future
+        self._start_worker(future, api_name)
+        self._stats["started"] += 1
+
+        if self.hedging_enabled if hedge is None else hedge:
+            self._arm_hedge(future, api_name)
+        return future
+
+    def _start_worker(self, future: RequestFuture, api_name: str):
+        worker = APIWorker(
+            api_name, future.prompt, cancel_token=CancellationToken(future.request_id),
+            messages=future.messages, parent=self
+        )
+        worker.finished.connect(self._handle_response)
+        worker.error.connect(self._handle_error)
+        worker.progress.connect(self._handle_progress)
+        worker.chunk_received.connect(self._handle_chunk)
+        worker.cancelled.connect(self._handle_cancelled)
+
+        self._futures[worker] = future
+        future.workers.append(worker)
+        self.scheduler.schedule(worker, future.priority)
+
+    def is_queued(self, future: RequestFuture) -> bool:
+        """Запрос ещё ждёт в очереди планировщика и ни один воркер не запущен"""
+        return bool(future.workers) and all(self.scheduler.is_queued(w) for w in future.workers)
+
+    def _backup_provider(self, primary: str):
+        registry = get_registry()
+        try:
+            primary_name = registry.get(primary).name
+        except ValueError:
+            return None
+        if self.hedge_backup:
+            try:
+                backup = registry.get(self.hedge_backup)
+            except ValueError:
+                logging.error(f"Unknown hedging backup provider: {self.hedge_backup}")
+                return None
+            return backup if backup.name != primary_name else None
+        healthy = get_breakers().healthy(registry.available())
+        return next((p for p in healthy if p.name != primary_name), None)
+
+    def _arm_hedge(self, future: RequestFuture, api_name: str):
+        backup = self._backup_provider(api_name)
+        if backup is None:
+            return
+        primary = get_registry().get(api_name).name
+        deadline = get_latency_tracker().hedge_deadline(
+            primary, self.hedge_percentile, self.hedge_default_deadline, self.hedge_min_samples
+        )
+        QTimer.singleShot(int(deadline * 1000), lambda: self._fire_hedge(future, backup.name, deadline))
+
+    def _fire_hedge(self, future: RequestFuture, backup: str, deadline: float):
+        if future.done or future.winner is not None or future.subscribers <= 0:
+            return
+        logging.info(
+            f"No first token for request {future.request_id} after {deadline:.2f}s, "
+            f"hedging to {backup}"
+        )
+        self._stats["hedged"] += 1
+        self._start_worker(future, backup)
+
+    def _failover(self, future: RequestFuture, failed: APIWorker) -> bool:
+        """Перезапуск запроса у другого исправного провайдера"""
+        if not get_breakers().failover or future.partial or future.subscribers <= 0:
+            return False
+        tried = {w.api_name for w in future.workers}
+        tried |= {w.provider.name for w in future.workers if w.provider is not None}
+        registry = get_registry()
+        candidates = [p for p in get_breakers().healthy(registry.available()) if p.name not in tried]
+        provider = get_provider_stats().choose(candidates)
+        if provider is None:
+            return False
+        logging.warning(
+            f"Request {future.request_id} failed on {failed.api_name}, failing over to {provider.name}"
+        )
+        self._stats["failovers"] += 1
+        self._start_worker(future, provider.name)
+        return True
+
+    def release(self, future: RequestFuture):
+        """Отписка клиента; последний отписавшийся отменяет запрос"""
+        if future.done:
+            return
+        future.subscribers -= 1
+        if future.subscribers <= 0:
+            self._forget(future)
+            for worker in future.workers:
+                worker.cancel()
+
+    def shutdown(self, timeout_ms: int = 2000):
+        """Отмена всех запросов и ожидание их завершения"""
+        self.scheduler.clear()
+        for worker in list(self._futures):
+            worker.cancel()
+            worker.wait(timeout_ms)
+        self._futures.clear()
+        self._pending.clear()
+
+    def stats(self) -> dict:
+        stats = dict(self._stats)
+        stats["in_flight"] = len(self._futures)
+        stats["scheduler"] = self.scheduler.stats()
+        stats["circuit_breakers"] = get_breakers().snapshot()
+        stats["ttft"] = get_latency_tracker().snapshot()
+        return stats
+
+    def _forget(self, future: RequestFuture):
+        if future.key and self._pending.get(future.key) is future:
+            del self._pending[future.key]
+
+    def _live_workers(self, future: RequestFuture) -> list:
+        """Воркеры запроса, чьи итоговые сигналы ещё не обработаны"""
+        return [w for w in future.workers if w in self._futures]
+
+    def _claim(self, worker: APIWorker, future: RequestFuture) -> bool:
+        """Первый ответивший воркер становится победителем, остальные отменяются"""
+        if future.winner is None:
+            future.winner = worker
+            for other in future.workers:
+                if other is not worker:
+                    other.cancel()
+            if worker is not future.workers[0]:
+                self._stats["hedge_wins"] += 1
+                logging.info(f"Hedged request {future.request_id} won by {worker.api_name}")
+        return future.winner is worker
+
+    def _reap(self):
+        """Снимает завершившийся воркер с учёта и дожидается его корутины"""
+        worker = self.sender()
+        future = self._futures.pop(worker, None)
+        if future is not None:
+            # Итоговый сигнал испускается последним действием run()
+            worker.wait()
+            worker.deleteLater()
+        return worker, future
+
+    def _complete(self, future: RequestFuture):
+        self._forget(future)
+        future.done = True
+        future.deleteLater()
+
+    def _handle_response(self, response: str):
+        worker, future = self._reap()
+        if future is None or future.done or not self._claim(worker, future):
+            return
+        self._complete(future)
+        future.usage = worker.usage
+        provider = worker.provider
+        future.provider = provider.title
+        if future.key and response:
+            text = request_text(future.prompt, future.messages)
+            key = make_cache_key(provider.name, provider.model, provider.temperature, text)
+            get_response_cache().put(key, response, provider.name, provider.model)
+        future.finished.emit(response)
+
+    def _handle_error(self, error: str):
+        worker, future = self._reap()
+        if future is None or future.done:
+            return
+        if future.winner not in (None, worker) or self._live_workers(future):
+            # Ошибку проигравшего или одного из хеджей игнорируем, пока жив другой
+            logging.warning(f"Request {future.request_id} via {worker.api_name} failed: {error}")
+            return
+        if worker.failover and self._failover(future, worker):
+            return
+        self._complete(future)
+        future.error.emit(error)
+
+    def _handle_cancelled(self):
+        worker, future = self._reap()
+        if future is None or future.done or self._live_workers(future):
+            return
+        self._complete(future)
+        future.cancelled.emit()
+
+    def _handle_progress(self, value: int):
+        worker = self.sender()
+        future = self._futures.get(worker)
+        if future is not None and future.winner in (None, worker):
+            future.progress_value = value
+            future.progress.emit(value)
+
+    def _handle_chunk(self, chunk: str):
+        worker = self.sender()
+        future = self._futures.get(worker)
+        if future is not None and self._claim(worker, future):
+            future.partial.append(chunk)
+            future.chunk_received.emit(chunk)
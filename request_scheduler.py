@@ -0,0 +1,222 @@
+import itertools
+import logging
+import time
+from functools import partial
+
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+
+from latency_stats import LatencyHistogram
+from prompt_budget import estimate_tokens
+from providers import get_registry
+from response_cache import request_text
+
+# Классы приоритета: меньшее значение обслуживается раньше
+PRIORITY_TYPED = 0   # вопрос из поля ввода
+PRIORITY_OCR = 1     # анализ кода со скриншота
+PRIORITY_VOICE = 2   # фоновая расшифровка голоса
+
+PRIORITY_NAMES = {PRIORITY_TYPED: "typed", PRIORITY_OCR: "ocr", PRIORITY_VOICE: "voice"}
+
+
+class TokenBucket:
+    """Ведро токенов: rate_per_minute единиц в минуту, запас не больше минутного"""
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = float(rate_per_minute)
+        self.tokens = self.capacity
+        self.rate = self.capacity / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """Через сколько секунд в ведре наберётся amount (0 — уже есть)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float, now: float):
+        self._refill(now)
+        self.tokens -= min(amount, self.capacity)
+
+
+class _QueuedRequest:
+    def __init__(self, worker, priority: int, seq: int, provider, tokens: int):
+        self.worker = worker
+        self.priority = priority
+        self.seq = seq
+        self.provider = provider
+        self.tokens = tokens
+        self.enqueued_at = time.monotonic()
+
+
+class RequestScheduler(QObject):
+    """Очередь запуска воркеров с приоритетами и лимитами провайдеров.
+
+    Воркер стартует, когда позволяют общий лимит одновременных запросов,
+    лимит его класса приоритета и вёдра RPM/TPM провайдера (поля rpm/tpm
+    в config.yaml). Очередь голосовых запросов ограничена: при перегрузке
+    самые старые из них отбрасываются.
+    """
+
+    queue_changed = pyqtSignal(int)  # текущая глубина очереди
+
+    def __init__(self, max_in_flight: int = 8, class_limits: dict = None,
+                 max_queued_voice: int = 2, response_tokens: int = 600, parent=None):
+        super().__init__(parent)
+        self.max_in_flight = max_in_flight
+        self.class_limits = {PRIORITY_VOICE: 1}
+        for name, limit in (class_limits or {}).items():
+            priority = next((p for p, n in PRIORITY_NAMES.items() if n == name), None)
+            if priority is None:
+                logging.error(f"Unknown scheduler priority class: {name}")
+                continue
+            self.class_limits[priority] = limit
+        self.max_queued_voice = max_queued_voice
+        self.response_tokens = response_tokens
+
+        self._queue = []
+        self._running = {}  # воркер -> класс приоритета
+        self._buckets = {}
+        self._seq = itertools.count()
+        self._reported_depth = 0
+        self._waits = {priority: LatencyHistogram() for priority in PRIORITY_NAMES}
+        self._stats = {"scheduled": 0, "dropped": 0, "merged": 0, "rate_limited": 0}
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._dispatch)
+
+    def schedule(self, worker, priority: int = PRIORITY_TYPED):
+        """Ставит воркер в очередь; он будет запущен вызовом start()"""
+        try:
+            provider = get_registry().get(worker.api_name)
+        except ValueError:
+            provider = None  # воркер сам сообщит об ошибке
+        tokens = estimate_tokens(request_text(worker.prompt, worker.messages)) + self.response_tokens
+        self._queue.append(_QueuedRequest(worker, priority, next(self._seq), provider, tokens))
+        self._stats["scheduled"] += 1
+        # Отменённый в очереди воркер нужно запустить, чтобы он сообщил об отмене
+        worker.cancel_token.add_callback(lambda: QTimer.singleShot(0, self._dispatch))
+
+        if priority == PRIORITY_VOICE:
+            self._drop_excess_voice()
+        self._dispatch()
+
+    def is_queued(self, worker) -> bool:
+        return any(item.worker is worker for item in self._queue)
+
+    def promote(self, worker, priority: int):
+        """Повышает приоритет ожидающего воркера (к запросу присоединился более важный)"""
+        for item in self._queue:
+            if item.worker is worker and priority < item.priority:
+                item.priority = priority
+        self._dispatch()
+
+    def clear(self):
+        """Очередь сбрасывается без запуска (при завершении приложения)"""
+        self._timer.stop()
+        self._queue.clear()
+        self._running.clear()
+
+    def record_merge(self):
+        self._stats["merged"] += 1
+
+    def stats(self) -> dict:
+        stats = dict(self._stats)
+        stats["queued"] = len(self._queue)
+        stats["running"] = len(self._running)
+        stats["queued_by_class"] = {
+            name: sum(1 for item in self._queue if item.priority == priority)
+            for priority, name in PRIORITY_NAMES.items()
+        }
+        stats["wait"] = {
+            PRIORITY_NAMES[priority]: histogram.as_dict()
+            for priority, histogram in self._waits.items() if histogram.total
+        }
+        return stats
+
+    def _drop_excess_voice(self):
+        voice = [item for item in self._queue if item.priority == PRIORITY_VOICE]
+        for item in voice[:max(len(voice) - self.max_queued_voice, 0)]:
+            logging.warning(f"Scheduler overloaded, dropping queued voice request {item.worker.request_id}")
+            self._stats["dropped"] += 1
+            item.worker.cancel()
+
+    def _bucket(self, provider, kind: str):
+        limit = getattr(provider, kind, None)
+        if not limit:
+            return None
+        key = (provider.name, kind)
+        bucket = self._buckets.get(key)
+        if bucket is None or bucket.capacity != limit:
+            bucket = self._buckets[key] = TokenBucket(limit)
+        return bucket
+
+    def _rate_delay(self, item: _QueuedRequest, now: float) -> float:
+        if item.provider is None:
+            return 0.0
+        delay = 0.0
+        rpm = self._bucket(item.provider, "rpm")
+        if rpm is not None:
+            delay = max(delay, rpm.delay(1, now))
+        tpm = self._bucket(item.provider, "tpm")
+        if tpm is not None:
+            delay = max(delay, tpm.delay(item.tokens, now))
+        return delay
+
+    def _start(self, item: _QueuedRequest, now: float):
+        self._queue.remove(item)
+        worker = item.worker
+        if not worker.cancel_token.cancelled:
+            self._waits[item.priority].record(now - item.enqueued_at)
+            self._running[worker] = item.priority
+            done = partial(self._on_worker_done, worker)
+            worker.finished.connect(done)
+            worker.error.connect(done)
+            worker.cancelled.connect(done)
+        # Отменённый в очереди воркер тоже запускается — он сразу сообщит об отмене
+        worker.start()
+
+    def _dispatch(self):
+        now = time.monotonic()
+        for item in [item for item in self._queue if item.worker.cancel_token.cancelled]:
+            self._start(item, now)
+
+        wake = None
+        blocked = set()  # провайдеры без свободного лимита: младшие не обгоняют старших
+        for item in sorted(self._queue, key=lambda i: (i.priority, i.seq)):
+            if len(self._running) >= self.max_in_flight:
+                break
+            limit = self.class_limits.get(item.priority)
+            if limit is not None and sum(1 for p in self._running.values() if p == item.priority) >= limit:
+                continue
+            provider_name = item.provider.name if item.provider else None
+            if provider_name in blocked:
+                continue
+            delay = self._rate_delay(item, now)
+            if delay > 0:
+                blocked.add(provider_name)
+                self._stats["rate_limited"] += 1
+                wake = delay if wake is None else min(wake, delay)
+                continue
+            if item.provider is not None:
+                for kind, amount in (("rpm", 1), ("tpm", item.tokens)):
+                    bucket = self._bucket(item.provider, kind)
+                    if bucket is not None:
+                        bucket.take(amount, now)
+            self._start(item, now)
+
+        if wake is not None:
+            self._timer.start(int(wake * 1000) + 1)
+        if len(self._queue) != self._reported_depth:
+            self._reported_depth = len(self._queue)
+            self.queue_changed.emit(self._reported_depth)
+
+    def _on_worker_done(self, worker, *args):
+        if self._running.pop(worker, None) is not None:
+            self._dispatch()
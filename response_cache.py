@@ -0,0 +1,227 @@
+import hashlib
+import json
+import logging
+import queue
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from app_config import config_section
+
+_STOP = object()
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Нормализация промпта для ключа кэша: пробелы схлопываются"""
+    return re.sub(r"\s+", " ", prompt).strip()
+
+
+def request_text(prompt: str, messages: list = None) -> str:
+    """Текст запроса для ключа кэша: для диалога — все сообщения"""
+    if messages:
+        return json.dumps(messages, ensure_ascii=False)
+    return prompt
+
+
+def make_cache_key(provider: str, model: str, temperature: float, prompt: str) -> str:
+    prompt_hash = hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest()
+    raw = json.dumps([provider.lower(), model, round(float(temperature), 3), prompt_hash])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Двухуровневый кэш ответов: LRU в памяти и SQLite на диске.
+
+    Записи на диске живут ttl секунд; при превышении max_disk_bytes
+    вытесняются те, к которым дольше всего не обращались. Синхронно
+    работает только LRU в памяти (и чтение с диска при промахе): запись
+    ответов, отметки обращений и вытеснение копятся в очереди и
+    выполняются фоновым потоком одной транзакцией на пакет.
+    """
+
+    def __init__(self, path: str = "response_cache.sqlite3", max_memory_entries: int = 256,
+                 ttl: float = 7 * 24 * 3600, max_disk_bytes: int = 50 * 1024 * 1024,
+                 batch_interval: float = 0.2):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.ttl = ttl
+        self.max_disk_bytes = max_disk_bytes
+        self.batch_interval = batch_interval
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._queue = queue.Queue()
+        self._writer = None
+        self._db = None
+        self._open_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def _open_db(self):
+        try:
+            self._db = self._connect()
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    provider TEXT,
+                    model TEXT,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    size INTEGER NOT NULL
+                )
+            """)
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at)")
+            self._db.commit()
+        except sqlite3.Error as e:
+            logging.error(f"Response cache disk layer disabled: {e}")
+            self._db = None
+            return
+        self._writer = threading.Thread(target=self._write_loop, name="response-cache-writer", daemon=True)
+        self._writer.start()
+
+    def get(self, key: str):
+        """Ответ из кэша или None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                response, created_at = entry
+                if now - created_at <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return response
+                del self._memory[key]
+
+            row = None
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    logging.error(f"Response cache read failed: {e}")
+                if row and now - row[1] > self.ttl:
+                    self._queue.put(("DELETE FROM responses WHERE key = ?", (key,)))
+                    row = None
+                elif row:
+                    self._queue.put(("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)))
+
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+
+            self._stats["disk_hits"] += 1
+            self._remember(key, row[0], row[1])
+            return row[0]
+
+    def put(self, key: str, response: str, provider: str = "", model: str = ""):
+        now = time.time()
+        with self._lock:
+            self._remember(key, response, now)
+            self._stats["stores"] += 1
+        if self._db is not None:
+            self._queue.put((
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, provider, model, response, now, now, len(response.encode("utf-8"))),
+            ))
+
+    def _remember(self, key: str, response: str, created_at: float):
+        self._memory[key] = (response, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self, db: sqlite3.Connection, now: float):
+        """Удаление просроченных записей и самых старых при превышении размера"""
+        cursor = db.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+        evicted = cursor.rowcount
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total > self.max_disk_bytes:
+            rows = db.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall()
+            doomed = []
+            for key, size in rows:
+                if total <= self.max_disk_bytes:
+                    break
+                doomed.append((key,))
+                total -= size
+            db.executemany("DELETE FROM responses WHERE key = ?", doomed)
+            evicted += len(doomed)
+        with self._lock:
+            self._stats["evictions"] += evicted
+
+    def _write_loop(self):
+        writer = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while batch[-1] is not _STOP:
+                    batch.append(self._queue.get(timeout=self.batch_interval))
+            except queue.Empty:
+                pass
+
+            statements = [item for item in batch if item is not _STOP]
+            try:
+                with writer:
+                    for sql, params in statements:
+                        writer.execute(sql, params)
+                    if any(sql.startswith("INSERT") for sql, _ in statements):
+                        self._evict_disk(writer, time.time())
+            except sqlite3.Error as e:
+                logging.error(f"Response cache write failed ({len(statements)} statements): {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if batch[-1] is _STOP:
+                writer.close()
+                return
+
+    def flush(self):
+        """Ожидание записи всех поставленных в очередь изменений"""
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.join()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if self._db is not None:
+            self._queue.put(("DELETE FROM responses", ()))
+
+    def stats(self) -> dict:
+        """Метрики попаданий"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        stats["hit_rate"] = round(hits / lookups, 3) if lookups else 0.0
+        return stats
+
+    def close(self):
+        """Сброс очереди на диск и закрытие базы"""
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Общий кэш ответов; параметры берутся из раздела cache в config.yaml"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(**config_section("cache"))
+        return _cache
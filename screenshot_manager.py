@@ -1,6 +1,8 @@
 import logging
+import numpy as np
 from PyQt6.QtCore import QObject, pyqtSignal
-from PyQt6.QtGui import QPixmap, QGuiApplication
+from PyQt6.QtGui import QPixmap, QImage
+from capture_backends import create_capture_backend
 from ocr_analyzer import CodeAnalyzer
 
 
@@ -13,7 +15,8 @@ class ScreenshotManager(QObject):
         super().__init__()
         self.selected_region = None
         self.code_analyzer = CodeAnalyzer()
-        logging.info("Screenshot manager initialized")
+        self.capture_backend = create_capture_backend()
+        logging.info(f"Screenshot manager initialized ({self.capture_backend.name} backend)")
 
     def set_region(self, region):
         """Установка области для захвата"""
@@ -29,20 +32,14 @@ class ScreenshotManager(QObject):
 
         try:
             x, y, w, h = self.selected_region
-            screen = QGuiApplication.primaryScreen()
+            frame = self.capture_backend.grab(x, y, w, h)
 
-            if not screen:
-                raise RuntimeError("Экран не найден")
+            # QPixmap собираем только если кто-то подписан на сигнал
+            if self.receivers(self.screenshot_taken):
+                self.screenshot_taken.emit(self._frame_to_pixmap(frame))
 
-            screenshot: QPixmap = screen.grabWindow(0, x, y, w, h)
-
-            if screenshot.isNull():
-                raise ValueError("Не удалось сделать скриншот")
-
-            self.screenshot_taken.emit(screenshot)
-
-            # ➤ Передаём изображение в CodeAnalyzer
-            text = self.code_analyzer.analyze_image(screenshot)
+            # ➤ Передаём кадр в CodeAnalyzer
+            text = self.code_analyzer.analyze_frame(frame)
 
             if not text.strip():
                 raise ValueError("Не удалось распознать текст")
@@ -54,6 +51,15 @@ class ScreenshotManager(QObject):
             self.error_occurred.emit(str(e))
             logging.error(f"Screenshot error: {e}")
 
+    @staticmethod
+    def _frame_to_pixmap(frame) -> QPixmap:
+        """Преобразование кадра BGRA в QPixmap (с копированием)"""
+        frame = np.ascontiguousarray(frame)
+        h, w = frame.shape[:2]
+        image = QImage(frame.data, w, h, frame.strides[0], QImage.Format.Format_RGB32)
+        return QPixmap.fromImage(image)
+
     def cleanup(self):
         """Очистка ресурсов"""
+        self.capture_backend.close()
         logging.info("Screenshot manager cleaned up")
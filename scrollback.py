@@ -0,0 +1,114 @@
+import logging
+import time
+
+from PyQt6.QtCore import QObject, QTimer
+from PyQt6.QtGui import QTextCursor
+
+NOTICE = "⋯ Ранние строки ({count}) убраны из окна ответа — они доступны в панели истории"
+
+
+class ScrollbackLimiter(QObject):
+    """Ограничение объёма окна ответа в долгой сессии.
+
+    После изменений документа (проверка откладывается до цикла событий и
+    стоит O(1)) сравнивает число блоков и примерный размер текста с
+    max_blocks и max_bytes. При превышении убирает самые старые блоки одним
+    выделением от начала документа — стоимость пропорциональна убранному, а
+    не всему документу. Убирается с запасом trim_ratio от лимита, чтобы
+    обрезка не шла на каждой новой записи. Пока в окно дописывается ответ
+    (busy() истинно), обрезка откладывается: позиции черновика не сдвигаются.
+
+    Обрезка очищает стек отмены документа: иначе убранный текст остался бы
+    в нём и память не освобождалась. Если окно редактируемое, правки,
+    сделанные до обрезки, после неё отменить (Ctrl+Z) уже нельзя.
+    """
+
+    def __init__(self, text_edit, enabled: bool = True, max_blocks: int = 5000, max_bytes: int = 4194304,
+                 trim_ratio: float = 0.2, busy=None, parent=None):
+        super().__init__(parent)
+        self.text_edit = text_edit
+        self.enabled = enabled
+        self.max_blocks = max_blocks
+        self.max_bytes = max_bytes
+        self.trim_ratio = trim_ratio
+        self.busy = busy
+        self._scheduled = False
+        self._trimmed_total = 0
+        self._stats = {"trims": 0, "trimmed_blocks": 0, "trimmed_bytes": 0, "trim_seconds": 0.0}
+        text_edit.document().contentsChanged.connect(self._schedule)
+
+    @staticmethod
+    def document_bytes(document) -> int:
+        """Примерный размер текста документа: символы в UTF-16"""
+        return document.characterCount() * 2
+
+    def reset(self):
+        """Окно очищено — счётчик убранных строк начинается заново"""
+        self._trimmed_total = 0
+
+    def _schedule(self):
+        if self.enabled and not self._scheduled:
+            self._scheduled = True
+            QTimer.singleShot(0, self._check)
+
+    def _check(self):
+        self._scheduled = False
+        if self.busy is not None and self.busy():
+            return  # проверка повторится после следующего изменения документа
+        document = self.text_edit.document()
+        blocks = document.blockCount()
+        chars = document.characterCount()
+        over_blocks = self.max_blocks and blocks > self.max_blocks
+        over_bytes = self.max_bytes and chars * 2 > self.max_bytes
+        if over_blocks or over_bytes:
+            self.trim()
+
+    def trim(self):
+        """Убирает старые блоки до (1 - trim_ratio) от лимитов"""
+        started = time.perf_counter()
+        document = self.text_edit.document()
+        blocks = document.blockCount()
+        first = 0
+        if self.max_blocks:
+            first = blocks - int(self.max_blocks * (1 - self.trim_ratio))
+        if self.max_bytes:
+            # Первый блок, с которого оставшийся текст укладывается в лимит
+            cut = document.characterCount() - int(self.max_bytes * (1 - self.trim_ratio)) // 2
+            if cut > 0:
+                block = document.findBlock(cut)
+                first = max(first, block.blockNumber() + (block.position() < cut))
+        first = min(first, blocks - 1)
+        if first <= 0:
+            return
+        end = document.findBlockByNumber(first).position()
+
+        # Без стека отмены: иначе убранный текст остаётся в нём, а Qt не сжимает
+        # буфер текста документа (это делается только при выключенной отмене).
+        # Выключение отмены очищает стек — вместе с ним теряется и отмена правок
+        if document.availableUndoSteps():
+            logging.debug(f"Scrollback trim discards {document.availableUndoSteps()} undo steps")
+        document.setUndoRedoEnabled(False)
+        cursor = QTextCursor(document)
+        cursor.beginEditBlock()
+        cursor.setPosition(end, QTextCursor.MoveMode.KeepAnchor)
+        cursor.removeSelectedText()
+        # Прежняя пометка была первым блоком и ушла вместе с убранным
+        self._trimmed_total += first - (self._trimmed_total > 0)
+        cursor.insertText(NOTICE.format(count=self._trimmed_total))
+        cursor.insertBlock()
+        cursor.endEditBlock()
+        document.setUndoRedoEnabled(True)
+
+        elapsed = time.perf_counter() - started
+        self._stats["trims"] += 1
+        self._stats["trimmed_blocks"] += first
+        self._stats["trimmed_bytes"] += end * 2
+        self._stats["trim_seconds"] += elapsed
+        logging.info(f"Scrollback trimmed {first} blocks ({end * 2} bytes) in {elapsed * 1000:.1f} ms")
+
+    def stats(self) -> dict:
+        document = self.text_edit.document()
+        stats = dict(self._stats, blocks=document.blockCount(), bytes=self.document_bytes(document))
+        if stats["trims"]:
+            stats["avg_trim_ms"] = round(stats["trim_seconds"] / stats["trims"] * 1000, 2)
+        return stats
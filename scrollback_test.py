@@ -0,0 +1,83 @@
+import sys
+
+import pytest
+
+pytest.importorskip("PyQt6")
+
+from PyQt6.QtWidgets import QApplication, QTextEdit
+
+from scrollback import NOTICE, ScrollbackLimiter
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QApplication.instance() or QApplication(sys.argv[:1])
+
+
+def window(app, lines, **limits):
+    edit = QTextEdit()
+    edit.setPlainText("\n".join(f"line {i:04d}" for i in range(lines)))
+    edit.limiter = ScrollbackLimiter(edit, **limits)
+    return edit
+
+
+def block_texts(edit):
+    document = edit.document()
+    return [document.findBlockByNumber(n).text() for n in range(document.blockCount())]
+
+
+def test_trim_by_blocks_keeps_ratio_below_limit(app):
+    edit = window(app, 150, max_blocks=100, max_bytes=0, trim_ratio=0.2)
+    edit.limiter.trim()
+    texts = block_texts(edit)
+    assert texts[0] == NOTICE.format(count=70)
+    assert texts[1] == "line 0070"
+    assert len(texts) == 81
+
+
+def test_repeated_trims_count_all_removed_lines(app):
+    edit = window(app, 150, max_blocks=100, max_bytes=0, trim_ratio=0.2)
+    edit.limiter.trim()
+    edit.append("\n".join(f"more {i}" for i in range(40)))
+    edit.limiter.trim()
+    texts = block_texts(edit)
+    # 70 строк первой обрезки + 41 - 1: прежняя пометка ушла вместе со старыми строками
+    assert texts[0] == NOTICE.format(count=110)
+    assert len(texts) == 81
+
+
+def test_trim_by_bytes(app):
+    edit = window(app, 200, max_blocks=0, max_bytes=2000, trim_ratio=0.2)
+    edit.limiter.trim()
+    texts = block_texts(edit)
+    kept = sum(len(text) + 1 for text in texts[1:])
+    assert kept <= 800
+    assert kept > 800 - 10 - 1
+    assert texts[-1] == "line 0199"
+
+
+def test_no_trim_under_limits(app):
+    edit = window(app, 50, max_blocks=100, max_bytes=0)
+    edit.limiter._check()
+    assert len(block_texts(edit)) == 50
+
+
+def test_busy_postpones_trim(app):
+    busy = [True]
+    edit = window(app, 150, max_blocks=100, max_bytes=0, busy=lambda: busy[0])
+    edit.limiter._check()
+    assert len(block_texts(edit)) == 150
+    busy[0] = False
+    edit.limiter._check()
+    assert len(block_texts(edit)) == 81
+
+
+def test_trim_clears_undo_but_keeps_it_enabled(app):
+    edit = window(app, 150, max_blocks=100, max_bytes=0)
+    edit.append("typed")
+    document = edit.document()
+    assert document.availableUndoSteps()
+    edit.limiter.trim()
+    assert document.availableUndoSteps() == 0
+    assert document.isUndoRedoEnabled()
+    assert edit.limiter.stats()["trimmed_blocks"] == 71
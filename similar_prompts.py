@@ -0,0 +1,154 @@
+import re
+import threading
+import zlib
+
+import numpy as np
+
+_MERSENNE_PRIME = (1 << 31) - 1
+_NOISE_RE = re.compile(r"[^\w]+")
+
+
+def normalize(text: str) -> str:
+    """Нижний регистр, без пунктуации и лишних пробелов — различия OCR и формулировок сглаживаются"""
+    return " ".join(_NOISE_RE.sub(" ", text.lower()).split())
+
+
+def shingles(text: str, size: int = 3) -> np.ndarray:
+    """Хэши символьных k-грамм нормализованного текста"""
+    if len(text) <= size:
+        grams = {text}
+    else:
+        grams = {text[i:i + size] for i in range(len(text) - size + 1)}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+class SimilarPromptIndex:
+    """Поиск почти одинаковых вопросов: MinHash-подписи и LSH по полосам.
+
+    Подпись из num_perm минимальных хэшей оценивает сходство Жаккара
+    множеств k-грамм. Подпись делится на bands полос; кандидаты — вопросы,
+    совпавшие с новым хотя бы в одной полосе, из них выбирается самый
+    похожий с оценкой не ниже threshold. Подписи и хэши полос лежат в
+    массивах numpy (около 0.4 КБ на вопрос), поэтому отбор кандидатов —
+    одно векторное сравнение. Индекс пополняется по одному вопросу.
+    """
+
+    def __init__(self, enabled: bool = True, threshold: float = 0.75, num_perm: int = 64,
+                 bands: int = 16, shingle_size: int = 3, min_chars: int = 12, max_entries: int = 20000):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands})")
+        self.enabled = enabled
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.min_chars = min_chars
+        self.max_entries = max_entries
+
+        rng = np.random.RandomState(1)
+        self._a = rng.randint(1, _MERSENNE_PRIME, size=(num_perm, 1), dtype=np.uint64)
+        self._b = rng.randint(0, _MERSENNE_PRIME, size=(num_perm, 1), dtype=np.uint64)
+        self._band_mix = rng.randint(1, 1 << 62, size=self.rows, dtype=np.uint64) | np.uint64(1)
+
+        self._lock = threading.Lock()
+        self._stats = {"queries": 0, "hits": 0}
+        self._reset(1024)
+
+    def _reset(self, capacity: int):
+        self._signatures = np.zeros((capacity, self.num_perm), dtype=np.uint32)
+        self._band_hashes = np.zeros((capacity, self.bands), dtype=np.uint64)
+        self._ids = np.full(capacity, -1, dtype=np.int64)  # -1 — свободная ячейка
+        self._slots = {}  # id записи -> ячейка, в порядке добавления
+        self._free = []
+        self._used = 0
+
+    def signature(self, text: str):
+        """MinHash-подпись вопроса; None для слишком короткого текста"""
+        text = normalize(text)
+        if len(text) < self.min_chars:
+            return None
+        hashes = shingles(text, self.shingle_size) % _MERSENNE_PRIME
+        return ((self._a * hashes + self._b) % _MERSENNE_PRIME).min(axis=1).astype(np.uint32)
+
+    def _bands_of(self, signature: np.ndarray) -> np.ndarray:
+        """Хэш каждой полосы подписи"""
+        return signature.reshape(self.bands, self.rows).astype(np.uint64) @ self._band_mix
+
+    def _slot_for_new(self) -> int:
+        if self._free:
+            return self._free.pop()
+        if self._used == len(self._ids):
+            capacity = len(self._ids) * 2
+            self._signatures = np.resize(self._signatures, (capacity, self.num_perm))
+            self._band_hashes = np.resize(self._band_hashes, (capacity, self.bands))
+            ids = np.full(capacity, -1, dtype=np.int64)
+            ids[:self._used] = self._ids[:self._used]
+            self._ids = ids
+        self._used += 1
+        return self._used - 1
+
+    def add(self, entry_id: int, prompt: str):
+        if not self.enabled:
+            return
+        signature = self.signature(prompt)
+        if signature is None:
+            return
+        bands = self._bands_of(signature)
+        with self._lock:
+            self._remove(entry_id)
+            slot = self._slot_for_new()
+            self._signatures[slot] = signature
+            self._band_hashes[slot] = bands
+            self._ids[slot] = entry_id
+            self._slots[entry_id] = slot
+            while len(self._slots) > self.max_entries:
+                self._remove(next(iter(self._slots)))  # самый старый из добавленных
+
+    def remove(self, entry_id: int):
+        with self._lock:
+            self._remove(entry_id)
+
+    def _remove(self, entry_id: int):
+        slot = self._slots.pop(entry_id, None)
+        if slot is not None:
+            self._ids[slot] = -1
+            self._band_hashes[slot] = 0
+            self._free.append(slot)
+
+    def clear(self):
+        with self._lock:
+            self._reset(1024)
+
+    def query(self, prompt: str):
+        """(id, сходство) самого похожего вопроса не ниже порога или None"""
+        if not self.enabled:
+            return None
+        signature = self.signature(prompt)
+        if signature is None:
+            return None
+        bands = self._bands_of(signature)
+        with self._lock:
+            self._stats["queries"] += 1
+            used = self._used
+            candidates = np.flatnonzero(
+                (self._band_hashes[:used] == bands).any(axis=1) & (self._ids[:used] >= 0)
+            )
+            if not len(candidates):
+                return None
+            similarity = (self._signatures[candidates] == signature).mean(axis=1)
+            # При равном сходстве выигрывает более новая запись
+            order = np.lexsort((self._ids[candidates], similarity))
+            best = candidates[order[-1]]
+            score = float(similarity[order[-1]])
+            if score < self.threshold:
+                return None
+            self._stats["hits"] += 1
+            return int(self._ids[best]), score
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, entries=len(self._slots))
+
+    def __len__(self):
+        return len(self._slots)
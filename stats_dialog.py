@@ -0,0 +1,75 @@
+import json
+import logging
+
+from PyQt6.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QTableWidget, QTableWidgetItem,
+    QPushButton, QFileDialog, QHeaderView
+)
+
+from circuit_breaker import get_breakers
+from latency_stats import get_latency_tracker, get_provider_stats, get_usage_tracker
+
+
+class ProviderStatsDialog(QDialog):
+    """Окно со статистикой провайдеров и экспортом в JSON"""
+
+    COLUMNS = [
+        ("provider", "Провайдер"),
+        ("model", "Модель"),
+        ("route", "Маршрут"),
+        ("requests", "Запросов"),
+        ("ttft", "TTFT, с"),
+        ("tokens_per_sec", "Токен/с"),
+        ("error_rate", "Ошибки"),
+        ("expected_seconds", "Ожидание, с"),
+        ("weight", "Вес"),
+    ]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Статистика провайдеров")
+        self.resize(760, 300)
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels([title for _, title in self.COLUMNS])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+
+        btn_refresh = QPushButton("Обновить")
+        btn_export = QPushButton("Экспорт…")
+        btn_refresh.clicked.connect(self.refresh)
+        btn_export.clicked.connect(self._export)
+
+        buttons = QHBoxLayout()
+        buttons.addStretch(1)
+        buttons.addWidget(btn_refresh)
+        buttons.addWidget(btn_export)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.table)
+        layout.addLayout(buttons)
+        self.refresh()
+
+    def refresh(self):
+        """Перечитывает текущие показатели"""
+        routes = get_provider_stats().snapshot()
+        self.table.setRowCount(len(routes))
+        for row, route in enumerate(routes):
+            for column, (key, _) in enumerate(self.COLUMNS):
+                value = route.get(key)
+                self.table.setItem(row, column, QTableWidgetItem("—" if value is None else str(value)))
+
+    def _export(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Экспорт статистики", "provider_stats.json", "JSON (*.json)")
+        if not path:
+            return
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({
+                    "routes": get_provider_stats().snapshot(),
+                    "ttft_histograms": get_latency_tracker().snapshot(),
+                    "usage": get_usage_tracker().snapshot(),
+                    "circuit_breakers": get_breakers().snapshot(),
+                }, f, indent=2, ensure_ascii=False)
+            logging.info(f"Provider stats exported to {path}")
+        except OSError as e:
+            logging.error(f"Error exporting provider stats: {e}")
@@ -1,8 +1,6 @@
-from pygments import highlight
-from pygments.lexers import get_lexer_by_name
-from pygments.formatters import HtmlFormatter
-import html
-import re
+import logging
+
+from highlighting import get_highlighter
 
 
 class SyntaxHighlighter:
@@ -11,23 +9,10 @@ class SyntaxHighlighter:
         try:
             # Сохраняем табы и переносы
             code = code.replace('\t', '    ')
-
-            # Экранируем только опасные символы (<, >, &), но не кавычки
-            code = re.sub(r'([<>&])',
-                          lambda m: {'<': '&lt;', '>': '&gt;', '&': '&amp;'}[m.group(1)], code)
-
-            lexer = get_lexer_by_name(language, stripall=True)
-            formatter = HtmlFormatter(
-                style="friendly",
-                noclasses=True,
-                nowrap=True,
-                prestyles="margin:0;padding:0;white-space:pre;"
-            )
-
-            highlighted = highlight(code, lexer, formatter)
+            highlighted = get_highlighter().highlight(code, language or None, style="friendly", variant="inline")
             # Восстанавливаем кавычки после подсветки
             highlighted = highlighted.replace('&quot;', '"')
             return highlighted.replace('\n', '<br>')
         except Exception as e:
-            print(f"Ошибка подсветки: {e}")
-            return f'<pre style="white-space:pre-wrap">{code}</pre>'
\ No newline at end of file
+            logging.warning(f"Syntax highlighting failed: {e}")
+            return f'<pre style="white-space:pre-wrap">{code}</pre>'
@@ -9,11 +9,37 @@ import html
 import re
 
 
+# Состояния блоков: внутри многострочного блока кода, открытого ``` или ~~~
+NORMAL = 0
+IN_BACKTICK_FENCE = 1
+IN_TILDE_FENCE = 2
+_FENCE_STATES = {"```": IN_BACKTICK_FENCE, "~~~": IN_TILDE_FENCE}
+
+# Строчные правила, которые красят строку целиком
+_LINE_RE = re.compile(r'(?P<quote>^> )|(?P<list>^[*\-+] )|(?P<heading>^#{1,6}\s)')
+
+# Все внутристрочные правила одним проходом; раньше в альтернативе — приоритетнее
+_INLINE_RE = re.compile(
+    r'(?P<code>`{3}.*?`{3}|`[^`]+`)'
+    r'|(?P<bold>\*\*[^*]+\*\*)'
+    r'|(?P<italic>_[^_]+_)'
+    r'|(?P<link>\[.*?\]\(.*?\))'
+)
+
+
 class MarkdownHighlighter(QSyntaxHighlighter):
+    """Подсветка Markdown в редактируемом окне ответа.
+
+    Каждая строка разбирается за один проход общим регулярным выражением.
+    Многострочные блоки кода отслеживаются через состояние блока
+    (setCurrentBlockState): Qt перекрашивает следующие строки только тогда,
+    когда у изменённой строки поменялось состояние, то есть при вводе или
+    удалении ограничителя ```, а не на каждое нажатие клавиши.
+    """
+
     def __init__(self, parent: QTextDocument = None):
         super().__init__(parent)
         self._init_formats()
-        self._init_rules()
 
     def _init_formats(self):
         """Инициализация всех стилей форматирования"""
@@ -45,34 +71,34 @@ class MarkdownHighlighter(QSyntaxHighlighter):
             fmt.setFontFamily(font)
         return fmt
 
-    def _init_rules(self):
-        """Инициализация правил подсветки"""
-        self.rules = [
-            # Заголовки (###)
-            (r'^#{1,6}\s.*$', 0, self.formats['heading']),
-            # Блоки кода (```)
-            (r'`{3}.*`{3}', 0, self.formats['code']),
-            # Инлайн код (`code`)
-            (r'`[^`]+`', 0, self.formats['code']),
-            # Жирный текст (**bold**)
-            (r'\*\*[^*]+\*\*', 0, self.formats['bold']),
-            # Наклонный текст (_italic_)
-            (r'_[^_]+_', 0, self.formats['italic']),
-            # Ссылки ([text](url))
-            (r'\[.*?\]\(.*?\)', 0, self.formats['link']),
-            # Списки (- item)
-            (r'^[\*\-\+] .*$', 0, self.formats['list']),
-            # Цитаты (> quote)
-            (r'^> .*$', 0, self.formats['quote']),
-        ]
-
     def highlightBlock(self, text):
-        """Применение правил подсветки"""
-        for pattern, nth, fmt in self.rules:
-            for match in re.finditer(pattern, text):
-                start = match.start(nth)
-                length = match.end(nth) - start
-                self.setFormat(start, length, fmt)
+        """Применение правил подсветки к одной строке"""
+        state = max(self.previousBlockState(), NORMAL)
+        fence = text.lstrip()[:3]
+        if state != NORMAL:
+            # Внутри блока кода: строка — код, закрывает блок только такой же ограничитель
+            self.setFormat(0, len(text), self.formats['code'])
+            if _FENCE_STATES.get(fence) == state:
+                state = NORMAL
+            self.setCurrentBlockState(state)
+            return
+
+        if fence in _FENCE_STATES and text.count(fence) == 1:
+            # Открывающий ограничитель многострочного блока
+            self.setFormat(0, len(text), self.formats['code'])
+            self.setCurrentBlockState(_FENCE_STATES[fence])
+            return
+        self.setCurrentBlockState(NORMAL)
+
+        line = _LINE_RE.match(text)
+        if line and line.lastgroup != 'heading':
+            # Цитаты и списки красятся целиком, без внутристрочной разметки
+            self.setFormat(0, len(text), self.formats[line.lastgroup])
+            return
+        if line:
+            self.setFormat(0, len(text), self.formats['heading'])
+        for match in _INLINE_RE.finditer(text):
+            self.setFormat(match.start(), match.end() - match.start(), self.formats[match.lastgroup])
 
 
 class TextFormatter:
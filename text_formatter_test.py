@@ -0,0 +1,63 @@
+import sys
+
+import pytest
+
+pytest.importorskip("PyQt6")
+if sys.version_info < (3, 12):
+    # В TextFormatter обратная косая черта внутри f-строки — синтаксис Python 3.12+
+    pytest.skip("text_formatter requires Python 3.12+", allow_module_level=True)
+
+from PyQt6.QtGui import QTextCursor
+from PyQt6.QtWidgets import QApplication, QTextEdit
+
+from text_formatter import IN_BACKTICK_FENCE, IN_TILDE_FENCE, NORMAL, MarkdownHighlighter
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QApplication.instance() or QApplication(sys.argv[:1])
+
+
+def highlighted(app, text):
+    """Окно ответа с подсветкой; без раскладки QTextEdit правки не перекрашиваются"""
+    edit = QTextEdit()
+    edit.setPlainText(text)
+    edit.highlighter = MarkdownHighlighter(edit.document())
+    edit.highlighter.rehighlight()  # иначе первая подсветка отложена до цикла событий
+    return edit
+
+
+def states(edit):
+    block, result = edit.document().begin(), []
+    while block.isValid():
+        result.append(block.userState())
+        block = block.next()
+    return result
+
+
+def test_fence_spans_lines(app):
+    edit = highlighted(app, "text\n```py\ncode\n\n```\nafter")
+    assert states(edit) == [NORMAL, IN_BACKTICK_FENCE, IN_BACKTICK_FENCE,
+                            IN_BACKTICK_FENCE, NORMAL, NORMAL]
+
+
+def test_other_fence_does_not_close_block(app):
+    edit = highlighted(app, "~~~\n```\nstill code\n~~~\ntext")
+    assert states(edit) == [IN_TILDE_FENCE, IN_TILDE_FENCE, IN_TILDE_FENCE, NORMAL, NORMAL]
+
+
+def test_inline_fence_keeps_normal_state(app):
+    edit = highlighted(app, "run ```ls``` here\n```inline```\nplain")
+    assert states(edit) == [NORMAL, NORMAL, NORMAL]
+
+
+def test_typing_fence_rehighlights_following_lines(app):
+    edit = highlighted(app, "a\nb\nc")
+    cursor = QTextCursor(edit.document())
+    cursor.insertText("```\n")
+    assert states(edit) == [IN_BACKTICK_FENCE] * 4
+
+    cursor.movePosition(QTextCursor.MoveOperation.Start)
+    cursor.movePosition(QTextCursor.MoveOperation.EndOfBlock, QTextCursor.MoveMode.KeepAnchor)
+    cursor.removeSelectedText()
+    assert states(edit) == [NORMAL] * 4